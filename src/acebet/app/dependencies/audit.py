@@ -0,0 +1,300 @@
+"""
+Write-behind audit log of the served predictions.
+
+The prediction routes hand their predictions to an ``AuditSink`` as columns
+(one record per predicted match: the user, the route, the players, the
+date, the model version, the probability and the request latency). Adding
+them only appends a reference to an in-memory buffer: a background thread
+converts the buffered columns to Arrow and writes them to Parquet files in
+batches, one row group per flush, starting a new file every
+``rotate_rows`` rows or ``rotate_seconds`` seconds. Only closed files are
+complete, being written with their footer on rotation.
+
+The buffer is bounded: when the writer falls behind, new records are
+dropped and counted instead of slowing down or stalling the requests.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+from .tracing import current_trace, span
+
+# The directory of the audit files
+AUDIT_DIR = os.environ.get("ACEBET_AUDIT_DIR", "audit")
+
+# The records buffered before new ones are dropped
+AUDIT_MAX_ROWS = int(os.environ.get("ACEBET_AUDIT_MAX_ROWS", "200000"))
+
+# The seconds between flushes, unless a batch fills up before
+AUDIT_FLUSH_SECONDS = float(os.environ.get("ACEBET_AUDIT_FLUSH_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def audit_schema():
+    """The Arrow schema of the audit files."""
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("time", pa.timestamp("ms", tz="UTC")),
+            ("request_id", pa.string()),
+            ("user", pa.string()),
+            ("route", pa.string()),
+            ("date", pa.string()),
+            ("p1", pa.string()),
+            ("p2", pa.string()),
+            ("model_version", pa.int32()),
+            ("prob", pa.float64()),
+            ("class_", pa.int8()),
+            ("latency_ms", pa.float64()),
+        ]
+    )
+
+
+class AuditSink:
+    """
+    Buffer audit records and write them to rotating Parquet files.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The directory of the files, created if missing.
+    max_rows : int, default=AUDIT_MAX_ROWS
+        The records buffered before new ones are dropped.
+    batch_rows : int, default=50_000
+        The buffered records triggering a flush before ``flush_seconds``.
+    flush_seconds : float, default=AUDIT_FLUSH_SECONDS
+        The seconds between flushes.
+    rotate_rows : int, default=1_000_000
+        The records written to a file before starting a new one.
+    rotate_seconds : float, default=3600.0
+        The seconds a file is written to before starting a new one.
+
+    Attributes
+    ----------
+    buffered : int
+        The records waiting to be written.
+    written : int
+        The records written.
+    dropped : int
+        The records dropped because the buffer was full or a write failed.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_rows: int = AUDIT_MAX_ROWS,
+        batch_rows: int = 50_000,
+        flush_seconds: float = AUDIT_FLUSH_SECONDS,
+        rotate_rows: int = 1_000_000,
+        rotate_seconds: float = 3600.0,
+    ):
+        self.directory = Path(directory)
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.buffered = 0
+        self.written = 0
+        self.dropped = 0
+        self._n_files = 0
+        self._chunks = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._file = None
+        self._file_rows = 0
+        self._file_opened = 0.0
+
+    def record(self, n_rows: int, **values) -> bool:
+        """
+        Add records to the buffer, without converting or copying them.
+
+        Parameters
+        ----------
+        n_rows : int
+            The number of records.
+        **values
+            The value of each field of ``audit_schema``: a sequence of
+            ``n_rows`` values, or a single value shared by all the records.
+            The time, the request ID and the latency default to those of the
+            current request.
+
+        Returns
+        -------
+        bool
+            Whether the records were buffered, rather than dropped.
+        """
+        if n_rows <= 0:
+            return True
+        with span("logging"):
+            trace = current_trace()
+            values.setdefault("time", time.time())
+            if trace is not None:
+                values.setdefault("request_id", trace.request_id)
+                values.setdefault("latency_ms", trace.elapsed_ms())
+            with self._condition:
+                if self.buffered + n_rows > self.max_rows:
+                    self.dropped += n_rows
+                    return False
+                self._chunks.append((n_rows, values))
+                self.buffered += n_rows
+                if self.buffered >= self.batch_rows:
+                    self._condition.notify()
+            return True
+
+    @staticmethod
+    def _column(value, n_rows: int, field):
+        import numpy as np
+        import pyarrow as pa
+
+        if field.name == "time":
+            # Seconds since the epoch, in milliseconds
+            ms = np.round(np.multiply(value, 1000)).astype(np.int64)
+            if ms.ndim == 0:
+                ms = np.full(n_rows, ms)
+            return pa.array(ms).cast(field.type)
+        if np.ndim(value) == 0:
+            return pa.repeat(pa.scalar(value, field.type), n_rows)
+        return pa.array(value, field.type, from_pandas=True)
+
+    def _table(self, chunks):
+        import pyarrow as pa
+
+        schema = audit_schema()
+        columns = [
+            pa.chunked_array(
+                [self._column(values.get(f.name), n, f) for n, values in chunks],
+                f.type,
+            )
+            for f in schema
+        ]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _rotate(self, schema):
+        import pyarrow.parquet as pq
+
+        self._close_file()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = f"audit_{stamp}_{os.getpid()}_{self._n_files}.parquet"
+        self._file = self.directory / name
+        self._writer = pq.ParquetWriter(self._file, schema)
+        self._file_rows = 0
+        self._file_opened = time.monotonic()
+        self._n_files += 1
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def flush(self):
+        """Write the buffered records now."""
+        with self._flush_lock:
+            with self._condition:
+                chunks, self._chunks = self._chunks, []
+                n_rows = sum(n for n, _ in chunks)
+                self.buffered -= n_rows
+            if not chunks:
+                return
+            try:
+                table = self._table(chunks)
+                age = time.monotonic() - self._file_opened
+                if (
+                    self._writer is None
+                    or age >= self.rotate_seconds
+                    or self._file_rows >= self.rotate_rows
+                ):
+                    self._rotate(table.schema)
+                self._writer.write_table(table)
+                self._file_rows += n_rows
+                self.written += n_rows
+            except Exception as e:
+                logger.error(f"Audit write failed: {e}")
+                with self._condition:
+                    self.dropped += n_rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._condition:
+                if self.buffered < self.batch_rows:
+                    self._condition.wait(self.flush_seconds)
+            self.flush()
+
+    def start(self) -> "AuditSink":
+        """Start the background writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the writer thread, write the buffered records, close the file."""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._flush_lock:
+            self._close_file()
+
+    def describe(self) -> Dict:
+        """The counters of the sink, for the admin routes."""
+        return {
+            "directory": str(self.directory),
+            "file": str(self._file) if self._file is not None else None,
+            "buffered": self.buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+# The audit sink of the process
+audit_sink = AuditSink(AUDIT_DIR)
+
+
+def audit_predictions(state, user, route: str, columns: Dict) -> bool:
+    """
+    Audit the predictions of a route.
+
+    Parameters
+    ----------
+    state : ServingState
+        The serving state the predictions come from.
+    user : UserInDB
+        The user the predictions were served to.
+    route : str
+        The route, e.g. "predict".
+    columns : Dict
+        The 'date', 'p1', 'p2', 'prob' and 'class_' of the predictions, as
+        sequences or single values, and the 'model_version' if known, else
+        that of the served model.
+
+    Returns
+    -------
+    bool
+        Whether the records were buffered, rather than dropped.
+    """
+    import numpy as np
+
+    fields = ("date", "p1", "p2", "prob", "class_", "model_version")
+    values = {field: columns.get(field) for field in fields}
+    if values["model_version"] is None and state.current is not None:
+        values["model_version"] = state.current.version
+    n_rows = len(columns["prob"]) if np.ndim(columns["prob"]) else 1
+    return audit_sink.record(n_rows, user=user.username, route=route, **values)
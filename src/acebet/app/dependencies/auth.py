@@ -4,6 +4,8 @@ Heavily inspired from https://fastapi.tiangolo.com/tutorial/security/oauth2-jwt/
 """
 
 # Let's import all the magical stuff we need!
+import os
+import threading
 from datetime import datetime, timedelta  # For handling time
 from typing import Annotated, Dict, Union  # For fancy type hints
 
@@ -12,9 +14,12 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer  # For authentication
 from jose import JWTError, jwt  # For dealing with tokens
 from passlib.context import CryptContext  # For password hashing
+from starlette.concurrency import run_in_threadpool
 
 # Importing the super cool prediction function
 from .data_models import TokenData, UserInDB
+from .tracing import span
+from .user_store import DictUserStore, SQLiteUserStore, UserStore
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -35,9 +40,23 @@ fake_users_db = {
         "email": "johndoe@example.com",
         "hashed_password": "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW",
         "disabled": False,
-    }
+        "tier": "free",
+        "role": "admin",
+    },
+    "janedoe": {
+        "username": "janedoe",
+        "full_name": "Jane Doe",
+        "email": "janedoe@example.com",
+        "hashed_password": "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW",
+        "disabled": False,
+        "tier": "free",
+        "role": "user",
+    },
 }
 
+# The SQLite user database, the imaginary users above if not set
+USER_DB = os.environ.get("ACEBET_USER_DB")
+
 # The secret code to lock and unlock passwords
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -84,17 +103,43 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-# The user detective
+# The keeper of the users
+_user_store: UserStore | None = None
+_user_store_lock = threading.Lock()
+
+
+def get_user_store() -> UserStore:
+    """
+    Get the user store of the process, creating it on first use.
+
+    Returns
+    -------
+    UserStore
+        A SQLite store if ``ACEBET_USER_DB`` is set, else ``fake_users_db``.
+    """
+    global _user_store
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                _user_store = (
+                    SQLiteUserStore(USER_DB)
+                    if USER_DB
+                    else DictUserStore(fake_users_db)
+                )
+    return _user_store
 
 
-def get_user(db: Dict[str, dict], username: str) -> Union[UserInDB, None]:
+# The user detective
+def get_user(
+    db: Union[UserStore, Dict[str, dict]], username: str
+) -> Union[UserInDB, None]:
     """
     Retrieve user information from the database.
 
     Parameters
     ----------
-    db : Dict[str, dict]
-        The user database.
+    db : Union[UserStore, Dict[str, dict]]
+        The user store, or a dictionary of user fields.
 
     username : str
         The username of the user to retrieve.
@@ -104,6 +149,8 @@ def get_user(db: Dict[str, dict], username: str) -> Union[UserInDB, None]:
     UserInDB
         User information if found, None otherwise.
     """
+    if isinstance(db, UserStore):
+        return db.get(username)
     if username in db:
         user_dict = db[username]
         return UserInDB(**user_dict)
@@ -111,15 +158,15 @@ def get_user(db: Dict[str, dict], username: str) -> Union[UserInDB, None]:
 
 # The secret agent
 def authenticate_user(
-    fake_db: Dict[str, dict], username: str, password: str
+    fake_db: Union[UserStore, Dict[str, dict]], username: str, password: str
 ) -> Union[UserInDB, bool]:
     """
     Authenticate a user based on provided credentials.
 
     Parameters
     ----------
-    fake_db : Dict[str, dict]
-        The fake user database.
+    fake_db : Union[UserStore, Dict[str, dict]]
+        The user store, or a dictionary of user fields.
 
     username : str
         The username to authenticate.
@@ -197,17 +244,23 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Use
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        # The bearer of this token has a story to tell
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with span("auth"):
+        try:
+            # The bearer of this token has a story to tell
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    # The guardian checks the database of heroes
-    user = get_user(fake_users_db, username=token_data.username)
+        # The guardian checks the database of heroes
+        # A database lookup runs off the event loop
+        store = get_user_store()
+        if store.blocking:
+            user = await run_in_threadpool(store.get, token_data.username)
+        else:
+            user = store.get(token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -241,6 +294,34 @@ async def get_current_active_user(
     return current_user
 
 
+# The bouncer of the back office
+async def get_current_admin_user(
+    current_user: UserInDB = Depends(get_current_active_user),
+) -> UserInDB:
+    """
+    Retrieve the current active user, if an administrator.
+
+    The administration routes reload and promote models, profile and trace
+    requests: they are reserved to the users with the "admin" role.
+
+    Parameters
+    ----------
+    current_user : UserInDB
+        Active user information.
+
+    Returns
+    -------
+    UserInDB
+        Administrator information, raises an HTTPException with a 403 status
+        if the user is not an administrator.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Administrators only"
+        )
+    return current_user
+
+
 def get_user_identifier(
     request: Request, current_user: UserInDB = Depends(get_current_user)
 ) -> str:
@@ -248,7 +329,8 @@ def get_user_identifier(
     Get the user identifier for rate limiting.
 
     This function returns the username of the current authenticated user,
-    which will be used as the identifier for rate limiting.
+    which will be used as the identifier for rate limiting, see
+    `rate_limit.rate_limit`.
 
     Parameters
     ----------
@@ -1,4 +1,4 @@
-from pydantic import BaseModel  # For fancy data validation
+from pydantic import BaseModel, ConfigDict, Field  # For fancy data validation
 
 
 # Our secret token class to make life easier
@@ -49,6 +49,10 @@ class User(BaseModel):
         The full name of the user.
     disabled : bool or None
         Whether the user is disabled.
+    tier : str
+        The subscription tier of the user, which sets its rate limits.
+    role : str
+        The role of the user, "admin" for the administration routes.
 
     """
 
@@ -56,6 +60,8 @@ class User(BaseModel):
     email: str | None = None
     full_name: str | None = None
     disabled: bool | None = None
+    tier: str = "free"
+    role: str = "user"
 
 
 # The secret agent version of a user
@@ -73,8 +79,29 @@ class UserInDB(User):
     hashed_password: str
 
 
+# Which match are we talking about?
+class MatchQuery(BaseModel):
+    """
+    Data model for a match given by player names and date.
+
+    Attributes
+    ----------
+    p1_name : str
+        The name of player 1.
+    p2_name : str
+        The name of player 2.
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+
+    """
+
+    p1_name: str
+    p2_name: str
+    date: str
+
+
 # The oracle's predictions are in!
-class PredictionRequest(BaseModel):
+class PredictionRequest(MatchQuery):
     """
     Data model for prediction requests.
 
@@ -102,9 +129,24 @@ class PredictionRequest(BaseModel):
 
     """
 
-    p1_name: str
-    p2_name: str
-    date: str
+    testing: bool = False
+
+
+# The oracle's predictions, wholesale
+class BatchPredictionRequest(BaseModel):
+    """
+    Data model for batch prediction requests.
+
+    Attributes
+    ----------
+    matches : list[MatchQuery]
+        The matches to predict.
+    testing : bool
+        Whether the prediction is for testing purposes.
+
+    """
+
+    matches: list[MatchQuery]
     testing: bool = False
 
 
@@ -127,3 +169,340 @@ class PredictionResponse(BaseModel):
     player_name: str | None = None
     prob: float | None = None
     class_: int | None = None
+
+
+# A prediction that knows which match it is about
+class MatchPrediction(BaseModel):
+    """
+    Data model for an exported match prediction.
+
+    Attributes
+    ----------
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+    p1 : str
+        The name of player 1.
+    p2 : str
+        The name of player 2.
+    prob : float
+        The predicted winning probability of player 1, in percent.
+    class_ : int
+        The class of the prediction (0 or 1).
+
+    """
+
+    date: str
+    p1: str
+    p2: str
+    prob: float
+    class_: int
+
+
+# The matches of a day
+class SlatePrediction(MatchPrediction):
+    """
+    Data model for a prediction of a day slate.
+
+    Attributes
+    ----------
+    tournament : str
+        The tournament of the match.
+    round : str
+        The round of the match in the tournament.
+
+    """
+
+    tournament: str
+    round: str
+
+
+# Why the oracle said so
+class ExplanationRequest(BatchPredictionRequest):
+    """
+    Data model for explanation requests.
+
+    Attributes
+    ----------
+    matches : list[MatchQuery]
+        The matches to explain.
+    top : int or None
+        The number of contributions returned per match, the largest in
+        magnitude, by default all of them.
+    testing : bool
+        Whether the explanation is for testing purposes.
+
+    """
+
+    matches: list[MatchQuery] = Field(min_length=1, max_length=1000)
+    top: int | None = Field(None, ge=1)
+
+
+# The prediction, feature by feature
+class MatchExplanation(MatchPrediction):
+    """
+    Data model for an explained match prediction.
+
+    The players are in the order of the data, as the features: 'prob' and
+    the contributions are those of 'p1' winning, whichever player the
+    request named first.
+
+    Attributes
+    ----------
+    model_version : int
+        The version of the model explained.
+    base_value : float
+        The expected raw score of the model, in log-odds.
+    contributions : dict[str, float]
+        The contribution of each feature to the raw score, in log-odds, by
+        decreasing magnitude. With all the features, the base value and the
+        contributions add up to the log-odds of the probability.
+
+    """
+
+    # 'model_version' is a field, not a pydantic model attribute
+    model_config = ConfigDict(protected_namespaces=())
+
+    model_version: int
+    base_value: float
+    contributions: dict[str, float]
+
+
+# Everyone against everyone
+class PairwiseRequest(BaseModel):
+    """
+    Data model for pairwise prediction requests over a field of players.
+
+    Attributes
+    ----------
+    players : list[str]
+        The names of the players, from 2 to 256.
+    date : str
+        The date of the matches in 'YYYY-MM-DD' format.
+    tournament : str or None
+        The tournament, whose latest edition sets the match context.
+    surface : str or None
+        The surface, e.g. "Clay".
+    court : str or None
+        The court, "Indoor" or "Outdoor".
+    round : str or None
+        The round, by default "1st Round".
+    best_of : int or None
+        The number of sets, 3 or 5.
+    testing : bool
+        Whether the prediction is for testing purposes.
+
+    """
+
+    players: list[str] = Field(min_length=2, max_length=256)
+    date: str
+    tournament: str | None = None
+    surface: str | None = None
+    court: str | None = None
+    round: str | None = None
+    best_of: int | None = None
+    testing: bool = False
+
+
+# The win-probability matrix
+class PairwiseResponse(BaseModel):
+    """
+    Data model for pairwise prediction responses.
+
+    Attributes
+    ----------
+    players : list[str]
+        The names of the players in the data, in the order of the request.
+    prob : list[list[float or None]]
+        The probability, in percent, of the row player beating the column
+        player, None on the diagonal.
+
+    """
+
+    players: list[str]
+    prob: list[list[float | None]]
+
+
+# May the best player win
+class BracketRequest(BaseModel):
+    """
+    Data model for bracket simulation requests.
+
+    Attributes
+    ----------
+    draw : list[str or None]
+        The player names of the slots of the draw, in bracket order, None for
+        a bye. The size of the draw is a power of two, up to 256.
+    date : str
+        The date of the tournament in 'YYYY-MM-DD' format.
+    tournament : str or None
+        The tournament, whose latest edition sets the match context.
+    surface : str or None
+        The surface, e.g. "Clay".
+    court : str or None
+        The court, "Indoor" or "Outdoor".
+    best_of : int or None
+        The number of sets, 3 or 5.
+    n_sims : int
+        The number of simulations.
+    seed : int
+        The seed of the simulations, the same seed giving the same result.
+    testing : bool
+        Whether the prediction is for testing purposes.
+
+    """
+
+    draw: list[str | None] = Field(min_length=2, max_length=256)
+    date: str
+    tournament: str | None = None
+    surface: str | None = None
+    court: str | None = None
+    best_of: int | None = None
+    n_sims: int = Field(100_000, ge=1)
+    seed: int = 0
+    testing: bool = False
+
+
+# Who goes how far
+class BracketResponse(BaseModel):
+    """
+    Data model for bracket simulation responses.
+
+    Attributes
+    ----------
+    players : list[str]
+        The names of the players in the data, in draw order, byes excluded.
+    rounds : list[str]
+        The stage reached by winning each round, e.g. "QF", the last one
+        being the title "W".
+    reach : list[list[float]]
+        The probability, in percent, of each player winning each round.
+    n_sims : int
+        The number of simulations.
+
+    """
+
+    players: list[str]
+    rounds: list[str]
+    reach: list[list[float]]
+    n_sims: int
+
+
+# Who did you mean?
+class PlayerMatch(BaseModel):
+    """
+    Data model for player name search results.
+
+    Attributes
+    ----------
+    name : str
+        The player name, as it appears in the data.
+    score : float
+        The similarity of the name to the query, 1 for an exact match.
+    match : str
+        The kind of match, "prefix" or "fuzzy".
+
+    """
+
+    name: str
+    score: float
+    match: str
+
+
+# A match from the archives
+class MatchRecord(BaseModel):
+    """
+    Data model for a past match.
+
+    Attributes
+    ----------
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+    tournament : str or None
+        The tournament name.
+    surface : str or None
+        The court surface.
+    round : str or None
+        The tournament round.
+    p1 : str
+        The name of player 1.
+    p2 : str
+        The name of player 2.
+    rank_p1 : float or None
+        The ATP rank of player 1.
+    rank_p2 : float or None
+        The ATP rank of player 2.
+    winner : str
+        The name of the winner.
+
+    """
+
+    date: str
+    tournament: str | None = None
+    surface: str | None = None
+    round: str | None = None
+    p1: str
+    p2: str
+    rank_p1: float | None = None
+    rank_p2: float | None = None
+    winner: str
+
+
+# A page of the archives
+class MatchPage(BaseModel):
+    """
+    Data model for a page of past matches.
+
+    Attributes
+    ----------
+    total : int
+        The total number of matches.
+    offset : int
+        The number of matches skipped.
+    limit : int
+        The maximal number of matches in the page.
+    matches : list[MatchRecord]
+        The matches of the page.
+
+    """
+
+    total: int
+    offset: int
+    limit: int
+    matches: list[MatchRecord]
+
+
+class PlayerMatches(MatchPage):
+    """
+    Data model for the match history of a player.
+
+    Attributes
+    ----------
+    player : str
+        The name of the player in the data.
+
+    """
+
+    player: str
+
+
+class HeadToHead(MatchPage):
+    """
+    Data model for the match history between two players.
+
+    Attributes
+    ----------
+    p1 : str
+        The name of player 1 in the data.
+    p2 : str
+        The name of player 2 in the data.
+    p1_wins : int
+        The number of wins of player 1 against player 2.
+    p2_wins : int
+        The number of wins of player 2 against player 1.
+
+    """
+
+    p1: str
+    p2: str
+    p1_wins: int
+    p2_wins: int
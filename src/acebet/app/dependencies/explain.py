@@ -0,0 +1,151 @@
+"""
+Per-feature contributions of the served predictions.
+
+The contributions come from LightGBM's native SHAP output
+(``pred_contrib=True``), computed on the rows of the encoded feature matrix
+of the served model, in log-odds: the base value and the contributions of a
+match add up to its raw score, from which its probability follows. They are
+cached per model version, in a matrix aligned with the served rows and
+filled on demand: a request computes the rows not yet explained in a single
+booster call, and explained rows cost a row gather, as a plain prediction.
+"""
+
+import threading
+
+import numpy as np
+
+from .predict_winner import explain_encoded
+
+
+def feature_names(model):
+    """
+    The names of the encoded features of a model pipeline.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model.
+
+    Returns
+    -------
+    list of str
+        The names, in the order of the encoded feature matrix.
+    """
+    return list(model[:-1].get_feature_names_out())
+
+
+class ContributionCache:
+    """
+    The contributions of the served rows for one model version.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model.
+    features : numpy.ndarray
+        The encoded feature matrix of the served data.
+
+    Attributes
+    ----------
+    names : list of str
+        The names of the encoded features.
+    n_computed : int
+        The number of rows explained so far.
+    """
+
+    def __init__(self, model, features):
+        self.model = model
+        self.features = features
+        self.names = feature_names(model)
+        self.n_computed = 0
+        self._contributions = None
+        self._computed = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """The bytes allocated for the contributions, none until first use."""
+        contributions, computed = self._contributions, self._computed
+        if contributions is None:
+            return 0
+        return contributions.nbytes + computed.nbytes
+
+    def get(self, rows) -> np.ndarray:
+        """
+        The contributions of rows, computing those not cached in one call.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The row positions, all found.
+
+        Returns
+        -------
+        numpy.ndarray
+            The contribution of each feature, then the base value, per row,
+            in log-odds.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            if self._contributions is None:
+                n_rows, n_features = self.features.shape
+                # Allocated on first use, as large as the encoded features
+                self._contributions = np.empty(
+                    (n_rows, n_features + 1), dtype=np.float32
+                )
+                self._computed = np.zeros(n_rows, dtype=bool)
+            missing = np.unique(rows[~self._computed[rows]])
+        if len(missing):
+            # Concurrent requests may compute the same rows: same values
+            values = explain_encoded(self.model, self.features, missing)
+            with self._lock:
+                self._contributions[missing] = values
+                self._computed[missing] = True
+                self.n_computed = int(self._computed.sum())
+        return self._contributions[rows]
+
+
+def explanation_records(contributions, names, classes, top=None):
+    """
+    Convert contributions to JSON records, sorted by decreasing magnitude.
+
+    Parameters
+    ----------
+    contributions : numpy.ndarray
+        The contributions and base value of each match, see
+        ``ContributionCache.get``.
+    names : list of str
+        The feature names.
+    classes : numpy.ndarray
+        The classes of the model, by predicted class.
+    top : int, optional
+        The number of contributions kept per match, by default all.
+
+    Returns
+    -------
+    list of dict
+        Per match, the 'prob' of player 1 winning in percent, the 'class_',
+        the 'base_value' and the 'contributions' of the features.
+    """
+    contributions = np.asarray(contributions, dtype=float)
+    raw = contributions.sum(axis=1)
+    prob = 1 / (1 + np.exp(-raw))
+    class_ = classes[(prob > 0.5).astype(int)]
+    order = np.argsort(-np.abs(contributions[:, :-1]), axis=1, kind="stable")
+    if top is not None:
+        order = order[:, :top]
+    records = []
+    for i in range(len(contributions)):
+        values = contributions[i, order[i]].round(4).tolist()
+        records.append(
+            {
+                # Rounded as the predictions
+                "prob": round(100 * float(prob[i]), 1),
+                "class_": int(class_[i]),
+                "base_value": round(float(contributions[i, -1]), 4),
+                "contributions": {
+                    names[j]: value for j, value in zip(order[i].tolist(), values)
+                },
+            }
+        )
+    return records
@@ -0,0 +1,81 @@
+"""
+HTTP conditional caching of the prediction routes.
+
+The prediction of a past match only depends on the served data and model, so
+the responses carry a strong ETag derived from both and from the request key.
+Clients sending the ETag back in an ``If-None-Match`` header get a bodiless
+``304 Not Modified`` as long as neither the data nor the model changed, before
+any data lookup or scoring.
+"""
+
+import hashlib
+import os
+from typing import Dict
+
+from fastapi import Response
+
+# Seconds a client may reuse a prediction without revalidating it
+CACHE_MAX_AGE = int(os.environ.get("ACEBET_CACHE_MAX_AGE", "0"))
+
+# Private: the responses are only served to authenticated users
+CACHE_CONTROL = f"private, max-age={CACHE_MAX_AGE}, must-revalidate"
+
+
+def prediction_etag(state, *key) -> str | None:
+    """
+    The strong ETag of a prediction response.
+
+    Parameters
+    ----------
+    state : ServingState
+        The serving state answering the request.
+    *key
+        The request parameters the response depends on, including its format.
+
+    Returns
+    -------
+    str or None
+        The quoted ETag, None while the state is not loaded.
+    """
+    version = state.version_tag()
+    if version is None:
+        return None
+    digest = hashlib.sha256(repr((version, key)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    """
+    Whether an `If-None-Match` header matches an ETag.
+
+    Parameters
+    ----------
+    if_none_match : str or None
+        The header, a list of ETags or "*".
+    etag : str or None
+        The ETag of the current response.
+
+    Returns
+    -------
+    bool
+        Whether the client copy is still valid.
+    """
+    if if_none_match is None or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: the W/ prefix is ignored
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+def cache_headers(etag: str | None) -> Dict[str, str]:
+    """The `ETag` and `Cache-Control` headers, none without an ETag."""
+    if etag is None:
+        return {}
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    """A `304 Not Modified` response, with the caching headers."""
+    return Response(status_code=304, headers=cache_headers(etag))
@@ -2,11 +2,12 @@ import logging
 import time
 import json
 from typing import Callable
-from uuid import uuid4
 from fastapi import FastAPI, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import Message
 
+from .tracing import REQUEST_ID_HEADER, request_id_of, start_trace, traces
+
 
 class RouterLoggingMiddleware(BaseHTTPMiddleware):
     def __init__(self, app: FastAPI, *, logger: logging.Logger) -> None:
@@ -14,20 +15,25 @@ class RouterLoggingMiddleware(BaseHTTPMiddleware):
         super().__init__(app)
 
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        request_id: str = str(uuid4())
+        request_id: str = request_id_of(request.headers)
         logging_dict = {
-            "X-API-REQUEST-ID": request_id  # X-API-REQUEST-ID maps each request-response to a unique ID
+            REQUEST_ID_HEADER: request_id  # X-API-REQUEST-ID maps each request-response to a unique ID
         }
+        # The trace carries the request ID to the spans of the request
+        trace = start_trace(request_id, request.method, request.url.path)
 
         await self.set_body(request)
         response, response_dict = await self._log_response(
             call_next, request, request_id
         )
+        trace.finish(response.status_code)
         request_dict = await self._log_request(request)
         logging_dict["request"] = request_dict
         logging_dict["response"] = response_dict
 
-        self._logger.info(logging_dict)
+        with trace.span("logging"):
+            self._logger.info(logging_dict)
+        traces.add(trace)
 
         return response
 
@@ -0,0 +1,247 @@
+"""
+Memory accounting of the serving process.
+
+Reports the size of the loaded artifacts (the DataFrames, the indexes, the
+models and their encoded features), of the in-process caches and of the
+memory-mapped files, along with the resident and peak memory of the process.
+Allocation tracking with ``tracemalloc`` can be switched on temporarily: each
+report then lists the allocation sites that grew since the previous report,
+to find growth between requests. Tracking slows allocations down and is off
+by default.
+"""
+
+import collections
+import resource
+import sys
+import threading
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Dict, List
+
+# Objects whose size is not attributed to the artifact referring to them
+_SKIPPED_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+)
+_SEQUENCE_TYPES = (list, tuple, set, frozenset, collections.deque)
+
+
+def deep_sizeof(obj) -> int:
+    """
+    The size in bytes of an object and of everything it refers to.
+
+    Each object is counted once. numpy arrays count their buffer (once, for
+    views sharing it), pandas objects their deep ``memory_usage``. Memory
+    allocated outside of Python objects, e.g. by native libraries, is not
+    seen.
+
+    Parameters
+    ----------
+    obj : Any
+        The object.
+
+    Returns
+    -------
+    int
+        The size in bytes.
+    """
+    import numpy as np
+    import pandas as pd
+
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen or isinstance(obj, _SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+            usage = obj.memory_usage(deep=True)
+            total += int(usage.sum() if hasattr(usage, "sum") else usage)
+        elif isinstance(obj, np.ndarray):
+            if obj.base is not None:
+                stack.append(obj.base)
+            else:
+                total += sys.getsizeof(obj)
+                if obj.dtype == object:
+                    stack.extend(obj.ravel().tolist())
+        elif isinstance(obj, dict):
+            total += sys.getsizeof(obj)
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _SEQUENCE_TYPES):
+            total += sys.getsizeof(obj)
+            stack.extend(obj)
+        else:
+            total += sys.getsizeof(obj)
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            for slot in getattr(type(obj), "__slots__", ()):
+                stack.append(getattr(obj, slot, None))
+    return total
+
+
+def process_memory() -> Dict:
+    """
+    The resident and peak resident memory of the process.
+
+    Returns
+    -------
+    Dict
+        'rss_bytes' (None if unavailable) and 'peak_rss_bytes'.
+    """
+    memory = {"rss_bytes": None, "peak_rss_bytes": None}
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                memory["rss_bytes"] = int(line.split()[1]) * 1024
+            elif line.startswith("VmHWM:"):
+                memory["peak_rss_bytes"] = int(line.split()[1]) * 1024
+    if memory["peak_rss_bytes"] is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        memory["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return memory
+
+
+def mapped_files() -> List[Dict]:
+    """
+    The files memory-mapped by the process, other than shared libraries.
+
+    Returns
+    -------
+    List[Dict]
+        The path and mapped size in bytes of each file, largest first. Empty
+        where ``/proc/self/maps`` is not available.
+    """
+    maps = Path("/proc/self/maps")
+    if not maps.exists():
+        return []
+    sizes: Dict[str, int] = {}
+    for line in maps.read_text().splitlines():
+        fields = line.split(maxsplit=5)
+        if len(fields) < 6 or not fields[5].startswith("/"):
+            continue
+        path = fields[5]
+        shared_library = ".so" in Path(path).name
+        device = path.startswith("/dev/") and not path.startswith("/dev/shm/")
+        if shared_library or device:
+            continue
+        start, end = (int(address, 16) for address in fields[0].split("-"))
+        sizes[path] = sizes.get(path, 0) + end - start
+    return [
+        {"path": path, "bytes": size}
+        for path, size in sorted(sizes.items(), key=lambda item: -item[1])
+    ]
+
+
+class AllocationTracker:
+    """
+    Temporary ``tracemalloc`` tracking of the allocations between reports.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        """
+        Start tracking the allocations, taking the baseline snapshot.
+
+        Parameters
+        ----------
+        frames : int, default=1
+            The number of frames stored per allocation.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def stop(self):
+        """Stop tracking the allocations, freeing the traces."""
+        with self._lock:
+            tracemalloc.stop()
+            self._snapshot = None
+
+    def report(self, top: int = 20) -> Dict:
+        """
+        The allocation sites that grew the most since the previous report.
+
+        Parameters
+        ----------
+        top : int, default=20
+            The number of allocation sites to report.
+
+        Returns
+        -------
+        Dict
+            Whether tracking is on, the traced and peak traced memory, and
+            the top allocation sites by growth.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return {"tracing": False}
+            snapshot = tracemalloc.take_snapshot()
+            growth = []
+            if self._snapshot is not None:
+                for stat in snapshot.compare_to(self._snapshot, "lineno")[:top]:
+                    growth.append(
+                        {
+                            "site": str(stat.traceback),
+                            "size_bytes": stat.size,
+                            "size_diff_bytes": stat.size_diff,
+                            "count_diff": stat.count_diff,
+                        }
+                    )
+            self._snapshot = snapshot
+            traced, peak = tracemalloc.get_traced_memory()
+            return {
+                "tracing": True,
+                "traced_bytes": traced,
+                "peak_traced_bytes": peak,
+                "growth": growth,
+            }
+
+
+# The allocation tracker of the worker process
+tracker = AllocationTracker()
+
+
+def memory_report(state, top: int = 20) -> Dict:
+    """
+    Report the memory of the process and of a serving state.
+
+    Parameters
+    ----------
+    state : ServingState
+        The serving state whose artifacts are reported.
+    top : int, default=20
+        The number of allocation sites reported when tracking is on.
+
+    Returns
+    -------
+    Dict
+        The process memory, the artifacts, the caches, the mapped files and
+        the allocation growth, sizes in bytes.
+    """
+    from .request_profile import profiler
+    from .tracing import traces
+
+    return {
+        "process": process_memory(),
+        "artifacts": state.memory_usage(),
+        "caches": {"traces": deep_sizeof(traces), "profiles": deep_sizeof(profiler)},
+        "mapped_files": mapped_files(),
+        "allocations": tracker.report(top),
+    }
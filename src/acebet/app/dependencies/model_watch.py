@@ -0,0 +1,300 @@
+"""
+Model hot-swap and shadow scoring.
+
+A background watcher polls the model directory. A new artifact is loaded and
+warmed off the request path, then published by replacing a single versioned
+reference: requests read the reference once, so in-flight requests finish on
+the model they started with.
+
+In shadow mode, a new artifact becomes a candidate instead of being
+published. A sample of the live traffic is queued for the candidate, scored
+by a background thread, and the disagreement with the served model is
+recorded, without adding latency to the requests. The candidate is then
+promoted on demand.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class ModelVersion:
+    """
+    A loaded model artifact.
+
+    Parameters
+    ----------
+    model : sklearn.base.BaseEstimator
+        The loaded model.
+    model_file : Path
+        The file the model was loaded from.
+    mtime : float
+        The modification time of the file when loaded.
+    version : int
+        The version number, increasing with each loaded artifact.
+    features : numpy.ndarray, optional
+        The served data encoded by the preprocessing steps of the model.
+    encoder_key : str, optional
+        The fingerprint of the preprocessing steps the features come from.
+    drift : DriftMonitor, optional
+        The drift monitor of the served rows, when the model was saved with
+        a drift profile.
+    contributions : ContributionCache, optional
+        The cached feature contributions of the served rows.
+    """
+
+    def __init__(
+        self,
+        model,
+        model_file: Path,
+        mtime: float,
+        version: int,
+        features=None,
+        encoder_key: str | None = None,
+        drift=None,
+        contributions=None,
+    ):
+        self.model = model
+        self.model_file = model_file
+        self.mtime = mtime
+        self.version = version
+        self.features = features
+        self.encoder_key = encoder_key
+        self.drift = drift
+        self.contributions = contributions
+        self.loaded_at = time.time()
+
+    def describe(self) -> dict:
+        """Describe the version for the admin routes."""
+        return {
+            "version": self.version,
+            "model_file": str(self.model_file),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def load_model_version(
+    model_file: Path, version: int, df=None, players=None, previous=None
+):
+    """
+    Load a model artifact, encode the served data with it and warm it up.
+
+    Parameters
+    ----------
+    model_file : Path
+        The joblib file of the model.
+    version : int
+        The version number to give to the model.
+    df : pandas.DataFrame, optional
+        The served data, encoded once by the preprocessing steps of the model
+        so that requests only gather rows and evaluate the trees.
+    players : PlayerDictionary, optional
+        The dictionary the player IDs of ``df`` refer to.
+    previous : ModelVersion, optional
+        The served version, whose features are reused when its
+        preprocessing steps are identical.
+
+    Returns
+    -------
+    ModelVersion
+        The loaded and warmed model.
+    """
+    import numpy as np
+    from joblib import load
+
+    from acebet.app.dependencies.explain import ContributionCache
+    from acebet.app.dependencies.predict_winner import (
+        encode_features,
+        encoder_key,
+        predict_encoded,
+    )
+
+    mtime = model_file.stat().st_mtime
+    logger.info(f"Loading: {model_file}")
+    model = load(model_file)
+    if df is None:
+        return ModelVersion(model, model_file, mtime, version)
+
+    key = encoder_key(model)
+    if previous is not None and previous.encoder_key == key:
+        features = previous.features
+    else:
+        logger.info(f"Encoding {len(df)} rows for model version {version}")
+        features = encode_features(model, df, players)
+    # Score a few rows once, so that lazy initializations happen here
+    predict_encoded(model, features, np.arange(min(len(df), 8)))
+    return ModelVersion(
+        model,
+        model_file,
+        mtime,
+        version,
+        features,
+        key,
+        load_drift(model_file, df),
+        ContributionCache(model, features),
+    )
+
+
+def load_drift(model_file: Path, df):
+    """
+    Load the drift profile saved with a model, and bin the served data.
+
+    Parameters
+    ----------
+    model_file : Path
+        The joblib file of the model.
+    df : pandas.DataFrame
+        The served data.
+
+    Returns
+    -------
+    DriftMonitor or None
+        The monitor, None if the model has no profile.
+    """
+    from acebet.monitoring.drift import DriftMonitor, DriftProfile
+
+    profile_file = DriftProfile.path_for(model_file)
+    if not profile_file.exists():
+        return None
+    try:
+        profile = DriftProfile.load(profile_file)
+        return DriftMonitor(profile, profile.bin_features(df))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring the drift profile {profile_file}: {e}")
+        return None
+
+
+class ShadowScorer:
+    """
+    Asynchronous scoring of sampled live traffic with a candidate model.
+
+    Parameters
+    ----------
+    sample_rate : float, default=0.1
+        The fraction of the scored requests replayed on the candidate.
+    max_queue : int, default=256
+        The number of pending requests above which new samples are dropped.
+    """
+
+    def __init__(self, sample_rate: float = 0.1, max_queue: int = 256):
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear the disagreement statistics and the pending samples."""
+        # Samples queued for a previous candidate are not scored
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        with self._stats_lock:
+            self.n_scored = 0
+            self.n_class_disagreements = 0
+            self.sum_abs_diff = 0.0
+            self.max_abs_diff = 0.0
+            self.n_dropped = 0
+            self.n_errors = 0
+
+    def submit(self, candidate: ModelVersion, rows, live_prob):
+        """
+        Queue a sample of scored matches for the candidate, never blocking.
+
+        Parameters
+        ----------
+        candidate : ModelVersion
+            The candidate model.
+        rows : numpy.ndarray
+            The row positions of the scored matches in the served data.
+        live_prob : numpy.ndarray
+            The probabilities of the served model, in [0, 1].
+        """
+        if random.random() >= self.sample_rate:
+            return
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="acebet-shadow", daemon=True
+                    )
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((candidate, rows, live_prob))
+        except queue.Full:
+            with self._stats_lock:
+                self.n_dropped += 1
+
+    def _run(self):
+        from acebet.app.dependencies.predict_winner import predict_encoded
+
+        while True:
+            candidate, rows, live_prob = self._queue.get()
+            try:
+                shadow_prob, _ = predict_encoded(
+                    candidate.model, candidate.features, rows
+                )
+                diff = abs(shadow_prob - live_prob)
+                disagreements = ((shadow_prob > 0.5) != (live_prob > 0.5)).sum()
+                with self._stats_lock:
+                    self.n_scored += len(diff)
+                    self.n_class_disagreements += int(disagreements)
+                    self.sum_abs_diff += float(diff.sum())
+                    self.max_abs_diff = max(self.max_abs_diff, float(diff.max()))
+            except Exception as e:
+                logger.error(f"Shadow scoring failed: {e}")
+                with self._stats_lock:
+                    self.n_errors += 1
+
+    def stats(self) -> dict:
+        """The disagreement of the candidate with the served model."""
+        with self._stats_lock:
+            n = self.n_scored or None
+            return {
+                "sample_rate": self.sample_rate,
+                "scored": self.n_scored,
+                "class_disagreement_rate": n and self.n_class_disagreements / n,
+                "mean_abs_prob_diff": n and self.sum_abs_diff / n,
+                "max_abs_prob_diff": n and self.max_abs_diff,
+                "pending": self._queue.qsize(),
+                "dropped": self.n_dropped,
+                "errors": self.n_errors,
+            }
+
+
+class ModelWatcher(threading.Thread):
+    """
+    Background thread refreshing the model of a serving state.
+
+    Parameters
+    ----------
+    state : ServingState
+        The serving state whose model directory is watched.
+    interval : float, default=10.0
+        The seconds between two polls of the model directory.
+    """
+
+    def __init__(self, state, interval: float = 10.0):
+        super().__init__(name="acebet-model-watcher", daemon=True)
+        self.state = state
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.state.refresh()
+            except Exception as e:
+                logger.error(f"Model refresh failed: {e}")
+
+    def stop(self):
+        """Stop polling, at the end of the current interval."""
+        self._stop_event.set()
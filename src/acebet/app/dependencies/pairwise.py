@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+
+from acebet.app.dependencies.predict_winner import predict_frame
+from acebet.app.dependencies.tracing import span
+from acebet.dataprep.elo import INITIAL_RATING, decayed_k, expected_score
+
+# Columns describing the match rather than the players, with their values
+# when neither the request nor a previous edition of the tournament sets them
+CONTEXT_DEFAULTS = {
+    "atp": np.nan,
+    "location": np.nan,
+    "tournament": np.nan,
+    "series": np.nan,
+    "court": "Outdoor",
+    "surface": "Hard",
+    "round": "1st Round",
+    "best of": 3,
+    "comment": "Completed",
+}
+
+
+def player_states(df, player_index, player_ids, date):
+    """
+    The latest ranking and Elo rating of players, as of a date.
+
+    The state of a player is read from their last match strictly before the
+    date, located by binary search in the rows of their matches. The Elo
+    ratings of the data being pre-match, the update of that last match is
+    applied, with the K factor of the matches of the player up to it.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The match data, with integer player IDs.
+    player_index : PlayerRowIndex
+        The rows of the matches of each player, sorted by date.
+    player_ids : numpy.ndarray
+        The player IDs.
+    date : str
+        The date in 'YYYY-MM-DD' format.
+
+    Returns
+    -------
+    dict
+        Arrays aligned with ``player_ids``: 'rank' (NaN without a previous
+        match), 'elo' (the initial rating without a previous match) and
+        'row' (the row of the last match, -1 if none).
+
+    Raises
+    ------
+    ValueError
+        If the date is malformed.
+    """
+    player_ids = np.asarray(player_ids, dtype=np.int64)
+    try:
+        date = np.datetime64(pd.Timestamp(date), "ns")
+    except ValueError:
+        raise ValueError(f"Invalid date '{date}', expected 'YYYY-MM-DD'")
+    dates = df["date"].to_numpy().astype("datetime64[ns]")
+    last = np.full(len(player_ids), -1, dtype=np.int64)
+    n_matches = np.zeros(len(player_ids), dtype=np.int64)
+    for i, player_id in enumerate(player_ids):
+        rows = player_index.rows_of(player_id)
+        before = np.searchsorted(dates[rows], date, side="left")
+        if before:
+            last[i] = rows[before - 1]
+            n_matches[i] = before - 1
+
+    found = last >= 0
+    rows = last[found]
+    as_p1 = df["p1"].to_numpy()[rows] == player_ids[found]
+    rank = np.full(len(player_ids), np.nan)
+    elo = np.full(len(player_ids), INITIAL_RATING)
+    opponent_elo = np.full(len(player_ids), INITIAL_RATING)
+    for values, column in ((rank, "rank"), (elo, "elo")):
+        p1_values = df[f"{column}_p1"].to_numpy(dtype=float)[rows]
+        p2_values = df[f"{column}_p2"].to_numpy(dtype=float)[rows]
+        values[found] = np.where(as_p1, p1_values, p2_values)
+        if column == "elo":
+            opponent_elo[found] = np.where(as_p1, p2_values, p1_values)
+    # The rating after the last match, the data holding the one before it
+    won = df["target"].to_numpy(dtype=bool)[rows] == as_p1
+    delta = won - expected_score(elo[found], opponent_elo[found])
+    elo[found] += decayed_k(n_matches[found]) * delta
+    # A missing Elo rating is the rating of a new player
+    elo[np.isnan(elo)] = INITIAL_RATING
+    return {"rank": rank, "elo": elo, "row": last}
+
+
+def match_context(df, date, tournament=None, **context):
+    """
+    The match columns of a hypothetical match.
+
+    Values not given are taken from the latest edition of the tournament
+    played up to the date, if any, else from ``CONTEXT_DEFAULTS``.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The match data.
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+    tournament : str, optional
+        The tournament, ignoring the case.
+    **context
+        Values of the match columns, e.g. ``surface="Clay"``, None being
+        ignored.
+
+    Returns
+    -------
+    dict
+        The value of each match column.
+    """
+    values = dict(CONTEXT_DEFAULTS)
+    if tournament is not None:
+        values["tournament"] = tournament
+        editions = (df["tournament"].str.casefold() == tournament.casefold()) & (
+            df["date"] <= pd.Timestamp(date)
+        )
+        rows = np.flatnonzero(editions.to_numpy())
+        if len(rows):
+            latest = df.iloc[rows[-1]]
+            for column in CONTEXT_DEFAULTS:
+                # The round and the outcome comment are not the field's
+                if column in df.columns and column not in ("round", "comment"):
+                    values[column] = latest[column]
+    values.update({k: v for k, v in context.items() if v is not None})
+    return values
+
+
+def pairwise_frame(df, player_ids, states, date, context):
+    """
+    Build the feature rows of every ordered pair of distinct players.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The match data, whose columns the rows follow.
+    player_ids : numpy.ndarray
+        The N player IDs.
+    states : dict
+        The player states, see ``player_states``.
+    date : str
+        The date of the matches in 'YYYY-MM-DD' format.
+    context : dict
+        The match columns, see ``match_context``.
+
+    Returns
+    -------
+    frame : pandas.DataFrame
+        The N * (N - 1) matches, row-major over (player 1, player 2).
+    i, j : numpy.ndarray
+        The positions of player 1 and player 2 in ``player_ids``.
+    """
+    n = len(player_ids)
+    i, j = np.nonzero(~np.eye(n, dtype=bool))
+    timestamp = pd.Timestamp(date)
+    rank_p1, rank_p2 = states["rank"][i], states["rank"][j]
+    elo_p1, elo_p2 = states["elo"][i], states["elo"][j]
+    columns = {
+        "date": np.full(len(i), timestamp.to_datetime64()),
+        "p1": np.asarray(player_ids)[i],
+        "p2": np.asarray(player_ids)[j],
+        "rank_p1": rank_p1,
+        "rank_p2": rank_p2,
+        "elo_p1": elo_p1,
+        "elo_p2": elo_p2,
+        "proba_elo": expected_score(elo_p1, elo_p2),
+        "year": timestamp.year,
+        "month": timestamp.month,
+        "day": timestamp.day,
+        "rank_diff": rank_p1 - rank_p2,
+        # As in the data preparation: p2 only when ranked strictly better
+        "best_ranked": np.where(rank_p1 - rank_p2 > 0, "p2", "p1"),
+    }
+    frame = pd.DataFrame(
+        {
+            column: columns.get(column, context.get(column, np.nan))
+            for column in df.columns
+        },
+        index=pd.RangeIndex(len(i)),
+    )
+    return frame, i, j
+
+
+def pairwise_matrix(model, df, player_index, player_ids, date, players=None, **context):
+    """
+    The probability of each player beating each other one, in one model call.
+
+    Each pair is scored in both orientations, the matrix averaging P(i beats
+    j) with 1 - P(j beats i), so that ``P + P.T`` is 1 off the diagonal.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model.
+    df : pandas.DataFrame
+        The match data, with integer player IDs.
+    player_index : PlayerRowIndex
+        The rows of the matches of each player, sorted by date.
+    player_ids : numpy.ndarray
+        The N player IDs.
+    date : str
+        The date of the matches in 'YYYY-MM-DD' format.
+    players : PlayerDictionary, optional
+        The dictionary the player IDs refer to, for models trained on names.
+    **context
+        The match columns, see ``match_context``.
+
+    Returns
+    -------
+    numpy.ndarray
+        The N x N matrix of the probability of the row player beating the
+        column player, NaN on the diagonal.
+    """
+    player_ids = np.asarray(player_ids, dtype=np.int64)
+    n = len(player_ids)
+    with span("features"):
+        states = player_states(df, player_index, player_ids, date)
+        frame, i, j = pairwise_frame(
+            df, player_ids, states, date, match_context(df, date, **context)
+        )
+    with span("scoring"):
+        prob = predict_frame(model, frame, players)[0] if len(frame) else []
+    oriented = np.full((n, n), np.nan)
+    oriented[i, j] = prob
+    return (oriented + 1 - oriented.T) / 2
@@ -0,0 +1,251 @@
+"""
+Prefix and typo-tolerant lookup of player names.
+
+Names in the data follow the ``"Surname I."`` format, which clients rarely
+match exactly. The index is built once from the player names of the served
+data and answers prefix (autocompletion) queries by bisection over sorted
+keys, and fuzzy queries by trigram candidate generation followed by a bounded
+edit distance, so that no lookup scans the match data.
+"""
+
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+# Score of each kind of match, fuzzy matches score below 1 by edit similarity
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.95
+TOKEN_PREFIX_SCORE = 0.9
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a name for lookups: no accents, case or punctuation.
+
+    Parameters
+    ----------
+    name : str
+        The name to normalize.
+
+    Returns
+    -------
+    str
+        The normalized name, e.g. ``"del potro j m"`` for ``"Del Potro J.M."``.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    name = "".join(c if c.isalnum() else " " for c in name)
+    return " ".join(name.split())
+
+
+def trigrams(key: str) -> set:
+    """The padded character trigrams of a normalized key."""
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Levenshtein distance between two strings, bounded for early exit.
+
+    Parameters
+    ----------
+    a, b : str
+        The strings to compare.
+    max_distance : int
+        The distance above which the exact value does not matter.
+
+    Returns
+    -------
+    int
+        The distance, or ``max_distance + 1`` if it exceeds ``max_distance``.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class PlayerNameIndex:
+    """
+    Prefix and fuzzy lookup index over player names.
+
+    Parameters
+    ----------
+    names : Iterable[str]
+        The player names, as they appear in the data.
+    min_score : float, default=0.7
+        The minimal similarity of a fuzzy match.
+    """
+
+    def __init__(self, names: Iterable[str], min_score: float = 0.7):
+        self.names = sorted(set(names))
+        self.min_score = min_score
+        self._by_key: Dict[str, List[str]] = defaultdict(list)
+        # Sorted (key, is_token, name): the full key, then each key suffix
+        # starting at a surname token so that "agut" finds "Bautista Agut R."
+        entries = []
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        for i, name in enumerate(self.names):
+            key = normalize_name(name)
+            self._by_key[key].append(name)
+            entries.append((key, False, name))
+            tokens = key.split()
+            for t in range(1, len(tokens)):
+                if len(tokens[t]) > 1:
+                    entries.append((" ".join(tokens[t:]), True, name))
+            for gram in trigrams(key):
+                self._trigrams[gram].append(i)
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Autocomplete a name prefix.
+
+        Parameters
+        ----------
+        query : str
+            The beginning of a surname, or of any surname part.
+        limit : int, default=10
+            The maximal number of matches.
+
+        Returns
+        -------
+        List[Dict]
+            The matches, full-name prefixes first, then alphabetically.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+        matches: Dict[str, Dict] = {}
+        start = bisect_left(self._keys, key)
+        for entry_key, is_token, name in self._entries[start:]:
+            if not entry_key.startswith(key):
+                break
+            score = TOKEN_PREFIX_SCORE if is_token else PREFIX_SCORE
+            if entry_key == key and not is_token:
+                score = EXACT_SCORE
+            if name not in matches or matches[name]["score"] < score:
+                matches[name] = {"name": name, "score": score, "match": "prefix"}
+        ranked = sorted(matches.values(), key=lambda m: (-m["score"], m["name"]))
+        return ranked[:limit]
+
+    def fuzzy(self, query: str, limit: int = 10, candidates: int = 50) -> List[Dict]:
+        """
+        Find the names closest to a possibly misspelled query.
+
+        Parameters
+        ----------
+        query : str
+            The name to look up.
+        limit : int, default=10
+            The maximal number of matches.
+        candidates : int, default=50
+            The number of names sharing the most trigrams with the query that
+            are compared by edit distance.
+
+        Returns
+        -------
+        List[Dict]
+            The matches with a similarity of at least ``min_score``, best first.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+        shared = Counter()
+        for gram in trigrams(key):
+            shared.update(self._trigrams.get(gram, ()))
+        matches = []
+        for i, _ in shared.most_common(candidates):
+            name = self.names[i]
+            name_key = normalize_name(name)
+            # Compare with the full name and with the surname alone, so that
+            # a query without initials is not penalized for the missing part
+            targets = {name_key, name_key.rsplit(" ", 1)[0]}
+            best = 0.0
+            for target in targets:
+                length = max(len(key), len(target))
+                max_distance = int(length * (1 - self.min_score))
+                distance = edit_distance(key, target, max_distance)
+                if distance <= max_distance:
+                    best = max(best, 1 - distance / length)
+            if best >= self.min_score:
+                matches.append(
+                    {"name": name, "score": round(best, 3), "match": "fuzzy"}
+                )
+        matches.sort(key=lambda m: (-m["score"], m["name"]))
+        return matches[:limit]
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[Dict]:
+        """
+        Search names by prefix, completed by fuzzy matches.
+
+        Parameters
+        ----------
+        query : str
+            The name, or name prefix, to look up.
+        limit : int, default=10
+            The maximal number of matches.
+        fuzzy : bool, default=True
+            Whether to complete the prefix matches with fuzzy matches.
+
+        Returns
+        -------
+        List[Dict]
+            The matches, with their name, score and kind of match.
+        """
+        matches = self.prefix(query, limit)
+        if fuzzy and len(matches) < limit:
+            found = {m["name"] for m in matches}
+            fuzzy_matches = self.fuzzy(query, limit)
+            extra = [m for m in fuzzy_matches if m["name"] not in found]
+            matches += extra[: limit - len(matches)]
+        return matches
+
+    def resolve(self, query: str) -> Optional[str]:
+        """
+        Resolve a client name to the unique name of the data it refers to.
+
+        Parameters
+        ----------
+        query : str
+            The name sent by the client.
+
+        Returns
+        -------
+        str or None
+            The exact name, the only name with that normalized form or
+            prefix, or the single best fuzzy match; None if ambiguous or
+            unknown.
+        """
+        names = self._by_key.get(normalize_name(query), [])
+        if query in names:
+            return query
+        if len(names) == 1:
+            return names[0]
+        prefixes = [
+            m for m in self.prefix(query, limit=2) if m["score"] >= PREFIX_SCORE
+        ]
+        if len(prefixes) == 1:
+            return prefixes[0]["name"]
+        if prefixes:
+            return None
+        matches = self.fuzzy(query, limit=2)
+        if len(matches) == 1 or (matches and matches[0]["score"] > matches[1]["score"]):
+            return matches[0]["name"]
+        return None
@@ -1,6 +1,15 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from joblib import load
+from joblib import hash as joblib_hash, load
+
+from acebet.app.dependencies.tracing import span
+from acebet.dataprep.player_index import PlayerRowIndex
+from acebet.dataprep.players import PlayerDictionary, intern_players
+from acebet.dataprep.validate import NON_PREDICTORS
+
+# Bits of a packed match key holding each player ID
+PLAYER_ID_BITS = 20
 
 
 def load_data(data_file):
@@ -34,7 +43,34 @@ def load_data(data_file):
         raise ValueError(f"Error occurred while loading data: {e}")
 
 
-def query_data(df, p1_name, p2_name, date):
+def load_players(data_file, df):
+    """
+    Load the player dictionary of a data file and intern the player names.
+
+    The dictionary is read from ``atp_players.feather`` next to the data file.
+    Data files still holding player names (such as the packaged sample) are
+    interned on the fly.
+
+    Parameters
+    ----------
+    data_file : str
+        The path to the data file.
+    df : pandas.DataFrame
+        The loaded data.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The data with integer player IDs.
+    players : PlayerDictionary
+        The player dictionary.
+
+    """
+    players = PlayerDictionary.load(Path(data_file).with_name("atp_players.feather"))
+    return intern_players(df, players)
+
+
+def query_data(df, p1_name, p2_name, date, players=None):
     """
     Query the data by player names and date.
 
@@ -52,6 +88,10 @@ def query_data(df, p1_name, p2_name, date):
         The name of the second player.
     date : str
         The date of the match in 'YYYY-MM-DD' format.
+    players : PlayerDictionary, optional
+        The dictionary the 'p1' and 'p2' IDs of the DataFrame refer to. Names
+        are resolved to IDs once and the columns compared as integers. By
+        default the columns are compared to the names.
 
     Returns
     -------
@@ -80,17 +120,24 @@ def query_data(df, p1_name, p2_name, date):
 
     try:
         # Ensure the 'date' column is in datetime format
-        df["date"] = pd.to_datetime(df["date"])
+        if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+            df["date"] = pd.to_datetime(df["date"])
 
         # Convert the input date to datetime64[ns]
         date = pd.to_datetime(date)
 
-        # Query the DataFrame based on player names and date, handling both player order possibilities.
-        query = (
-            f'(p1 == "{p1_name}" and p2 == "{p2_name}" and date == @date)'
-            f' or (p1 == "{p2_name}" and p2 == "{p1_name}" and date == @date)'
+        # Resolve the names at the edge, an unknown player matches no row
+        if players is not None:
+            p1_name, p2_name = players.id_of(p1_name), players.id_of(p2_name)
+            if p1_name is None or p2_name is None:
+                return df.iloc[:0]
+
+        # Filter on player names and date, handling both player order possibilities.
+        p1, p2 = df["p1"].to_numpy(), df["p2"].to_numpy()
+        mask = (df["date"].to_numpy() == date.to_datetime64()) & (
+            ((p1 == p1_name) & (p2 == p2_name)) | ((p1 == p2_name) & (p2 == p1_name))
         )
-        return df.query(query)
+        return df[mask]
     except KeyError as e:
         # Raise an error if the required columns are not present in the DataFrame.
         raise KeyError(f"Invalid column names in the data: {e}")
@@ -99,9 +146,181 @@ def query_data(df, p1_name, p2_name, date):
         raise ValueError(f"Error occurred while querying data: {e}")
 
 
-def predict(model, df):
+def match_keys(dates, p1_ids, p2_ids):
     """
-    Predict the probability and outcome (class) for the given data.
+    Pack match dates and player IDs into order-independent integer keys.
+
+    Parameters
+    ----------
+    dates : array-like of datetime64
+        The match dates.
+    p1_ids : array-like of int
+        The IDs of player 1.
+    p2_ids : array-like of int
+        The IDs of player 2.
+
+    Returns
+    -------
+    numpy.ndarray
+        The int64 keys, equal for both player orders of the same match.
+
+    """
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    p1_ids, p2_ids = np.asarray(p1_ids, np.int64), np.asarray(p2_ids, np.int64)
+    low, high = np.minimum(p1_ids, p2_ids), np.maximum(p1_ids, p2_ids)
+    return (days << (2 * PLAYER_ID_BITS)) | (low << PLAYER_ID_BITS) | high
+
+
+def build_match_index(df):
+    """
+    Index the rows of the data by match date and player IDs.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data, with integer player IDs.
+
+    Returns
+    -------
+    dict
+        The row position of each match key, the first row for duplicates.
+
+    """
+    if len(df) and max(df["p1"].max(), df["p2"].max()) >= 1 << PLAYER_ID_BITS:
+        raise ValueError(f"Player IDs do not fit in {PLAYER_ID_BITS} bits.")
+    keys = match_keys(df["date"].to_numpy(), df["p1"], df["p2"])
+    # Insert in reverse so that the first row of a duplicated key wins
+    return dict(zip(keys[::-1].tolist(), range(len(keys) - 1, -1, -1)))
+
+
+def lookup_match(match_index, players, p1_name, p2_name, date):
+    """
+    Find the row of a match by player names and date.
+
+    Parameters
+    ----------
+    match_index : dict
+        The index built by ``build_match_index``.
+    players : PlayerDictionary
+        The dictionary the indexed player IDs refer to.
+    p1_name : str
+        The name of the first player.
+    p2_name : str
+        The name of the second player.
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+
+    Returns
+    -------
+    int or None
+        The row position of the match, None if not found.
+
+    """
+    p1_id, p2_id = players.id_of(p1_name), players.id_of(p2_name)
+    if p1_id is None or p2_id is None:
+        return None
+    key = match_keys([pd.to_datetime(date).to_datetime64()], [p1_id], [p2_id])[0]
+    return match_index.get(int(key))
+
+
+def load_player_index(data_file, df, players):
+    """
+    Load the player row index built alongside a data file.
+
+    The index is read from ``atp_player_index.npz`` next to the data file, and
+    built from the data when missing or out of date, that is when it was built
+    from data with another fingerprint.
+
+    Parameters
+    ----------
+    data_file : str
+        The path to the data file.
+    df : pandas.DataFrame
+        The loaded data, with integer player IDs.
+    players : PlayerDictionary
+        The player dictionary.
+
+    Returns
+    -------
+    PlayerRowIndex
+        The index from player ID to the rows of their matches.
+
+    """
+    index = PlayerRowIndex.load(Path(data_file).with_name("atp_player_index.npz"))
+    if (
+        index is None
+        or index.fingerprint != PlayerRowIndex.data_fingerprint(df)
+        or index.n_players < len(players)
+    ):
+        index = PlayerRowIndex.build(df, n_players=len(players))
+    return index
+
+
+def match_records(df, rows, players):
+    """
+    Gather the matches at the given rows as records with player names.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data, with integer player IDs.
+    rows : numpy.ndarray
+        The row positions to gather.
+    players : PlayerDictionary
+        The dictionary the player IDs refer to.
+
+    Returns
+    -------
+    list of dict
+        One record per row, in the order of ``rows``.
+
+    """
+    matches = df.iloc[rows]
+    p1, p2 = players.decode(matches["p1"]), players.decode(matches["p2"])
+    target = matches["target"].to_numpy(dtype=bool)
+    records = pd.DataFrame(
+        {
+            "date": matches["date"].dt.strftime("%Y-%m-%d").to_numpy(),
+            "tournament": matches["tournament"].to_numpy(),
+            "surface": matches["surface"].to_numpy(),
+            "round": matches["round"].to_numpy(),
+            "p1": p1,
+            "p2": p2,
+            "rank_p1": matches["rank_p1"].to_numpy(),
+            "rank_p2": matches["rank_p2"].to_numpy(),
+            "winner": np.where(target, p1, p2),
+        }
+    )
+    # Missing values (e.g. unknown ranks) are reported as None
+    return records.astype(object).where(records.notna(), None).to_dict("records")
+
+
+def model_uses_player_ids(model):
+    """
+    Whether the encoder of a model was fitted on player IDs or on player names.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model, whose first step is the encoder.
+
+    Returns
+    -------
+    bool
+        True if the 'p1' categories are integers, False for names.
+
+    """
+    encoder = model.steps[0][1]
+    p1_idx = list(encoder.feature_names_in_).index("p1")
+    return encoder.categories_[p1_idx].dtype.kind in "iuf"
+
+
+def predict_frame(model, df, players=None):
+    """
+    Predict the probabilities and outcomes (classes) of many matches at once.
+
+    The model is called once for all the rows, the classes being derived
+    from the probabilities as ``model.predict`` would.
 
     Parameters
     ----------
@@ -109,30 +328,188 @@ def predict(model, df):
         The model to use for prediction.
     df : pandas.DataFrame
         The data to predict.
+    players : PlayerDictionary, optional
+        The dictionary the 'p1' and 'p2' IDs of the data refer to, used to
+        decode the IDs for models trained on player names.
 
     Returns
     -------
-    prob : float
-        The probability of player 1 winning.
-    class_ : int
-        The class of the prediction (0 or 1).
+    prob : numpy.ndarray
+        The probability of player 1 winning, per row.
+    class_ : numpy.ndarray
+        The class of the prediction (0 or 1), per row.
 
     """
     # Create a list of predictors by excluding non-predictive columns.
-    predictors = df.columns.drop(
-        ["target", "date", "sets_p1", "sets_p2", "b365_p1", "b365_p2", "ps_p1", "ps_p2"]
-    )
-    X = df[predictors].copy()
+    X = df[df.columns.drop(NON_PREDICTORS)]
     try:
+        # Models trained before the players were interned expect names
+        if players is not None and not model_uses_player_ids(model):
+            X = X.assign(p1=players.decode(X["p1"]), p2=players.decode(X["p2"]))
         # Use the trained model to predict the probability and class.
         prob = model.predict_proba(X)[:, 1]
-        class_ = model.predict(X)
-        return prob, class_, X["p1"].values[0]
+        class_ = model.classes_[(prob > 0.5).astype(int)]
+        return prob, class_
     except Exception as e:
         # Raise an error if any prediction-related exceptions occur.
         raise ValueError(f"Error occurred during prediction: {e}")
 
 
+def encoder_key(model):
+    """
+    Fingerprint the preprocessing steps of a model pipeline.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model.
+
+    Returns
+    -------
+    str
+        A hash of the fitted steps before the final estimator, equal for two
+        models encoding the data identically.
+
+    """
+    return joblib_hash(model[:-1])
+
+
+def encode_features(model, df, players=None):
+    """
+    Run the preprocessing steps of a model pipeline over a whole dataset.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model, whose steps before the final estimator encode the data.
+    df : pandas.DataFrame
+        The data to encode.
+    players : PlayerDictionary, optional
+        The dictionary the 'p1' and 'p2' IDs of the data refer to, used to
+        decode the IDs for models trained on player names.
+
+    Returns
+    -------
+    numpy.ndarray
+        The float32 encoded feature matrix, aligned with the rows of ``df``.
+
+    """
+    X = df[df.columns.drop(NON_PREDICTORS)]
+    if players is not None and not model_uses_player_ids(model):
+        X = X.assign(p1=players.decode(X["p1"]), p2=players.decode(X["p2"]))
+    return np.ascontiguousarray(model[:-1].transform(X), dtype=np.float32)
+
+
+def predict_encoded(model, features, rows):
+    """
+    Predict the matches at the given rows of a precomputed feature matrix.
+
+    Only the final estimator of the pipeline runs: the rows are gathered from
+    the matrix built by ``encode_features``.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model the features were encoded with.
+    features : numpy.ndarray
+        The encoded feature matrix.
+    rows : numpy.ndarray or slice
+        The row positions to predict, or a slice of rows, read without a copy.
+
+    Returns
+    -------
+    prob : numpy.ndarray
+        The probability of player 1 winning, per row.
+    class_ : numpy.ndarray
+        The class of the prediction (0 or 1), per row.
+
+    """
+    estimator = model[-1]
+    with span("features"):
+        X = features[rows]
+    try:
+        with span("scoring"):
+            if hasattr(estimator, "booster_"):
+                # The LightGBM booster scores the raw matrix directly
+                prob = estimator.booster_.predict(X)
+            else:
+                prob = estimator.predict_proba(X)[:, 1]
+        class_ = estimator.classes_[(prob > 0.5).astype(int)]
+        return prob, class_
+    except Exception as e:
+        # Raise an error if any prediction-related exceptions occur.
+        raise ValueError(f"Error occurred during prediction: {e}")
+
+
+def explain_encoded(model, features, rows):
+    """
+    Compute the feature contributions of the matches at the given rows.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model the features were encoded with, ending with a LightGBM
+        classifier.
+    features : numpy.ndarray
+        The encoded feature matrix.
+    rows : numpy.ndarray
+        The row positions to explain.
+
+    Returns
+    -------
+    numpy.ndarray
+        The contribution of each feature, then the base value, per row, in
+        log-odds: a row sums to the raw score of its prediction.
+
+    Raises
+    ------
+    ValueError
+        If the final estimator of the model is not a LightGBM model.
+    """
+    estimator = model[-1]
+    if not hasattr(estimator, "booster_"):
+        raise ValueError(
+            f"{type(estimator).__name__} models do not provide contributions"
+        )
+    with span("features"):
+        X = features[rows]
+    with span("explain"):
+        return estimator.booster_.predict(X, pred_contrib=True)
+
+
+def predict(model, df, players=None):
+    """
+    Predict the probability and outcome (class) for the given data.
+
+    Parameters
+    ----------
+    model : sklearn.base.BaseEstimator
+        The model to use for prediction.
+    df : pandas.DataFrame
+        The data to predict.
+    players : PlayerDictionary, optional
+        The dictionary the 'p1' and 'p2' IDs of the data refer to. It decodes
+        the IDs for models trained on player names and the returned name.
+
+    Returns
+    -------
+    prob : float
+        The probability of player 1 winning.
+    class_ : int
+        The class of the prediction (0 or 1).
+    player_1 : str
+        The name of player 1.
+
+    """
+    if df.empty:
+        raise ValueError("Error occurred during prediction: no match found")
+    player_1 = df["p1"].values[0]
+    if players is not None:
+        player_1 = players.decode([player_1])[0]
+    prob, class_ = predict_frame(model, df, players)
+    return prob, class_, player_1
+
+
 def load_model(model_path):
     """
     Load the most recent model from a directory.
@@ -156,6 +533,45 @@ def load_model(model_path):
     return load(most_recent_model_file)
 
 
+def predict_match(df, model, p1_name, p2_name, date, players=None):
+    """
+    Query already loaded data by player name and date and predict the outcome.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The loaded data.
+    model : sklearn.base.BaseEstimator
+        The loaded model.
+    p1_name : str
+        The name of player 1.
+    p2_name : str
+        The name of player 2.
+    date : str
+        The date of the match in 'YYYY-MM-DD' format.
+    players : PlayerDictionary, optional
+        The dictionary the player IDs of the data refer to.
+
+    Returns
+    -------
+    prob : float
+        The probability of player 1 winning.
+    class_ : int
+        The class of the prediction (0 or 1).
+    player_1 : str
+        The name of player 1 in the data.
+
+    """
+
+    try:
+        df_filtered = query_data(df, p1_name, p2_name, date, players)
+        return predict(model, df_filtered, players)
+    except Exception as e:
+        # Print an error message and return None for prediction in case of exceptions.
+        print(f"Error occurred: {e}")
+        return None, None, None
+
+
 def make_prediction(data_file, model_path, p1_name, p2_name, date):
     """
     Load the model, load the data, query the data by player name and date, predict the probability and outcome (class).
@@ -184,11 +600,9 @@ def make_prediction(data_file, model_path, p1_name, p2_name, date):
 
     try:
         # Load the data, model, query data by player name and date, and make predictions.
-        df = load_data(data_file)
+        df, players = load_players(data_file, load_data(data_file))
         model = load_model(model_path)
-        df_filtered = query_data(df, p1_name, p2_name, date)
-        prob, class_, player_1 = predict(model, df_filtered)
-        return prob, class_, player_1
+        return predict_match(df, model, p1_name, p2_name, date, players)
     except Exception as e:
         # Print an error message and return None for prediction in case of exceptions.
         print(f"Error occurred: {e}")
@@ -0,0 +1,337 @@
+"""
+Push of prediction updates to WebSocket subscribers.
+
+Clients subscribe to matches instead of polling ``/predict/``. The matches
+of all the subscribers of a serving state are kept as one reference-counted
+set of rows: when the served model changes, the union is re-scored with a
+single model call, once per change whatever the number of subscribers, and
+each subscriber receives the predictions of its own matches, with the
+players in the order it gave them. A subscriber only holds the latest
+update, so that a slow client never makes the server buffer a backlog of
+them.
+"""
+
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Dict, List
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from acebet.app.dependencies.data_models import MatchQuery
+from acebet.app.dependencies.responses import json_records
+
+# Matches a single connection may subscribe to
+MAX_SUBSCRIPTIONS = 1000
+
+# Replies (first predictions and errors) kept for a client not reading them
+MAX_REPLIES = 100
+
+# Fields of the pushed predictions
+FIELDS = ["date", "p1", "p2", "prob", "class_"]
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """
+    A WebSocket client, holding the messages not yet sent to it.
+
+    The replies to its own messages are queued, the updates pushed on model
+    changes are not: only the latest one is kept.
+
+    Attributes
+    ----------
+    rows : set of int
+        The rows of the matches the client subscribed to.
+    reversed_rows : set of int
+        The rows of the matches the client gave in the reverse order of the
+        data, their predictions being sent from the other player's side.
+    """
+
+    def __init__(self):
+        self.rows = set()
+        self.reversed_rows = set()
+        self._replies = deque(maxlen=MAX_REPLIES)
+        self._update = None
+        self._ready = asyncio.Event()
+
+    def orient(self, row: int, record: Dict) -> Dict:
+        """Orient the prediction of a row as the client gave the match."""
+        if row not in self.reversed_rows:
+            return record
+        return {
+            **record,
+            "p1": record["p2"],
+            "p2": record["p1"],
+            "prob": round(100 - record["prob"], 1),
+            "class_": 1 - record["class_"],
+        }
+
+    def reply(self, message: Dict):
+        """Queue a reply to a message of the client."""
+        self._replies.append(message)
+        self._ready.set()
+
+    def push(self, message: Dict):
+        """Replace the pending update, if any, by a newer one."""
+        self._update = message
+        self._ready.set()
+
+    async def next_message(self) -> Dict:
+        """Wait for the next message to send."""
+        while True:
+            if self._replies:
+                return self._replies.popleft()
+            if self._update is not None:
+                message, self._update = self._update, None
+                return message
+            self._ready.clear()
+            await self._ready.wait()
+
+
+class PredictionChannel:
+    """
+    The subscriptions to the predictions of one serving state.
+
+    Parameters
+    ----------
+    state : ServingState
+        The serving state.
+    loop : asyncio.AbstractEventLoop
+        The event loop of the WebSocket connections.
+
+    Attributes
+    ----------
+    subscribers : set of Subscriber
+        The connected subscribers.
+    rows : collections.Counter
+        The number of subscribers of each row.
+    n_rescores : int
+        The number of re-scores made on model changes.
+    """
+
+    def __init__(self, state, loop):
+        self.state = state
+        self.loop = loop
+        self.subscribers = set()
+        self.rows = Counter()
+        self.n_rescores = 0
+        self._version = state.version_tag()
+        self._rescoring = None
+        self._pending = False
+
+    def notify(self):
+        """Schedule a re-score. Thread-safe, called on model changes."""
+        try:
+            self.loop.call_soon_threadsafe(self._schedule)
+        except RuntimeError:
+            # The event loop is closed
+            pass
+
+    def _schedule(self):
+        # Changes arriving during a re-score are coalesced into one more
+        if self._rescoring is None or self._rescoring.done():
+            self._rescoring = self.loop.create_task(self._rescore())
+        else:
+            self._pending = True
+
+    async def _rescore(self):
+        while True:
+            self._pending = False
+            try:
+                await self.broadcast()
+            except Exception as e:
+                logger.error(f"Prediction push failed: {e}")
+            if not self._pending:
+                return
+
+    async def broadcast(self):
+        """
+        Re-score all the subscribed rows and push them, if the version of the
+        served data or model changed.
+        """
+        version = self.state.version_tag()
+        if version == self._version or not self.rows:
+            self._version = version
+            return
+        self._version = version
+        rows = sorted(self.rows)
+        columns = await run_in_threadpool(self.state.predict_rows, rows)
+        self.n_rescores += 1
+        records = dict(zip(rows, json_records(columns, FIELDS)))
+        model = self.describe_model()
+        for subscriber in list(self.subscribers):
+            # Rows subscribed to during the re-score were sent on subscription
+            predictions = [
+                subscriber.orient(r, records[r])
+                for r in sorted(subscriber.rows)
+                if r in records
+            ]
+            subscriber.push(self._message(model, predictions))
+
+    def describe_model(self) -> Dict:
+        current = self.state.current
+        return {
+            "model_version": current.version if current is not None else None,
+            "model_file": current.model_file.name if current is not None else None,
+        }
+
+    @staticmethod
+    def _message(model: Dict, predictions: List[Dict]) -> Dict:
+        return {"type": "predictions", **model, "predictions": predictions}
+
+    async def subscribe(self, subscriber: Subscriber, matches: List) -> List:
+        """
+        Subscribe to matches, pushing their current predictions.
+
+        Parameters
+        ----------
+        subscriber : Subscriber
+            The subscriber.
+        matches : list of MatchQuery
+            The matches.
+
+        Returns
+        -------
+        list of MatchQuery
+            The matches not found, not subscribed to.
+        """
+        located = await run_in_threadpool(self.state.locate_matches, matches)
+        first_names = {}
+        for match, row in zip(matches, located):
+            if row >= 0 and row not in subscriber.rows:
+                name = self.state.name_index.resolve(match.p1_name)
+                first_names.setdefault(row, name or match.p1_name)
+        self.subscribers.add(subscriber)
+        subscriber.rows |= first_names.keys()
+        self.rows.update(first_names.keys())
+        if first_names:
+            rows = sorted(first_names)
+            columns = await run_in_threadpool(self.state.predict_rows, rows)
+            records = json_records(columns, FIELDS)
+            for row, record in zip(rows, records):
+                if record["p1"] != first_names[row]:
+                    subscriber.reversed_rows.add(row)
+            predictions = [
+                subscriber.orient(row, record) for row, record in zip(rows, records)
+            ]
+            subscriber.reply(self._message(self.describe_model(), predictions))
+        return [match for match, row in zip(matches, located) if row < 0]
+
+    async def unsubscribe(self, subscriber: Subscriber, matches=None):
+        """
+        Unsubscribe from matches, by default from all of them.
+
+        Parameters
+        ----------
+        subscriber : Subscriber
+            The subscriber.
+        matches : list of MatchQuery, optional
+            The matches.
+        """
+        if matches is None:
+            rows = set(subscriber.rows)
+            self.subscribers.discard(subscriber)
+        else:
+            located = await run_in_threadpool(self.state.locate_matches, matches)
+            rows = subscriber.rows & set(located)
+        subscriber.rows -= rows
+        subscriber.reversed_rows -= rows
+        self.rows.subtract(rows)
+        for row in rows:
+            if self.rows[row] <= 0:
+                del self.rows[row]
+
+
+_channels: Dict[int, PredictionChannel] = {}
+
+
+def channel_for(state) -> PredictionChannel:
+    """
+    The channel of a serving state, for the running event loop.
+
+    Parameters
+    ----------
+    state : ServingState
+        The loaded serving state.
+
+    Returns
+    -------
+    PredictionChannel
+        The channel, listening to the model changes of the state.
+    """
+    loop = asyncio.get_running_loop()
+    channel = _channels.get(id(state))
+    if channel is None or channel.loop is not loop:
+        if channel is not None:
+            state.remove_listener(channel.notify)
+        channel = PredictionChannel(state, loop)
+        state.add_listener(channel.notify)
+        _channels[id(state)] = channel
+    return channel
+
+
+def _parse_message(message) -> tuple:
+    if not isinstance(message, dict) or not isinstance(message.get("matches"), list):
+        raise ValueError("Expected an 'action' and a list of 'matches'")
+    matches = [MatchQuery.model_validate(match) for match in message["matches"]]
+    return message.get("action"), matches
+
+
+async def _send_updates(websocket: WebSocket, subscriber: Subscriber):
+    while True:
+        await websocket.send_json(await subscriber.next_message())
+
+
+async def serve_subscriber(websocket: WebSocket, channel: PredictionChannel):
+    """
+    Serve the subscription messages of an accepted WebSocket connection.
+
+    The client sends ``{"action": "subscribe", "matches": [...]}`` or
+    ``{"action": "unsubscribe", "matches": [...]}``, the matches given by
+    'p1_name', 'p2_name' and 'date'. The predictions of the new matches, from
+    the side of their 'p1_name', are sent right away, then all the
+    predictions of the client whenever the served model changes.
+
+    Parameters
+    ----------
+    websocket : WebSocket
+        The accepted connection.
+    channel : PredictionChannel
+        The channel of the serving state.
+    """
+    subscriber = Subscriber()
+    sender = asyncio.create_task(_send_updates(websocket, subscriber))
+    try:
+        while True:
+            try:
+                action, matches = _parse_message(await websocket.receive_json())
+            except (ValueError, ValidationError) as e:
+                subscriber.reply({"type": "error", "detail": str(e)})
+                continue
+            if action == "subscribe":
+                if len(subscriber.rows) + len(matches) > MAX_SUBSCRIPTIONS:
+                    detail = f"At most {MAX_SUBSCRIPTIONS} subscriptions"
+                    subscriber.reply({"type": "error", "detail": detail})
+                    continue
+                missing = await channel.subscribe(subscriber, matches)
+                if missing:
+                    subscriber.reply(
+                        {
+                            "type": "error",
+                            "detail": "Matches not found",
+                            "matches": [match.model_dump() for match in missing],
+                        }
+                    )
+            elif action == "unsubscribe":
+                await channel.unsubscribe(subscriber, matches)
+            else:
+                subscriber.reply({"type": "error", "detail": "Unknown action"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await channel.unsubscribe(subscriber)
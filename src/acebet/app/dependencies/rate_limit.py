@@ -0,0 +1,245 @@
+"""
+Per-user token-bucket rate limiting shared by all the workers of a host.
+
+Buckets live in a memory-mapped file (in ``/dev/shm`` when available), so
+every worker process sees the same buckets. A check hashes the key to a slot
+of a fixed-size open-addressing table and does one read and one write of a
+24-byte record, without taking any lock. Concurrent updates of the same
+bucket may race, in which case one of them is lost: the limiter may then let
+a request through that it should have refused, which is an acceptable price
+for a lock-free hot path.
+
+Limits are configured per route and per user tier in ``ROUTE_LIMITS``.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, Response, status
+
+from .auth import get_current_user, get_user_identifier
+from .data_models import UserInDB
+from .tracing import span
+
+# Limits of each route, per user tier, in the "<count>/<period>" format
+ROUTE_LIMITS: Dict[str, Dict[str, str]] = {
+    "default": {"free": "60/minute", "pro": "600/minute"},
+    "predict": {"free": "60/minute", "pro": "600/minute"},
+    "bulk": {"free": "10/minute", "pro": "100/minute"},
+    "search": {"free": "120/minute", "pro": "1200/minute"},
+    "history": {"free": "60/minute", "pro": "600/minute"},
+}
+
+# The file holding the buckets, shared by the workers of the host
+RATE_LIMIT_FILE = os.environ.get(
+    "ACEBET_RATE_LIMIT_FILE",
+    str(
+        Path("/dev/shm" if Path("/dev/shm").is_dir() else tempfile.gettempdir())
+        / "acebet_rate_limit.bin"
+    ),
+)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# A bucket: key hash (0 for a free slot), tokens left, time of last update
+_SLOT = struct.Struct("<Qdd")
+
+
+class RateLimit:
+    """
+    A token-bucket limit.
+
+    Parameters
+    ----------
+    limit : str
+        The limit in the "<count>/<period>" format, e.g. "60/minute". The
+        bucket holds up to ``count`` tokens, refilled continuously over the
+        period.
+    """
+
+    def __init__(self, limit: str):
+        count, period = limit.split("/")
+        self.limit = limit
+        self.capacity = float(count)
+        self.rate = self.capacity / _PERIODS[period.strip().rstrip("s")]
+
+    def __repr__(self):
+        return f"RateLimit({self.limit!r})"
+
+
+def limit_for(route: str, tier: str | None) -> RateLimit:
+    """
+    The limit of a route for a user tier.
+
+    Parameters
+    ----------
+    route : str
+        The route key in ``ROUTE_LIMITS``, "default" if unknown.
+    tier : str or None
+        The user tier, "free" if unknown.
+
+    Returns
+    -------
+    RateLimit
+        The limit.
+    """
+    limits = ROUTE_LIMITS.get(route, ROUTE_LIMITS["default"])
+    return _parse_limit(limits.get(tier or "free", limits["free"]))
+
+
+_parsed_limits: Dict[str, RateLimit] = {}
+
+
+def _parse_limit(limit: str) -> RateLimit:
+    if limit not in _parsed_limits:
+        _parsed_limits[limit] = RateLimit(limit)
+    return _parsed_limits[limit]
+
+
+class TokenBucketStore:
+    """
+    Token buckets in a memory-mapped, fixed-size hash table.
+
+    Parameters
+    ----------
+    path : str or Path
+        The file backing the table, created if missing.
+    slots : int, default=4096
+        The number of buckets of the table.
+    probes : int, default=8
+        The number of slots probed for a key before evicting the bucket
+        updated the longest time ago.
+    """
+
+    def __init__(self, path, slots: int = 4096, probes: int = 8):
+        self.path = Path(path)
+        self.slots = slots
+        self.probes = probes
+        size = slots * _SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # A hash stable across processes, never 0 which marks free slots
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") | 1
+
+    def _find(self, key_hash: int) -> Tuple[int, float | None, float | None]:
+        start = key_hash % self.slots
+        stalest_offset, stalest_time = None, math.inf
+        for probe in range(self.probes):
+            offset = ((start + probe) % self.slots) * _SLOT.size
+            slot_hash, tokens, updated = _SLOT.unpack_from(self._mmap, offset)
+            if slot_hash == key_hash:
+                return offset, tokens, updated
+            if slot_hash == 0:
+                return offset, None, None
+            if updated < stalest_time:
+                stalest_offset, stalest_time = offset, updated
+        return stalest_offset, None, None
+
+    def acquire(
+        self, key: str, limit: RateLimit, cost: float = 1.0, now: float | None = None
+    ) -> Tuple[bool, float, float]:
+        """
+        Take tokens from the bucket of a key.
+
+        Parameters
+        ----------
+        key : str
+            The bucket key, e.g. the route and the user identifier.
+        limit : RateLimit
+            The limit of the bucket.
+        cost : float, default=1.0
+            The number of tokens to take.
+        now : float, optional
+            The current time in seconds, by default the wall clock, shared by
+            all the processes of the host.
+
+        Returns
+        -------
+        allowed : bool
+            Whether the tokens were available and taken.
+        remaining : float
+            The tokens left in the bucket.
+        retry_after : float
+            The seconds to wait for the tokens to be available, 0 if allowed.
+        """
+        now = time.time() if now is None else now
+        key_hash = self._hash(key)
+        offset, tokens, updated = self._find(key_hash)
+        if tokens is None:
+            tokens, updated = limit.capacity, now
+        tokens = min(limit.capacity, tokens + max(now - updated, 0.0) * limit.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        _SLOT.pack_into(self._mmap, offset, key_hash, tokens, now)
+        retry_after = 0.0 if allowed else (cost - tokens) / limit.rate
+        return allowed, tokens, retry_after
+
+
+_store: TokenBucketStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> TokenBucketStore:
+    """The bucket store of the process, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TokenBucketStore(RATE_LIMIT_FILE)
+    return _store
+
+
+def rate_limit(route: str):
+    """
+    Build a dependency limiting a route per authenticated user.
+
+    Parameters
+    ----------
+    route : str
+        The route key in ``ROUTE_LIMITS``.
+
+    Returns
+    -------
+    Callable
+        The dependency, raising a 429 HTTPException when the limit of the
+        user tier is exceeded, and setting the `X-RateLimit-*` headers.
+    """
+
+    async def check_rate_limit(
+        response: Response,
+        identifier: str = Depends(get_user_identifier),
+        current_user: UserInDB = Depends(get_current_user),
+    ) -> None:
+        limit = limit_for(route, current_user.tier)
+        with span("rate_limit"):
+            allowed, remaining, retry_after = get_store().acquire(
+                f"{route}:{identifier}", limit
+            )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {limit.limit}",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        response.headers["X-RateLimit-Limit"] = limit.limit
+        response.headers["X-RateLimit-Remaining"] = str(int(remaining))
+
+    return check_rate_limit
@@ -0,0 +1,219 @@
+"""
+On-demand profiling of the prediction requests.
+
+A profiling session is armed from the admin routes, for the next N requests
+or for a time window, and single requests of administrators can ask to be
+profiled with the ``X-AceBet-Profile`` header. Two modes are available:
+
+- "sampling": a background thread samples the stacks of the threads serving
+  the profiled requests every few milliseconds, aggregated as collapsed
+  stacks ready for flame graph tools (``flamegraph.pl``, speedscope).
+- "deterministic": each profiled request runs under ``cProfile``, aggregated
+  as a pstats file readable with ``pstats`` or snakeviz.
+
+When no session is armed, a request only pays for one attribute check.
+Profiles are per worker process.
+"""
+
+import cProfile
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+MODES = ("sampling", "deterministic")
+
+
+class RequestProfiler:
+    """
+    Profiler of the requests of a worker process.
+
+    Parameters
+    ----------
+    interval : float, default=0.005
+        The seconds between two stack samples in sampling mode.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.mode = "sampling"
+        self.active = False
+        self.remaining = None
+        self.deadline = None
+        self._lock = threading.Lock()
+        self._threads = set()
+        self._sampler = None
+        self.reset()
+
+    def reset(self):
+        """Clear the aggregated profiles."""
+        with self._lock:
+            self._stats = None
+            self._stacks = Counter()
+            self.n_profiled = 0
+            self.n_samples = 0
+
+    def start(
+        self,
+        mode: str = "sampling",
+        requests: int | None = 10,
+        seconds: float | None = None,
+    ):
+        """
+        Arm a profiling session, clearing the previous profiles.
+
+        Parameters
+        ----------
+        mode : str, default="sampling"
+            "sampling" or "deterministic".
+        requests : int or None, default=10
+            The number of requests to profile, unlimited if None.
+        seconds : float or None, default=None
+            The duration of the session, unlimited if None.
+
+        Raises
+        ------
+        ValueError
+            If the mode is unknown, or the session would never end.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected {MODES}")
+        if requests is None and seconds is None:
+            raise ValueError("A number of requests or a duration is required")
+        self.reset()
+        with self._lock:
+            self.mode = mode
+            self.remaining = requests
+            self.deadline = None if seconds is None else time.monotonic() + seconds
+            self.active = True
+
+    def stop(self):
+        """End the profiling session, keeping the profiles."""
+        with self._lock:
+            self.active = False
+
+    def _claim(self, force: bool) -> bool:
+        """Whether to profile a request, counting it against the session."""
+        with self._lock:
+            if self.active and self.deadline is not None:
+                if time.monotonic() >= self.deadline:
+                    self.active = False
+            if not (self.active or force):
+                return False
+            if self.active and self.remaining is not None:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.active = False
+            self.n_profiled += 1
+            return True
+
+    def run(self, func, *args, force: bool = False):
+        """
+        Call a function, profiling it if a session is armed.
+
+        Parameters
+        ----------
+        func : Callable
+            The function serving the request.
+        *args
+            The arguments of the function.
+        force : bool, default=False
+            Whether to profile the call even when no session is armed.
+
+        Returns
+        -------
+        Any
+            The result of the function.
+        """
+        if not (self.active or force) or not self._claim(force):
+            return func(*args)
+        if self.mode == "deterministic":
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args)
+            finally:
+                self._add_profile(profile)
+
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.add(ident)
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample, name="acebet-profiler", daemon=True
+                )
+                self._sampler.start()
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def _add_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def _sample(self):
+        # Sample while profiled requests are running, then exit
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._threads:
+                    self._sampler = None
+                    return
+                for ident in self._threads:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self._stacks[_collapse(frame)] += 1
+                        self.n_samples += 1
+
+    def collapsed(self) -> str:
+        """The sampled stacks, one ``frame;frame;... count`` line each."""
+        with self._lock:
+            return "".join(
+                f"{stack} {count}\n" for stack, count in sorted(self._stacks.items())
+            )
+
+    def pstats_bytes(self) -> bytes:
+        """The deterministic profiles, in the format of ``pstats.dump_stats``."""
+        with self._lock:
+            if self._stats is None:
+                return b""
+            return marshal.dumps(self._stats.stats)
+
+    def describe(self) -> Dict:
+        """Describe the session for the admin routes."""
+        with self._lock:
+            deadline = self.deadline
+            return {
+                "active": self.active,
+                "mode": self.mode,
+                "remaining_requests": self.remaining,
+                "remaining_seconds": (
+                    None
+                    if deadline is None
+                    else max(round(deadline - time.monotonic(), 1), 0.0)
+                ),
+                "profiled_requests": self.n_profiled,
+                "samples": self.n_samples,
+            }
+
+
+def _collapse(frame) -> str:
+    """The stack of a frame, outermost first, as 'module:function;...'."""
+    names = []
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        names.append(f"{module}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# The profiler of the worker process
+profiler = RequestProfiler()
@@ -0,0 +1,136 @@
+"""
+Response formats of the bulk prediction routes.
+
+Bulk predictions are computed as columns (numpy arrays). Clients sending an
+``Accept: application/vnd.apache.arrow.stream`` header receive them as an
+Arrow IPC stream of record batches, written straight from the columns
+without any per-row Python object. Other clients receive JSON records.
+"""
+
+import io
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Rows per Arrow record batch
+ARROW_BATCH_SIZE = 65536
+
+
+def accepts_arrow(request: Request) -> bool:
+    """Whether the client asked for an Arrow IPC stream."""
+    return ARROW_STREAM in request.headers.get("accept", "")
+
+
+def _arrow_table(columns: Dict, fields: List[str]):
+    import pyarrow as pa
+
+    found = columns["class_"] >= 0
+    arrays = {}
+    for field in fields:
+        values = columns[field]
+        if field == "prob":
+            arrays[field] = pa.array(values, type=pa.float64(), mask=~found)
+        elif field == "class_":
+            arrays[field] = pa.array(values, type=pa.int8(), mask=~found)
+        elif field == "date":
+            arrays[field] = pa.array(values, type=pa.string()).cast(pa.date32())
+        else:
+            arrays[field] = pa.array(values, type=pa.string())
+    return pa.table(arrays)
+
+
+def arrow_stream(
+    columns: Dict, fields: List[str], batch_size: int = ARROW_BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    Serialize prediction columns as an Arrow IPC stream, batch by batch.
+
+    Parameters
+    ----------
+    columns : Dict
+        The prediction columns, see ``ServingState.predict_rows``.
+    fields : List[str]
+        The columns to write, in order.
+    batch_size : int, default=ARROW_BATCH_SIZE
+        The number of rows per record batch.
+
+    Yields
+    ------
+    bytes
+        The schema and each record batch, then the end-of-stream marker.
+    """
+    import pyarrow as pa
+
+    table = _arrow_table(columns, fields)
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_size):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def json_records(columns: Dict, fields: List[str]) -> List[Dict]:
+    """
+    Convert prediction columns to JSON records, None for matches not found.
+
+    Parameters
+    ----------
+    columns : Dict
+        The prediction columns, see ``ServingState.predict_rows``.
+    fields : List[str]
+        The fields of each record.
+
+    Returns
+    -------
+    List[Dict]
+        One record per row.
+    """
+    found = (columns["class_"] >= 0).tolist()
+    values = [
+        [
+            value if ok else None
+            for value, ok in zip(columns[field].tolist(), found, strict=True)
+        ]
+        for field in fields
+    ]
+    return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+def columns_response(
+    request: Request,
+    columns: Dict,
+    fields: List[str],
+    headers: Optional[Dict[str, str]] = None,
+):
+    """
+    Answer with the format negotiated from the request `Accept` header.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request.
+    columns : Dict
+        The prediction columns, see ``ServingState.predict_rows``.
+    fields : List[str]
+        The columns to send, in order.
+    headers : Dict[str, str], optional
+        The headers of the Arrow stream response. JSON records are returned
+        as data, their headers being set on the route response.
+
+    Returns
+    -------
+    StreamingResponse or List[Dict]
+        An Arrow IPC stream, or JSON records to be validated by the route
+        response model.
+    """
+    if accepts_arrow(request):
+        return StreamingResponse(
+            arrow_stream(columns, fields), media_type=ARROW_STREAM, headers=headers
+        )
+    return json_records(columns, fields)
@@ -0,0 +1,1075 @@
+"""
+Serving state shared by the prediction routes.
+
+This module only depends on the standard library. The ML stack (pandas,
+numpy, joblib and, through the pickled pipeline, scikit-learn and lightgbm)
+is imported inside the functions that need it, so that importing the app
+stays cheap and routes such as ``/``, ``/token`` or ``/users/me/`` never pay
+for it. The data and the model are loaded once per source, either by the
+background warmup started with the app or by the first prediction request.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from acebet.app.dependencies.model_watch import (
+    ModelVersion,
+    ModelWatcher,
+    ShadowScorer,
+    load_model_version,
+)
+from acebet.app.dependencies.player_search import PlayerNameIndex
+from acebet.app.dependencies.tracing import span
+
+# Packaged sample data and model, used when a request sets ``testing``
+PACKAGE_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+# Production data and models live at the root of the project
+PROJECT_ROOT = Path(__file__).resolve().parents[4]
+
+# Seconds between two polls of the model directory for a new model
+MODEL_POLL_SECONDS = float(os.environ.get("ACEBET_MODEL_POLL_SECONDS", "10"))
+
+# Budget of the bracket simulations of a request, and processes running them,
+# 1 to run them in the server process
+MAX_SIMULATIONS = int(os.environ.get("ACEBET_MAX_SIMULATIONS", "1000000"))
+SIMULATION_JOBS = int(os.environ.get("ACEBET_SIMULATION_JOBS", "1"))
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_sources(testing: bool = False) -> Tuple[Path, Path]:
+    """
+    Resolve the data file and the model directory to serve from.
+
+    Parameters
+    ----------
+    testing : bool, default=False
+        Whether to use the packaged sample data and model.
+
+    Returns
+    -------
+    data_file : Path
+        The path to the feather data file.
+    model_path : Path
+        The path to the directory containing the model files.
+    """
+    if testing:
+        return PACKAGE_DATA_DIR / "atp_data_sample.feather", PACKAGE_DATA_DIR
+    return PROJECT_ROOT / "data" / "atp_data_production.feather", PROJECT_ROOT
+
+
+class ServingState:
+    """
+    The data and the model served for one source, loaded on first use.
+
+    Parameters
+    ----------
+    data_file : str or Path
+        The path to the feather data file.
+    model_path : str or Path
+        The path to the directory containing the model files.
+
+    Attributes
+    ----------
+    df : pandas.DataFrame or None
+        The served data, with integer player IDs, None until loaded.
+    players : PlayerDictionary or None
+        The dictionary the player IDs of the data refer to.
+    match_index : dict or None
+        The row of each match, keyed by date and player IDs.
+    name_index : PlayerNameIndex or None
+        The prefix and fuzzy lookup index of the player names of the data.
+    player_index : PlayerRowIndex or None
+        The rows of the matches of each player, sorted by date.
+    date_index : DateIndex or None
+        The rows of the matches sorted by date, to locate date ranges.
+    current : ModelVersion or None
+        The served model version, None until loaded.
+    candidate : ModelVersion or None
+        The model version scored in shadow, if any.
+    shadow : ShadowScorer or None
+        The shadow scorer, when the shadow mode is on.
+    data_version : str or None
+        The modification time and size of the data file when it was loaded.
+    load_seconds : float or None
+        The wall time spent loading the data and the model.
+    error : str or None
+        The last loading error, if any.
+    """
+
+    def __init__(self, data_file: Union[str, Path], model_path: Union[str, Path]):
+        self.data_file = Path(data_file)
+        self.model_path = Path(model_path)
+        self.df = None
+        self.players = None
+        self.match_index = None
+        self.name_index = None
+        self.player_index = None
+        self.date_index = None
+        self.current = None
+        self.candidate = None
+        self.shadow = None
+        # A single scorer, and thread, reused by the successive shadow sessions
+        self._shadow_scorer = None
+        self.data_version = None
+        self.load_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._versions = 0
+        self._listeners = []
+
+    @property
+    def model(self):
+        """The served model, None until loaded."""
+        current = self.current
+        return current.model if current is not None else None
+
+    @property
+    def model_file(self) -> Path | None:
+        """The file the served model was loaded from."""
+        current = self.current
+        return current.model_file if current is not None else None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the data and the model are loaded."""
+        return self.df is not None and self.current is not None
+
+    def add_listener(self, callback):
+        """
+        Call a function, from the thread making the change, whenever the
+        served model changes.
+
+        Parameters
+        ----------
+        callback : Callable[[], None]
+            The function, which must return quickly.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Stop calling a function added by ``add_listener``."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Serving state listener failed: {e}")
+
+    def _latest_model_file(self) -> Path:
+        model_files = list(self.model_path.glob("model_*.joblib"))
+        if not model_files:
+            raise FileNotFoundError(f"No model file found in '{self.model_path}'.")
+        return max(model_files, key=lambda file: file.stat().st_mtime)
+
+    def _next_version(self, model_file: Path) -> ModelVersion:
+        # The encoded features are rebuilt only if the encoder changed
+        self._versions += 1
+        return load_model_version(
+            model_file, self._versions, self.df, self.players, self.current
+        )
+
+    def load(self) -> "ServingState":
+        """
+        Load the data and the most recent model, if not already loaded.
+
+        Newer model files are not looked for here, but by ``refresh``, off
+        the request path.
+
+        Returns
+        -------
+        ServingState
+            The loaded state itself.
+        """
+        if self.ready:
+            return self
+
+        with self._lock:
+            if self.ready:
+                return self
+            from acebet.app.dependencies.predict_winner import (
+                build_match_index,
+                load_data,
+                load_player_index,
+                load_players,
+            )
+            from acebet.dataprep.date_index import DateIndex
+            import numpy as np
+
+            start = time.perf_counter()
+            try:
+                if self.df is None:
+                    stat = self.data_file.stat()
+                    data_version = f"{stat.st_mtime_ns}-{stat.st_size}"
+                    df, self.players = load_players(
+                        self.data_file, load_data(self.data_file)
+                    )
+                    self.match_index = build_match_index(df)
+                    self.player_index = load_player_index(
+                        self.data_file, df, self.players
+                    )
+                    self.date_index = DateIndex.build(df)
+                    player_ids = np.unique(np.concatenate([df["p1"], df["p2"]]))
+                    self.name_index = PlayerNameIndex(self.players.decode(player_ids))
+                    self.data_version = data_version
+                    self.df = df
+                with self._refresh_lock:
+                    if self.current is None:
+                        self.current = self._next_version(self._latest_model_file())
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.load_seconds = time.perf_counter() - start
+        return self
+
+    def refresh(self) -> bool:
+        """
+        Load a newer model file, if any, and publish it or shadow it.
+
+        The new model is loaded and warmed before the served reference is
+        replaced, in one assignment, so requests never wait for the load and
+        those in flight finish on the model they started with. In shadow
+        mode, the new model becomes the candidate instead.
+
+        Returns
+        -------
+        bool
+            Whether a new model was loaded.
+        """
+        if not self.ready:
+            return False
+        with self._refresh_lock:
+            latest = self._latest_model_file()
+            mtime = latest.stat().st_mtime
+            for known in (self.current, self.candidate):
+                if known and known.model_file == latest and known.mtime == mtime:
+                    return False
+            version = self._next_version(latest)
+            if self.shadow is not None:
+                self.shadow.reset()
+                self.candidate = version
+            else:
+                self.current = version
+            logger.info(f"Model version {version.version}: {latest}")
+        if self.shadow is None:
+            self._notify()
+        return True
+
+    def promote(self) -> bool:
+        """
+        Serve the candidate model in place of the current one.
+
+        Returns
+        -------
+        bool
+            Whether there was a candidate to promote.
+        """
+        with self._refresh_lock:
+            if self.candidate is None:
+                return False
+            self.current, self.candidate = self.candidate, None
+            if self.shadow is not None:
+                self.shadow.reset()
+        self._notify()
+        return True
+
+    def set_shadow(self, enabled: bool, sample_rate: float = 0.1):
+        """
+        Turn the shadow mode on or off.
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether new models are shadowed rather than published.
+        sample_rate : float, default=0.1
+            The fraction of the scored requests replayed on the candidate.
+        """
+        with self._refresh_lock:
+            if enabled:
+                if self._shadow_scorer is None:
+                    self._shadow_scorer = ShadowScorer(sample_rate)
+                elif self.shadow is None:
+                    self._shadow_scorer.reset()
+                self._shadow_scorer.sample_rate = sample_rate
+                self.shadow = self._shadow_scorer
+            else:
+                self.shadow, self.candidate = None, None
+
+    def predict(self, p1_name: str, p2_name: str, date: str):
+        """
+        Predict the outcome of a match with the served data and model.
+
+        Parameters
+        ----------
+        p1_name : str
+            The name of player 1.
+        p2_name : str
+            The name of player 2.
+        date : str
+            The date of the match in 'YYYY-MM-DD' format.
+
+        Returns
+        -------
+        prob : float or None
+            The probability of player 1 winning, in percent.
+        class_ : int or None
+            The class of the prediction (0 or 1).
+        player_1 : str or None
+            The name of player 1 in the data.
+        """
+        from acebet.app.dependencies.predict_winner import lookup_match
+
+        self.load()
+        # Names are resolved here, tolerating typos and missing initials, then
+        # mapped to IDs: the lookup itself is on integers
+        with span("query"):
+            p1_name = self.name_index.resolve(p1_name) or p1_name
+            p2_name = self.name_index.resolve(p2_name) or p2_name
+            row = lookup_match(self.match_index, self.players, p1_name, p2_name, date)
+        if row is None:
+            return None, None, None
+        try:
+            columns = self.predict_rows([row], monitor=True)
+        except ValueError as e:
+            logger.error(e)
+            return None, None, None
+        return float(columns["prob"][0]), int(columns["class_"][0]), columns["p1"][0]
+
+    def predict_rows(self, rows, monitor: bool = False) -> dict:
+        """
+        Predict the matches at the given rows with a single model call.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray or slice
+            The row positions of the matches, -1 for matches not found, or a
+            slice of rows, read from the data and the features without a copy.
+        monitor : bool, default=False
+            Whether the rows are live traffic, counted by the drift monitor.
+            The exports and the re-scoring of the push subscriptions are not.
+
+        Returns
+        -------
+        dict
+            Columns aligned with ``rows``: 'date', 'p1', 'p2' and
+            'player_name' (the name of player 1), 'prob' (in percent, NaN when
+            not found) and 'class_' (-1 when not found), as numpy arrays, and
+            the 'model_version' scoring them.
+        """
+        import numpy as np
+        from acebet.app.dependencies.predict_winner import predict_encoded
+
+        # Read the served model once: a swap does not affect this request
+        current, candidate, shadow = self.current, self.candidate, self.shadow
+        scored = rows if isinstance(rows, slice) else None
+        if scored is not None:
+            rows = np.arange(scored.start, scored.stop)
+        rows = np.asarray(rows, dtype=np.int64)
+        found = rows >= 0
+        prob = np.full(len(rows), np.nan)
+        class_ = np.full(len(rows), -1, dtype=np.int8)
+        p1 = np.full(len(rows), None, dtype=object)
+        p2 = np.full(len(rows), None, dtype=object)
+        dates = np.full(len(rows), None, dtype=object)
+        if found.any():
+            found_rows = rows[found]
+            if scored is None:
+                scored = found_rows
+            matches = self.df.iloc[scored]
+            # A row gather (or slice) from the encoded features, then the trees
+            found_prob, found_class = predict_encoded(
+                current.model, current.features, scored
+            )
+            if candidate is not None and shadow is not None:
+                shadow.submit(candidate, found_rows, found_prob)
+            if monitor and current.drift is not None:
+                current.drift.update(found_rows, found_prob)
+            # Percentages rounded as for single predictions
+            prob[found] = np.round(100 * found_prob, 1)
+            class_[found] = found_class
+            p1[found] = self.players.decode(matches["p1"])
+            p2[found] = self.players.decode(matches["p2"])
+            dates[found] = matches["date"].dt.strftime("%Y-%m-%d").to_numpy()
+        return {
+            "date": dates,
+            "p1": p1,
+            "p2": p2,
+            "player_name": p1,
+            "prob": prob,
+            "class_": class_,
+            "model_version": current.version if current is not None else None,
+        }
+
+    def locate_matches(self, matches) -> list:
+        """
+        Find the rows of matches given by player names and date.
+
+        Parameters
+        ----------
+        matches : list
+            Objects with 'p1_name', 'p2_name' and 'date' attributes.
+
+        Returns
+        -------
+        list of int
+            The row of each match, -1 for matches not found.
+        """
+        from acebet.app.dependencies.predict_winner import lookup_match
+
+        self.load()
+        rows = []
+        for match in matches:
+            p1_name = self.name_index.resolve(match.p1_name) or match.p1_name
+            p2_name = self.name_index.resolve(match.p2_name) or match.p2_name
+            row = lookup_match(
+                self.match_index, self.players, p1_name, p2_name, match.date
+            )
+            rows.append(-1 if row is None else row)
+        return rows
+
+    def predict_batch(self, matches) -> dict:
+        """
+        Predict a batch of matches given by player names and date.
+
+        Parameters
+        ----------
+        matches : list
+            Objects with 'p1_name', 'p2_name' and 'date' attributes.
+
+        Returns
+        -------
+        dict
+            The columns of ``predict_rows``, aligned with ``matches``.
+        """
+        return self.predict_rows(self.locate_matches(matches), monitor=True)
+
+    def explain(self, matches, top: int | None = None) -> list:
+        """
+        Explain a batch of matches given by player names and date.
+
+        The contributions of the matches not explained yet by the served
+        model are computed with a single model call, then cached with it.
+        As in the data, and in the feature names, 'p1' and 'p2' are in the
+        order of the data, not necessarily that of the request: 'prob' is
+        the probability of 'p1' winning, which the contributions push up.
+
+        Parameters
+        ----------
+        matches : list
+            Objects with 'p1_name', 'p2_name' and 'date' attributes.
+        top : int, optional
+            The number of contributions kept per match, by default all.
+
+        Returns
+        -------
+        list of dict or None
+            Aligned with ``matches``: the 'date', 'p1', 'p2', 'prob',
+            'class_', 'model_version', 'base_value' and 'contributions' of
+            each match, None for matches not found.
+
+        Raises
+        ------
+        ValueError
+            If the served model does not provide contributions.
+        """
+        import numpy as np
+        from acebet.app.dependencies.explain import explanation_records
+
+        rows = np.asarray(self.locate_matches(matches), dtype=np.int64)
+        current = self.current
+        if current.contributions is None:
+            raise ValueError("The served model does not provide contributions")
+        explanations = [None] * len(rows)
+        found = np.flatnonzero(rows >= 0)
+        if len(found):
+            found_rows = rows[found]
+            cache = current.contributions
+            records = explanation_records(
+                cache.get(found_rows), cache.names, current.model[-1].classes_, top
+            )
+            matches = self.df.iloc[found_rows]
+            p1 = self.players.decode(matches["p1"])
+            p2 = self.players.decode(matches["p2"])
+            dates = matches["date"].dt.strftime("%Y-%m-%d").to_numpy()
+            for i, record, d, n1, n2 in zip(found.tolist(), records, dates, p1, p2):
+                explanations[i] = {
+                    "date": d,
+                    "p1": n1,
+                    "p2": n2,
+                    "model_version": current.version,
+                    **record,
+                }
+        return explanations
+
+    def predict_range(self, start_date: str, end_date: str) -> dict:
+        """
+        Predict all the matches played between two dates, inclusive.
+
+        Parameters
+        ----------
+        start_date : str
+            The first date in 'YYYY-MM-DD' format.
+        end_date : str
+            The last date in 'YYYY-MM-DD' format.
+
+        Returns
+        -------
+        dict
+            The columns of ``predict_rows``, in date order.
+        """
+        self.load()
+        return self.predict_rows(self.date_index.rows(start_date, end_date))
+
+    def predict_slate(
+        self,
+        start_date: str,
+        end_date: str | None = None,
+        tournament: str | None = None,
+    ) -> dict:
+        """
+        Predict the slate of a day or of a date range, with a single model call.
+
+        The range is located by binary search in the date index, and its
+        matches read as one contiguous slice when the data is in date order.
+
+        Parameters
+        ----------
+        start_date : str
+            The first date in 'YYYY-MM-DD' format.
+        end_date : str, optional
+            The last date in 'YYYY-MM-DD' format, by default the first one.
+        tournament : str, optional
+            Only predict the matches of this tournament, ignoring the case.
+
+        Returns
+        -------
+        dict
+            The columns of ``predict_rows``, with the 'tournament' and
+            'round' of each match, in date order.
+        """
+        import numpy as np
+
+        self.load()
+        rows = self.date_index.rows(start_date, end_date)
+        if tournament is not None:
+            tournaments = self.df["tournament"].iloc[rows].str.casefold()
+            keep = (tournaments == tournament.casefold()).to_numpy()
+            if isinstance(rows, slice):
+                rows = np.arange(rows.start, rows.stop)
+            rows = rows[keep]
+        columns = self.predict_rows(rows, monitor=True)
+        for column in ("tournament", "round"):
+            columns[column] = self.df[column].iloc[rows].to_numpy(dtype=object)
+        return columns
+
+    def pairwise(self, names, date: str, **context) -> dict:
+        """
+        Predict every pairing of a field of players, with a single model call.
+
+        Parameters
+        ----------
+        names : list of str
+            The names of the N players.
+        date : str
+            The date of the matches in 'YYYY-MM-DD' format.
+        **context
+            The match columns, see ``pairwise.match_context``.
+
+        Returns
+        -------
+        dict
+            The resolved 'players' names and the N x N 'prob' matrix of the
+            row player beating the column player, in percent, None on the
+            diagonal.
+
+        Raises
+        ------
+        KeyError
+            If a name does not resolve to a single player.
+        ValueError
+            If a player appears twice, or the date is malformed.
+        """
+        import numpy as np
+        from acebet.app.dependencies.pairwise import pairwise_matrix
+
+        self.load()
+        resolved = [self.resolve_player(name) for name in names]
+        player_ids = np.array([player_id for _, player_id in resolved])
+        if len(np.unique(player_ids)) < len(player_ids):
+            raise ValueError("A player appears more than once in the field")
+        prob = pairwise_matrix(
+            self.current.model,
+            self.df,
+            self.player_index,
+            player_ids,
+            date,
+            self.players,
+            **context,
+        )
+        prob = np.round(100 * prob, 1).astype(object)
+        prob[np.isnan(prob.astype(float))] = None
+        return {"players": [name for name, _ in resolved], "prob": prob.tolist()}
+
+    def simulate_draw(
+        self, draw, date: str, n_sims: int = 100_000, seed: int = 0, **context
+    ) -> dict:
+        """
+        Simulate a knockout draw with the pairwise probabilities of the model.
+
+        Parameters
+        ----------
+        draw : list of str or None
+            The player names of the slots of the draw, in bracket order, None
+            for a bye. The size of the draw is a power of two.
+        date : str
+            The date of the tournament in 'YYYY-MM-DD' format.
+        n_sims : int, default=100_000
+            The number of simulations.
+        seed : int, default=0
+            The seed of the simulations.
+        **context
+            The match columns, see ``pairwise.match_context``.
+
+        Returns
+        -------
+        dict
+            The resolved 'players' names, in draw order, the 'rounds' labels
+            and the 'reach' probability, in percent, of each player winning
+            each round, the last one being the title.
+
+        Raises
+        ------
+        KeyError
+            If a name does not resolve to a single player.
+        ValueError
+            If a player appears twice, the draw size is not a power of two, or
+            the date is malformed.
+        """
+        import numpy as np
+        from acebet.app.dependencies.pairwise import pairwise_matrix
+        from acebet.tournament.simulate import BYE, simulate_bracket
+
+        self.load()
+        resolved = [self.resolve_player(name) for name in draw if name is not None]
+        player_ids = np.array([player_id for _, player_id in resolved])
+        if len(np.unique(player_ids)) < len(player_ids):
+            raise ValueError("A player appears more than once in the draw")
+        prob = pairwise_matrix(
+            self.current.model,
+            self.df,
+            self.player_index,
+            player_ids,
+            date,
+            self.players,
+            **context,
+        )
+        positions = np.cumsum([name is not None for name in draw]) - 1
+        slots = [BYE if name is None else p for name, p in zip(draw, positions)]
+        with span("simulation"):
+            result = simulate_bracket(
+                prob, slots, n_sims=n_sims, seed=seed, executor=get_simulation_pool()
+            )
+        return {
+            "players": [name for name, _ in resolved],
+            "rounds": result["rounds"],
+            "reach": np.round(100 * result["reach"], 2).tolist(),
+            "n_sims": n_sims,
+        }
+
+    def resolve_player(self, name: str) -> Tuple[str, int]:
+        """
+        Resolve a client player name to its name and ID in the data.
+
+        Parameters
+        ----------
+        name : str
+            The name sent by the client.
+
+        Returns
+        -------
+        name : str
+            The name of the player in the data.
+        player_id : int
+            The player ID.
+
+        Raises
+        ------
+        KeyError
+            If the name does not resolve to a single player.
+        """
+        resolved = self.name_index.resolve(name)
+        if resolved is None:
+            raise KeyError(f"Unknown or ambiguous player name '{name}'.")
+        return resolved, self.players.id_of(resolved)
+
+    def _page(self, rows, offset: int, limit: int, recent_first: bool) -> dict:
+        from acebet.app.dependencies.predict_winner import match_records
+
+        if recent_first:
+            rows = rows[::-1]
+        # Only the rows of the requested page are gathered from the data
+        page = rows[offset : offset + limit]
+        return {
+            "total": len(rows),
+            "offset": offset,
+            "limit": limit,
+            "matches": match_records(self.df, page, self.players),
+        }
+
+    def player_matches(
+        self, name: str, offset: int = 0, limit: int = 50, recent_first: bool = True
+    ) -> dict:
+        """
+        Page through the matches of a player.
+
+        Parameters
+        ----------
+        name : str
+            The player name sent by the client.
+        offset : int, default=0
+            The number of matches to skip.
+        limit : int, default=50
+            The maximal number of matches to return.
+        recent_first : bool, default=True
+            Whether to list the most recent matches first.
+
+        Returns
+        -------
+        dict
+            The resolved player name, the total number of matches and the
+            requested page of matches.
+        """
+        self.load()
+        player, player_id = self.resolve_player(name)
+        rows = self.player_index.rows_of(player_id)
+        return {"player": player, **self._page(rows, offset, limit, recent_first)}
+
+    def head_to_head(
+        self,
+        p1_name: str,
+        p2_name: str,
+        offset: int = 0,
+        limit: int = 50,
+        recent_first: bool = True,
+    ) -> dict:
+        """
+        Page through the matches between two players.
+
+        Parameters
+        ----------
+        p1_name : str
+            The name of player 1 sent by the client.
+        p2_name : str
+            The name of player 2 sent by the client.
+        offset : int, default=0
+            The number of matches to skip.
+        limit : int, default=50
+            The maximal number of matches to return.
+        recent_first : bool, default=True
+            Whether to list the most recent matches first.
+
+        Returns
+        -------
+        dict
+            The resolved player names, their number of wins against each
+            other, the total number of matches and the requested page.
+
+        Raises
+        ------
+        KeyError
+            If a player is not found.
+        ValueError
+            If both names resolve to the same player.
+        """
+        import numpy as np
+
+        self.load()
+        p1, p1_id = self.resolve_player(p1_name)
+        p2, p2_id = self.resolve_player(p2_name)
+        if p1_id == p2_id:
+            raise ValueError(f"Both names resolve to the same player: {p1}")
+        rows = self.player_index.head_to_head(self.df, p1_id, p2_id)
+        # The winner of a row is p1 when the target is set
+        winners = np.where(
+            self.df["target"].to_numpy(dtype=bool)[rows],
+            self.df["p1"].to_numpy()[rows],
+            self.df["p2"].to_numpy()[rows],
+        )
+        return {
+            "p1": p1,
+            "p2": p2,
+            "p1_wins": int((winners == p1_id).sum()),
+            "p2_wins": int((winners == p2_id).sum()),
+            **self._page(rows, offset, limit, recent_first),
+        }
+
+    def version_tag(self) -> str | None:
+        """
+        Identify the served data and model, to validate cached predictions.
+
+        The tag depends on the files and their modification time, not on the
+        version counter, so that all the workers serving the same files agree.
+
+        Returns
+        -------
+        str or None
+            The tag, None until loaded.
+        """
+        current = self.current
+        if self.df is None or current is None:
+            return None
+        return (
+            f"{self.data_file}:{self.data_version}:"
+            f"{current.model_file.name}:{current.mtime}"
+        )
+
+    def describe(self) -> dict:
+        """Describe the state for the health routes."""
+        return {
+            "ready": self.ready,
+            "data_file": str(self.data_file),
+            "model_file": str(self.model_file) if self.model_file else None,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+    def memory_usage(self) -> dict:
+        """
+        The size in bytes of the loaded data, indexes and models.
+
+        Models are reported by their serialized size, since the memory of the
+        trees is allocated by LightGBM outside of Python objects.
+
+        Returns
+        -------
+        dict
+            The size of each artifact, None if not loaded.
+        """
+        import pickle
+
+        from acebet.app.dependencies.memory import deep_sizeof
+
+        current, candidate = self.current, self.candidate
+        usage = {
+            "data": deep_sizeof(self.df) if self.df is not None else None,
+            "players": deep_sizeof(self.players),
+            "match_index": deep_sizeof(self.match_index),
+            "player_index": deep_sizeof(self.player_index),
+            "date_index": deep_sizeof(self.date_index),
+            "name_index": deep_sizeof(self.name_index),
+        }
+        for label, version in (("current", current), ("candidate", candidate)):
+            if version is None:
+                usage[f"{label}_model"] = None
+                continue
+            shared = label == "candidate" and current is not None
+            shared = shared and version.features is current.features
+            usage[f"{label}_model"] = {
+                "version": version.version,
+                "serialized": len(pickle.dumps(version.model)),
+                "encoder": deep_sizeof(version.model[:-1]),
+                # Features shared with the served model are counted there
+                "encoded_features": (
+                    0 if shared or version.features is None else version.features.nbytes
+                ),
+                "contributions": (
+                    0 if version.contributions is None else version.contributions.nbytes
+                ),
+            }
+        return usage
+
+    def drift_report(self, histograms: bool = False, reset: bool = False) -> dict:
+        """
+        Compare the rows and predictions served by the current model with its
+        training data.
+
+        Parameters
+        ----------
+        histograms : bool, default=False
+            Whether to include the counts of each bin.
+        reset : bool, default=False
+            Whether to start counting anew after the report.
+
+        Returns
+        -------
+        dict
+            The model version, and the drift scores, None if the model was
+            not saved with a drift profile, see ``DriftMonitor.report``.
+        """
+        self.load()
+        current = self.current
+        drift = current.drift if current is not None else None
+        report = drift.report(histograms) if drift is not None else None
+        if reset and drift is not None:
+            drift.reset()
+        return {
+            "model_version": current.version if current is not None else None,
+            "drift": report,
+        }
+
+    def describe_models(self) -> dict:
+        """Describe the served and candidate models for the admin routes."""
+        current, candidate, shadow = self.current, self.candidate, self.shadow
+        return {
+            "current": current.describe() if current else None,
+            "candidate": candidate.describe() if candidate else None,
+            "shadow": shadow.stats() if shadow else None,
+        }
+
+
+_states: Dict[Tuple[Path, Path], ServingState] = {}
+_states_lock = threading.Lock()
+
+
+def get_state(testing: bool = False) -> ServingState:
+    """
+    Get the serving state for a source, creating it on first use.
+
+    Parameters
+    ----------
+    testing : bool, default=False
+        Whether to use the packaged sample data and model.
+
+    Returns
+    -------
+    ServingState
+        The (possibly not yet loaded) serving state.
+    """
+    key = resolve_sources(testing)
+    with _states_lock:
+        if key not in _states:
+            _states[key] = ServingState(*key)
+        return _states[key]
+
+
+_simulation_pool = None
+_simulation_pool_lock = threading.Lock()
+
+
+def get_simulation_pool():
+    """
+    Get the process pool of the bracket simulations, created on first use.
+
+    The pool is shared by all the requests, and its processes are spawned,
+    not forked from the threads of the server.
+
+    Returns
+    -------
+    concurrent.futures.ProcessPoolExecutor or None
+        The pool of ``SIMULATION_JOBS`` processes, None for a single one, the
+        simulations then running in the server process.
+    """
+    global _simulation_pool
+    if SIMULATION_JOBS <= 1:
+        return None
+    with _simulation_pool_lock:
+        if _simulation_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _simulation_pool = ProcessPoolExecutor(
+                max_workers=SIMULATION_JOBS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _simulation_pool
+
+
+def shutdown_simulation_pool():
+    """
+    Shut down the process pool of the bracket simulations, if created.
+
+    The pending simulations are waited for; a later simulation creates a new
+    pool.
+    """
+    global _simulation_pool
+    with _simulation_pool_lock:
+        if _simulation_pool is not None:
+            _simulation_pool.shutdown(wait=True)
+            _simulation_pool = None
+
+
+def default_testing() -> bool:
+    """Serve the packaged sample when no production data is available."""
+    data_file, _ = resolve_sources(testing=False)
+    return not data_file.exists()
+
+
+def warmup(testing: bool | None = None) -> ServingState:
+    """
+    Import the ML stack and load the data and the model of a source.
+
+    Parameters
+    ----------
+    testing : bool or None, default=None
+        Whether to warm the packaged sample source, by default the production
+        source when its data file exists.
+
+    Returns
+    -------
+    ServingState
+        The warmed serving state.
+    """
+    if testing is None:
+        testing = default_testing()
+    state = get_state(testing)
+    try:
+        state.load()
+    except Exception as e:
+        logger.error(f"Warmup failed: {e}")
+    return state
+
+
+def start_warmup(testing: bool | None = None) -> threading.Thread:
+    """
+    Run the warmup in a daemon thread, off the event loop.
+
+    Parameters
+    ----------
+    testing : bool or None, default=None
+        Passed to ``warmup``.
+
+    Returns
+    -------
+    threading.Thread
+        The started warmup thread.
+    """
+    thread = threading.Thread(
+        target=warmup, kwargs={"testing": testing}, name="acebet-warmup", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def start_model_watcher(
+    testing: bool | None = None, interval: float = MODEL_POLL_SECONDS
+) -> ModelWatcher:
+    """
+    Watch the model directory of a source and hot-swap newer models.
+
+    Parameters
+    ----------
+    testing : bool or None, default=None
+        Whether to watch the packaged sample source, by default the
+        production source when its data file exists.
+    interval : float, default=MODEL_POLL_SECONDS
+        The seconds between two polls of the model directory.
+
+    Returns
+    -------
+    ModelWatcher
+        The started watcher thread.
+    """
+    if testing is None:
+        testing = default_testing()
+    watcher = ModelWatcher(get_state(testing), interval)
+    watcher.start()
+    return watcher
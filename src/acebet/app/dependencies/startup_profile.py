@@ -0,0 +1,130 @@
+"""
+Import-time breakdown of the app startup.
+
+The profile is produced on demand by importing a module in a fresh
+interpreter run with ``-X importtime`` and aggregating its report, so that
+nothing is measured (nor slowed down) in the serving process itself. The
+report of a module is measured once per process: the code does not change
+while it is served.
+
+Run it from the command line with::
+
+    python -m acebet.app.dependencies.startup_profile acebet.app.main
+"""
+
+import subprocess
+import sys
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+
+def parse_importtime(report: str) -> List[Dict]:
+    """
+    Parse the stderr of ``python -X importtime``.
+
+    Parameters
+    ----------
+    report : str
+        The raw import-time report.
+
+    Returns
+    -------
+    List[Dict]
+        One record per imported module with its self and cumulative time in
+        milliseconds and its nesting depth.
+    """
+    records = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:") :].split("|")
+            records.append(
+                {
+                    "module": name.strip(),
+                    "depth": (len(name) - len(name.lstrip())) // 2,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                }
+            )
+        except ValueError:
+            continue
+    return records
+
+
+@lru_cache(maxsize=None)
+def measure_imports(module: str) -> Tuple[Dict, ...]:
+    """
+    Import a module in a fresh interpreter and parse its import-time report.
+
+    The result is cached, so that the subprocess runs once per module.
+
+    Parameters
+    ----------
+    module : str
+        The module to import.
+
+    Returns
+    -------
+    Tuple[Dict, ...]
+        The records of ``parse_importtime``.
+
+    Raises
+    ------
+    RuntimeError
+        If the import fails.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"Importing '{module}' failed: {completed.stderr.splitlines()[-1:]}"
+        )
+    return tuple(parse_importtime(completed.stderr))
+
+
+def import_time_profile(module: str = "acebet.app.main", top: int = 25) -> Dict:
+    """
+    Profile the import of a module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module : str, default="acebet.app.main"
+        The module to import.
+    top : int, default=25
+        The number of slowest modules and top-level packages to report.
+
+    Returns
+    -------
+    Dict
+        The total import time, the slowest modules by self time and the
+        cumulative time of each top-level package, in milliseconds.
+    """
+    records = measure_imports(module)
+
+    packages: Dict[str, float] = {}
+    for record in records:
+        package = record["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + record["self_ms"]
+
+    return {
+        "module": module,
+        "total_ms": round(sum(record["self_ms"] for record in records), 1),
+        "slowest_modules": sorted(records, key=lambda r: r["self_ms"], reverse=True)[
+            :top
+        ],
+        "packages_ms": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ),
+    }
+
+
+if __name__ == "__main__":
+    profile = import_time_profile(*sys.argv[1:2])
+    print(f"Importing {profile['module']} took {profile['total_ms']:.1f} ms")
+    for package, ms in profile["packages_ms"].items():
+        print(f"{ms:10.1f} ms  {package}")
@@ -0,0 +1,225 @@
+"""
+Request-scoped tracing.
+
+Each request gets a trace keyed by its ``X-API-REQUEST-ID``, held in a
+context variable: authentication, the serving state and the prediction
+functions, including those run in the threadpool, record timed spans into
+it without the trace being passed around. Finished traces are kept in an
+in-memory ring buffer queried by the admin routes, and appended as JSON lines
+to the ``ACEBET_TRACE_FILE`` file when set.
+
+Outside of a traced request, ``span`` only reads the context variable.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+
+REQUEST_ID_HEADER = "X-API-REQUEST-ID"
+
+# The number of finished traces kept in memory
+TRACE_BUFFER_SIZE = int(os.environ.get("ACEBET_TRACE_BUFFER_SIZE", 1024))
+
+# The JSON lines file the finished traces are appended to, if any
+TRACE_FILE = os.environ.get("ACEBET_TRACE_FILE")
+
+_trace = contextvars.ContextVar("acebet_trace", default=None)
+_parent = contextvars.ContextVar("acebet_span", default=None)
+_no_span = nullcontext()
+
+
+class Trace:
+    """
+    The timed spans of a request.
+
+    Parameters
+    ----------
+    request_id : str
+        The request ID.
+    method : str
+        The HTTP method of the request.
+    path : str
+        The path of the request.
+    """
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.status_code = None
+        self.duration_ms = None
+        self.spans = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as a span, nested in the enclosing one."""
+        parent = _parent.get()
+        token = _parent.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            _parent.reset(token)
+            # list.append is atomic: threadpool spans need no lock
+            self.spans.append(
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": round(1000 * (start - self._start), 3),
+                    "duration_ms": round(1000 * (end - start), 3),
+                }
+            )
+
+    def elapsed_ms(self) -> float:
+        """The milliseconds since the request started."""
+        return round(1000 * (time.perf_counter() - self._start), 3)
+
+    def finish(self, status_code: int):
+        """Record the status and duration of the response."""
+        self.status_code = status_code
+        self.duration_ms = self.elapsed_ms()
+
+    def to_dict(self) -> Dict:
+        """The trace as a JSON-serializable dict."""
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "status_code": self.status_code,
+            "duration_ms": self.duration_ms,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+
+
+def start_trace(request_id: str, method: str, path: str) -> Trace:
+    """
+    Start the trace of the current request, or return it if already started.
+
+    Parameters
+    ----------
+    request_id : str
+        The request ID.
+    method : str
+        The HTTP method of the request.
+    path : str
+        The path of the request.
+
+    Returns
+    -------
+    Trace
+        The trace, current in the context of the request.
+    """
+    trace = _trace.get()
+    if trace is None:
+        trace = Trace(request_id, method, path)
+        _trace.set(trace)
+    return trace
+
+
+def current_trace() -> Trace | None:
+    """The trace of the current request, None outside of a request."""
+    return _trace.get()
+
+
+def request_id_of(headers) -> str:
+    """The request ID sent by the client, or a new one."""
+    return headers.get(REQUEST_ID_HEADER, "")[:64] or str(uuid.uuid4())
+
+
+def span(name: str):
+    """
+    Time a block of code as a span of the current request trace.
+
+    Parameters
+    ----------
+    name : str
+        The span name, e.g. "auth" or "scoring".
+
+    Returns
+    -------
+    ContextManager
+        The span, doing nothing outside of a traced request.
+    """
+    trace = _trace.get()
+    return _no_span if trace is None else trace.span(name)
+
+
+class TraceStore:
+    """
+    Ring buffer of finished traces.
+
+    Parameters
+    ----------
+    maxlen : int, default=TRACE_BUFFER_SIZE
+        The number of traces kept, the oldest being dropped first.
+    path : str, optional
+        A JSON lines file the traces are also appended to.
+    """
+
+    def __init__(self, maxlen: int = TRACE_BUFFER_SIZE, path: str | None = TRACE_FILE):
+        self.path = path
+        self._traces = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        """Store a finished trace."""
+        with self._lock:
+            self._traces.append(trace)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(trace.to_dict()) + "\n")
+
+    def get(self, request_id: str) -> Trace | None:
+        """The trace of a request, None if not kept."""
+        with self._lock:
+            for trace in reversed(self._traces):
+                if trace.request_id == request_id:
+                    return trace
+        return None
+
+    def recent(
+        self, limit: int = 50, min_duration_ms: float = 0.0, path: str | None = None
+    ) -> List[Dict]:
+        """
+        The most recent traces, newest first.
+
+        Parameters
+        ----------
+        limit : int, default=50
+            The maximal number of traces.
+        min_duration_ms : float, default=0.0
+            The minimal duration of the traces, to find the slow requests.
+        path : str, optional
+            The request path of the traces.
+
+        Returns
+        -------
+        List[Dict]
+            The traces.
+        """
+        with self._lock:
+            traces = list(self._traces)
+        selected = []
+        for trace in reversed(traces):
+            if (trace.duration_ms or 0.0) < min_duration_ms:
+                continue
+            if path is not None and trace.path != path:
+                continue
+            selected.append(trace.to_dict())
+            if len(selected) == limit:
+                break
+        return selected
+
+
+# The finished traces of the worker process
+traces = TraceStore()
@@ -0,0 +1,270 @@
+"""
+User stores, looked up on every authenticated request.
+
+``DictUserStore`` serves users from a dictionary, as in the tests and the
+demo. ``SQLiteUserStore`` keeps them in a SQLite database, with one
+connection per thread (a SQLite connection may not be shared between
+threads), the same parametrised statements (prepared once per connection by
+the statement cache of ``sqlite3``) and a read-through cache of the
+``UserInDB`` objects. The cache is invalidated by the writes of the store
+and its entries expire after ``cache_ttl`` seconds, which bounds how long
+the writes of other processes take to be seen.
+
+The lookup latencies are measured by ``benchmark_lookups``, also run as
+``python -m acebet.app.dependencies.user_store``.
+"""
+
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from .data_models import UserInDB
+
+# The columns of the users table, in the order of the statements
+USER_COLUMNS = [
+    "username",
+    "full_name",
+    "email",
+    "hashed_password",
+    "disabled",
+    "tier",
+    "role",
+]
+
+_CREATE = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    full_name TEXT,
+    email TEXT,
+    hashed_password TEXT NOT NULL,
+    disabled INTEGER,
+    tier TEXT NOT NULL DEFAULT 'free',
+    role TEXT NOT NULL DEFAULT 'user'
+)
+"""
+_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username = ?"
+_UPSERT = (
+    f"INSERT OR REPLACE INTO users ({', '.join(USER_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(USER_COLUMNS))})"
+)
+_DELETE = "DELETE FROM users WHERE username = ?"
+
+
+class UserStore(ABC):
+    """
+    The interface of the user stores.
+
+    The users returned are shared between requests and must not be modified.
+
+    Attributes
+    ----------
+    blocking : bool
+        Whether the lookups may block on I/O, and are then run off the event
+        loop by the authentication dependency.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get(self, username: str) -> Optional[UserInDB]:
+        """
+        Look up a user.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        UserInDB or None
+            The user, None if unknown.
+        """
+
+    @abstractmethod
+    def put(self, user: UserInDB):
+        """Create or replace a user."""
+
+    @abstractmethod
+    def delete(self, username: str):
+        """Delete a user, if any."""
+
+
+class DictUserStore(UserStore):
+    """
+    Users held in a dictionary of user fields, keyed by username.
+
+    Parameters
+    ----------
+    users : Dict[str, dict]
+        The users, e.g. ``fake_users_db``. Writes go to this dictionary.
+    """
+
+    def __init__(self, users: Dict[str, dict]):
+        self.users = users
+        self._cache: Dict[str, UserInDB] = {}
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[UserInDB]:
+        user = self._cache.get(username)
+        if user is None and username in self.users:
+            user = UserInDB(**self.users[username])
+            self._cache[username] = user
+        return user
+
+    def put(self, user: UserInDB):
+        with self._lock:
+            self.users[user.username] = user.model_dump()
+            self._cache.pop(user.username, None)
+
+    def delete(self, username: str):
+        with self._lock:
+            self.users.pop(username, None)
+            self._cache.pop(username, None)
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Users in a SQLite database, with cached lookups.
+
+    Parameters
+    ----------
+    path : str or Path
+        The database file, created with the users table if missing.
+    cache_size : int, default=1024
+        The number of users cached, the least recently used being evicted.
+    cache_ttl : float, default=60.0
+        The seconds a cached user is served before being read again.
+    """
+
+    blocking = True
+
+    def __init__(self, path, cache_size: int = 1024, cache_ttl: float = 60.0):
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._local = threading.local()
+        self._cache: OrderedDict = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute(_CREATE)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            # Readers do not block on a writer of another process
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _read(self, username: str) -> Optional[UserInDB]:
+        row = self._connection().execute(_SELECT, (username,)).fetchone()
+        if row is None:
+            return None
+        fields = dict(zip(USER_COLUMNS, row))
+        if fields["disabled"] is not None:
+            fields["disabled"] = bool(fields["disabled"])
+        return UserInDB(**fields)
+
+    def get(self, username: str) -> Optional[UserInDB]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(username)
+            if entry is not None and now - entry[1] < self.cache_ttl:
+                self._cache.move_to_end(username)
+                return entry[0]
+            generation = self._generation
+        # Unknown users are not cached, so that new users are seen at once
+        user = self._read(username)
+        if user is not None:
+            with self._lock:
+                # A user read before an invalidation may be outdated
+                if generation != self._generation:
+                    return user
+                self._cache[username] = (user, now)
+                self._cache.move_to_end(username)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return user
+
+    def put(self, user: UserInDB):
+        values = [getattr(user, column) for column in USER_COLUMNS]
+        with self._connection() as connection:
+            connection.execute(_UPSERT, values)
+        self.invalidate(user.username)
+
+    def delete(self, username: str):
+        with self._connection() as connection:
+            connection.execute(_DELETE, (username,))
+        self.invalidate(username)
+
+    def invalidate(self, username: str | None = None):
+        """
+        Drop a user from the cache, by default all of them.
+
+        Parameters
+        ----------
+        username : str, optional
+            The username.
+        """
+        with self._lock:
+            self._generation += 1
+            if username is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(username, None)
+
+
+def benchmark_lookups(number: int = 100_000) -> Dict[str, float]:
+    """
+    Measure the latency of a user lookup in each store.
+
+    The lookups are timed against the former lookup, which built a new
+    ``UserInDB`` from a dictionary of user fields on each request.
+
+    Parameters
+    ----------
+    number : int, default=100_000
+        The number of lookups timed per store.
+
+    Returns
+    -------
+    Dict[str, float]
+        The mean latency, in microseconds, of the 'dict' lookup building a
+        new user, of a 'dict_store' lookup, of a 'sqlite_cached' lookup and
+        of a 'sqlite_read' lookup bypassing the cache.
+    """
+    user = UserInDB(username="benchmark", hashed_password="hash")
+    users = {user.username: user.model_dump()}
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_store = SQLiteUserStore(Path(tmp) / "users.db")
+        sqlite_store.put(user)
+        dict_store = DictUserStore(users)
+        lookups = {
+            "dict": lambda: UserInDB(**users[user.username]),
+            "dict_store": lambda: dict_store.get(user.username),
+            "sqlite_cached": lambda: sqlite_store.get(user.username),
+            "sqlite_read": lambda: sqlite_store._read(user.username),
+        }
+        latencies = {}
+        for name, lookup in lookups.items():
+            lookup()
+            seconds = timeit.timeit(lookup, number=number)
+            latencies[name] = round(1e6 * seconds / number, 3)
+        sqlite_store._connection().close()
+    return latencies
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for name, microseconds in benchmark_lookups(number).items():
+        print(f"{microseconds:10.3f} µs  {name}")
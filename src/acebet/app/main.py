@@ -1,31 +1,84 @@
-import logging
-import numpy as np
-
-from datetime import timedelta
-from pathlib import Path
+from contextlib import asynccontextmanager
+from datetime import date as Date, timedelta
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from fastapi import Depends, FastAPI, HTTPException, status, Request, Response
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    status,
+    Request,
+    Response,
+    WebSocket,
+)
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.background import BackgroundTask
-from starlette.types import Message
+from starlette.concurrency import run_in_threadpool
 
-# Import the prediction function and data models
+# Import the serving state and data models.
+# The ML stack is not imported here: the serving state imports it lazily,
+# in the background warmup or on the first prediction.
 # from acebet.app.dependencies.logging_user import RouterLoggingMiddleware
-from acebet.app.dependencies.predict_winner import make_prediction
+from acebet.app.dependencies.serving import (
+    MAX_SIMULATIONS,
+    default_testing,
+    get_state,
+    shutdown_simulation_pool,
+    start_model_watcher,
+    start_warmup,
+)
+from acebet.app.dependencies.startup_profile import import_time_profile
+from acebet.app.dependencies.request_profile import profiler
+from acebet.app.dependencies.memory import memory_report, tracker
+from acebet.app.dependencies.tracing import (
+    REQUEST_ID_HEADER,
+    request_id_of,
+    start_trace,
+    traces,
+)
 from acebet.app.dependencies.data_models import (
     Token,
     User,
     UserInDB,
+    HeadToHead,
+    PlayerMatch,
+    PlayerMatches,
+    BatchPredictionRequest,
+    ExplanationRequest,
+    MatchExplanation,
+    MatchPrediction,
+    SlatePrediction,
+    PairwiseRequest,
+    PairwiseResponse,
+    BracketRequest,
+    BracketResponse,
     PredictionRequest,
     PredictionResponse,
 )
+from acebet.app.dependencies.responses import (
+    ARROW_STREAM,
+    accepts_arrow,
+    columns_response,
+)
+from acebet.app.dependencies.audit import audit_predictions, audit_sink
+from acebet.app.dependencies.http_cache import (
+    cache_headers,
+    etag_matches,
+    not_modified,
+    prediction_etag,
+)
+from acebet.app.dependencies.push import channel_for, serve_subscriber
+from acebet.app.dependencies.rate_limit import rate_limit
 from acebet.app.dependencies.auth import (
     authenticate_user,
-    fake_users_db,
+    get_user_store,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
     get_current_active_user,
+    get_current_admin_user,
     get_current_user,
 )
 
@@ -42,13 +95,34 @@ from slowapi.util import get_remote_address
 # to use the get_remote_address function as the key function.
 # The key function is responsible for generating a unique identifier
 # for rate limiting based on the client's IP address.
-limiter = Limiter(key_func=get_remote_address, default_limits=["12/minute"])
+# It only backs the /limit/ demonstration route, for anonymous clients: the
+# data routes are limited per user by acebet.app.dependencies.rate_limit, so
+# it has no default limits.
+limiter = Limiter(key_func=get_remote_address)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start loading the data and the model in a background thread, so that the
+    app accepts requests immediately and `/health/ready` reports when the
+    model is loaded, and watch for newer models to hot-swap them. On
+    shutdown, the simulation processes are shut down with the app.
+    """
+    app.state.warmup_thread = start_warmup()
+    app.state.model_watcher = start_model_watcher()
+    audit_sink.start()
+    yield
+    app.state.model_watcher.stop()
+    audit_sink.stop()
+    shutdown_simulation_pool()
+
 
 # Create an instance of the FastAPI class,
 # which serves as the core of your web application.
 # This instance is used to define routes, middleware,
 # exception handlers, and other configurations for the web service.
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # sets the limiter instance you created as a state variable of the FastAPI app.
 # This allows you to access the limiter instance from the route functions using app.state.limiter.
@@ -59,54 +133,91 @@ app.state.limiter = limiter
 # handles what should be done when a rate limit is exceeded.
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+# Missing data or model files, e.g. before the first data preparation, make
+# the service unavailable rather than failing the request
+@app.exception_handler(FileNotFoundError)
+async def served_files_missing(request: Request, exc: FileNotFoundError):
+    """
+    Answer the requests needing missing data or model files with a 503.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request object.
+    exc : FileNotFoundError
+        The error raised while loading the served source.
+
+    Returns
+    -------
+    JSONResponse
+        The error, with a 503 status.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)}
+    )
+
+
 # Add the user activity middleware to the app
 # app.add_middleware(
 #     RouterLoggingMiddleware,
 #     logger=logging.getLogger(__name__)
 # )
 
-# specify the filename of the log file and the logging level.
-logging.basicConfig(filename="info.log", level=logging.DEBUG)
-
 
-# log requests and responses
-def log_info(req_body, res_body):
+# store the trace of a request once its response is sent
+def store_trace(trace, status_code):
     """
-    Logs the request body and the response body.
+    Finish the trace of a request and store it.
 
     Parameters
     ----------
-    req_body : bytes
-        The request body.
-    res_body : bytes
-        The response body.
+    trace : Trace
+        The trace of the request.
+    status_code : int
+        The status code of the response.
     """
-    logging.info(req_body)
-    logging.info(res_body)
+    trace.finish(status_code)
+    traces.add(trace)
 
 
-async def set_body(request: Request, body: bytes):
+# Reject malformed dates before they reach the served data
+def check_dates(*dates):
     """
-    Replaces the request's `body` attribute with a function that returns the request body.
+    Check the dates of a request, answering malformed ones with a 422.
 
     Parameters
     ----------
-    request : Request
-        The HTTP request object.
-    body : bytes
-        The request body.
-    """
+    *dates : str or None
+        The dates in 'YYYY-MM-DD' format, None for dates not given.
 
-    async def receive() -> Message:
-        return {"type": "http.request", "body": body}
-
-    request._receive = receive
+    Raises
+    ------
+    HTTPException
+        If a date is malformed.
+    """
+    for date in dates:
+        if date is None:
+            continue
+        try:
+            Date.fromisoformat(date)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid date '{date}', expected 'YYYY-MM-DD'",
+            )
 
 
 @app.middleware("http")
 async def user_logging_middleware(request: Request, call_next):
     """
-    A middleware function that logs the request body and the response body.
+    A middleware function that traces the requests.
+
+    It starts the trace of the request, keyed by the `X-API-REQUEST-ID`
+    header of the request if any, returns the request ID in the same header
+    and stores the trace once the response is sent. The response is streamed
+    through, not buffered: the predictions are audited by the routes, see
+    ``acebet.app.dependencies.audit``.
 
     Parameters
     ----------
@@ -120,22 +231,13 @@ async def user_logging_middleware(request: Request, call_next):
     Response
         The response object.
     """
-    req_body = await request.body()
-    await set_body(request, req_body)
-    response = await call_next(request)
-
-    res_body = b""
-    async for chunk in response.body_iterator:
-        res_body += chunk
-
-    task = BackgroundTask(log_info, req_body, res_body)
-    return Response(
-        content=res_body,
-        status_code=response.status_code,
-        headers=dict(response.headers),
-        media_type=response.media_type,
-        background=task,
+    trace = start_trace(
+        request_id_of(request.headers), request.method, request.url.path
     )
+    response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = trace.request_id
+    response.background = BackgroundTask(store_trace, trace, response.status_code)
+    return response
 
 
 # Home route
@@ -152,6 +254,74 @@ async def home():
     return {"message": "Welcome to the AceBet API!"}
 
 
+# Liveness route
+@app.get("/health/live")
+async def health_live():
+    """
+    Liveness Route
+
+    Returns
+    -------
+    dict
+        The status of the app process.
+    """
+    return {"status": "alive"}
+
+
+# Readiness route
+@app.get("/health/ready")
+async def health_ready(response: Response, testing: bool | None = None):
+    """
+    Readiness Route
+
+    The app is ready once the data and the model of the served source are
+    loaded, either by the background warmup or by a first prediction.
+
+    Parameters
+    ----------
+    testing : bool, optional
+        Whether to report on the packaged sample source, by default the
+        source warmed at startup.
+
+    Returns
+    -------
+    dict
+        The readiness of the served source, with a 503 status if not ready.
+    """
+    if testing is None:
+        testing = default_testing()
+    state = get_state(testing)
+    if not state.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return state.describe()
+
+
+# Startup profile route
+@app.get("/health/startup")
+def health_startup(
+    top: int = 25, current_user: UserInDB = Depends(get_current_admin_user)
+):
+    """
+    Startup Profile Route
+
+    Produce an import-time breakdown of the app, measured in a fresh
+    interpreter so the serving process is not affected, once per process.
+
+    Parameters
+    ----------
+    top : int, optional
+        The number of slowest modules and packages to report, by default 25.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The import-time profile, in milliseconds.
+    """
+    return import_time_profile("acebet.app.main", top=top)
+
+
 # Rate limiting demonstration route
 # Note: the route decorator must be above the limit decorator, not below it
 @app.get("/limit/")
@@ -193,7 +363,13 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     dict
         The generated access token along with its type.
     """
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    store = get_user_store()
+    if store.blocking:
+        user = await run_in_threadpool(
+            authenticate_user, store, form_data.username, form_data.password
+        )
+    else:
+        user = authenticate_user(store, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -253,10 +429,19 @@ async def read_own_items(current_user: UserInDB = Depends(get_current_active_use
 # happening simultaneously, enhancing the responsiveness and performance of the API.
 # although the performance is not really important here
 # Prediction route with user activity logging
-@app.post("/predict/", response_model=PredictionResponse)
-# @limiter.limit("60/minute")
+# Rate limited per authenticated user, across all the workers of the host
+@app.post(
+    "/predict/",
+    response_model=PredictionResponse,
+    responses={304: {"description": "The prediction did not change"}},
+    dependencies=[Depends(rate_limit("predict"))],
+)
 async def predict_match_outcome(
-    request: PredictionRequest, current_user: UserInDB = Depends(get_current_user)
+    request: PredictionRequest,
+    response: Response,
+    current_user: UserInDB = Depends(get_current_user),
+    profile: str | None = Header(None, alias="X-AceBet-Profile"),
+    if_none_match: str | None = Header(None),
 ):
     """
     Prediction Route with Rate Limiting and User Activity Logging
@@ -267,42 +452,1005 @@ async def predict_match_outcome(
     ----------
     request : PredictionRequest
         The prediction request data.
+    response : Response
+        The response, to set the caching headers.
     current_user : UserInDB
         The current authenticated user.
+    profile : str, optional
+        Any value of the `X-AceBet-Profile` header profiles this request, see
+        `/admin/profile`, if sent by an administrator.
+    if_none_match : str, optional
+        The ETag of a previous response: if the data and the model did not
+        change since, the route answers 304 without predicting again.
 
     Returns
     -------
     PredictionResponse
         The prediction outcome.
     """
-    p1_name = request.p1_name
-    p2_name = request.p2_name
-    date = request.date
-    testing = request.testing
+    # The data and the model are loaded once per source, not per request.
+    # Run in the threadpool: the first call may still be loading them.
+    state = get_state(request.testing)
+    key = ("predict", request.p1_name, request.p2_name, request.date)
+    # The ETag is taken before scoring: if the model is swapped meanwhile,
+    # the response is tagged with the older version and revalidated next time
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    prob, class_, player_1 = await run_in_threadpool(
+        profiler.run,
+        state.predict,
+        request.p1_name,
+        request.p2_name,
+        request.date,
+        force=profile is not None and current_user.role == "admin",
+    )
+    response.headers.update(cache_headers(etag or prediction_etag(state, *key)))
+    audit_predictions(
+        state,
+        current_user,
+        "predict",
+        {
+            "date": request.date,
+            "p1": request.p1_name,
+            "p2": request.p2_name,
+            "prob": prob,
+            "class_": class_,
+        },
+    )
+
+    return PredictionResponse(player_name=player_1, prob=prob, class_=class_)
 
-    if testing:
-        data_file = (
-            Path(__file__).resolve().parents[1] / "data" / "atp_data_sample.feather"
+
+# Batch prediction route
+@app.post(
+    "/predict/batch",
+    response_model=list[PredictionResponse],
+    responses={200: {"content": {ARROW_STREAM: {}}}, 304: {}},
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def predict_batch(
+    request: Request,
+    response: Response,
+    batch: BatchPredictionRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Batch Prediction Route
+
+    Predict many matches with a single model call. Clients accepting
+    `application/vnd.apache.arrow.stream` receive the predictions as an Arrow
+    IPC stream of columnar record batches instead of JSON.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, whose `Accept` header selects the format.
+    response : Response
+        The response, to set the caching headers.
+    batch : BatchPredictionRequest
+        The matches to predict.
+    current_user : UserInDB
+        The current authenticated user.
+    if_none_match : str, optional
+        The ETag of a previous response, answered with 304 if still valid.
+
+    Returns
+    -------
+    list[PredictionResponse] or StreamingResponse
+        The predictions, in the order of the matches, empty for matches not
+        found.
+    """
+    state = get_state(batch.testing)
+    key = (
+        "batch",
+        accepts_arrow(request),
+        [(match.p1_name, match.p2_name, match.date) for match in batch.matches],
+    )
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    columns = await run_in_threadpool(state.predict_batch, batch.matches)
+    headers = cache_headers(etag or prediction_etag(state, *key))
+    response.headers.update(headers)
+    audit_predictions(
+        state,
+        current_user,
+        "batch",
+        {
+            **columns,
+            "date": [match.date for match in batch.matches],
+            "p1": [match.p1_name for match in batch.matches],
+            "p2": [match.p2_name for match in batch.matches],
+        },
+    )
+    return columns_response(
+        request, columns, ["player_name", "prob", "class_"], headers
+    )
+
+
+# Prediction explanation route
+@app.post(
+    "/predict/explain",
+    response_model=list[MatchExplanation | None],
+    responses={304: {}},
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def explain_predictions(
+    response: Response,
+    batch: ExplanationRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Prediction Explanation Route
+
+    Explain the predictions of one or many matches by the contribution of
+    each feature, in log-odds. The contributions of a match are computed once
+    per served model, in a single call for the matches of a request, and
+    cached until the model changes. The players of an explanation are in the
+    order of the data, as its features, not necessarily that of the request.
+
+    Parameters
+    ----------
+    response : Response
+        The response, to set the caching headers.
+    batch : ExplanationRequest
+        The matches to explain.
+    current_user : UserInDB
+        The current authenticated user.
+    if_none_match : str, optional
+        The ETag of a previous response, answered with 304 if still valid.
+
+    Returns
+    -------
+    list[MatchExplanation or None]
+        The explanations, in the order of the matches, null for matches not
+        found.
+    """
+    state = get_state(batch.testing)
+    key = (
+        "explain",
+        batch.top,
+        [(match.p1_name, match.p2_name, match.date) for match in batch.matches],
+    )
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    try:
+        explanations = await run_in_threadpool(state.explain, batch.matches, batch.top)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    response.headers.update(cache_headers(etag or prediction_etag(state, *key)))
+    return explanations
+
+
+# Prediction export route
+@app.get(
+    "/predict/export",
+    response_model=list[MatchPrediction],
+    responses={200: {"content": {ARROW_STREAM: {}}}, 304: {}},
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def export_predictions(
+    request: Request,
+    response: Response,
+    start_date: str,
+    end_date: str,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Prediction Export Route
+
+    Predict every match played between two dates with a single model call.
+    Clients accepting `application/vnd.apache.arrow.stream` receive the
+    predictions as an Arrow IPC stream of columnar record batches.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, whose `Accept` header selects the format.
+    response : Response
+        The response, to set the caching headers.
+    start_date : str
+        The first date in 'YYYY-MM-DD' format.
+    end_date : str
+        The last date in 'YYYY-MM-DD' format.
+    testing : bool, optional
+        Whether to use the packaged sample data, by default False.
+    current_user : UserInDB
+        The current authenticated user.
+    if_none_match : str, optional
+        The ETag of a previous response, answered with 304 if still valid.
+
+    Returns
+    -------
+    list[MatchPrediction] or StreamingResponse
+        The predictions of the matches, in date order.
+    """
+    check_dates(start_date, end_date)
+    state = get_state(testing)
+    key = ("export", accepts_arrow(request), start_date, end_date)
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    columns = await run_in_threadpool(state.predict_range, start_date, end_date)
+    headers = cache_headers(etag or prediction_etag(state, *key))
+    response.headers.update(headers)
+    audit_predictions(state, current_user, "export", columns)
+    return columns_response(
+        request, columns, ["date", "p1", "p2", "prob", "class_"], headers
+    )
+
+
+# Day slate route
+@app.get(
+    "/predict/slate",
+    response_model=list[SlatePrediction],
+    responses={200: {"content": {ARROW_STREAM: {}}}, 304: {}},
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def predict_slate(
+    request: Request,
+    response: Response,
+    date: str,
+    end_date: str | None = None,
+    tournament: str | None = None,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Day Slate Route
+
+    Predict every match of a day, or of a date range, optionally of a single
+    tournament, without knowing the players. The matches are located by
+    binary search in a date index and scored with a single model call.
+    Clients accepting `application/vnd.apache.arrow.stream` receive the
+    predictions as an Arrow IPC stream of columnar record batches.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request, whose `Accept` header selects the format.
+    response : Response
+        The response, to set the caching headers.
+    date : str
+        The day in 'YYYY-MM-DD' format, the first one of a range.
+    end_date : str, optional
+        The last date of the range in 'YYYY-MM-DD' format.
+    tournament : str, optional
+        Only predict the matches of this tournament.
+    testing : bool, optional
+        Whether to use the packaged sample data, by default False.
+    current_user : UserInDB
+        The current authenticated user.
+    if_none_match : str, optional
+        The ETag of a previous response, answered with 304 if still valid.
+
+    Returns
+    -------
+    list[SlatePrediction] or StreamingResponse
+        The predictions of the matches, in date order.
+    """
+    check_dates(date, end_date)
+    state = get_state(testing)
+    key = ("slate", accepts_arrow(request), date, end_date, tournament)
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    columns = await run_in_threadpool(state.predict_slate, date, end_date, tournament)
+    headers = cache_headers(etag or prediction_etag(state, *key))
+    response.headers.update(headers)
+    audit_predictions(state, current_user, "slate", columns)
+    fields = ["date", "tournament", "round", "p1", "p2", "prob", "class_"]
+    return columns_response(request, columns, fields, headers)
+
+
+# Pairwise prediction route
+@app.post(
+    "/predict/pairwise",
+    response_model=PairwiseResponse,
+    responses={304: {}},
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def predict_pairwise(
+    field: PairwiseRequest,
+    response: Response,
+    current_user: UserInDB = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Pairwise Prediction Route
+
+    Predict every pairing of a field of players, e.g. for draw analysis. The
+    N x N matches are built from the latest ranking and Elo rating of each
+    player before the date and scored with a single model call.
+
+    Parameters
+    ----------
+    field : PairwiseRequest
+        The players, the date and the match context.
+    response : Response
+        The response, to set the caching headers.
+    current_user : UserInDB
+        The current authenticated user.
+    if_none_match : str, optional
+        The ETag of a previous response, answered with 304 if still valid.
+
+    Returns
+    -------
+    PairwiseResponse
+        The win-probability matrix.
+    """
+    check_dates(field.date)
+    state = get_state(field.testing)
+    key = ("pairwise", field.model_dump_json())
+    etag = prediction_etag(state, *key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    context = {
+        "tournament": field.tournament,
+        "surface": field.surface,
+        "court": field.court,
+        "round": field.round,
+        "best of": field.best_of,
+    }
+    try:
+        matrix = await run_in_threadpool(
+            state.pairwise, field.players, field.date, **context
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
         )
-        model_path = Path(__file__).resolve().parents[1] / "data"
+    response.headers.update(cache_headers(etag or prediction_etag(state, *key)))
+    return matrix
+
+
+# Bracket simulation route
+@app.post(
+    "/predict/bracket",
+    response_model=BracketResponse,
+    dependencies=[Depends(rate_limit("bulk"))],
+)
+async def predict_bracket(
+    bracket: BracketRequest,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Bracket Simulation Route
+
+    Monte Carlo simulation of a knockout draw: the pairwise probabilities of
+    the players are predicted with a single model call, then the brackets
+    are simulated with vectorised random draws, in the server process or
+    across the shared simulation pool.
+
+    Parameters
+    ----------
+    bracket : BracketRequest
+        The draw, the date, the match context and the simulation budget.
+    current_user : UserInDB
+        The current authenticated user.
+
+    Returns
+    -------
+    BracketResponse
+        The probability of each player reaching each round.
+    """
+    if bracket.n_sims > MAX_SIMULATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {MAX_SIMULATIONS} simulations per request",
+        )
+    check_dates(bracket.date)
+    state = get_state(bracket.testing)
+    context = {
+        "tournament": bracket.tournament,
+        "surface": bracket.surface,
+        "court": bracket.court,
+        "best of": bracket.best_of,
+    }
+    try:
+        return await run_in_threadpool(
+            state.simulate_draw,
+            bracket.draw,
+            bracket.date,
+            bracket.n_sims,
+            bracket.seed,
+            **context,
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
+# Prediction push route
+@app.websocket("/ws/predictions")
+async def prediction_updates(
+    websocket: WebSocket, token: str | None = None, testing: bool = False
+):
+    """
+    Prediction Push Route
+
+    Subscribe to matches over a WebSocket rather than polling ``/predict/``:
+    their predictions are sent on subscription, then pushed again whenever
+    the served model changes. Browsers cannot set headers on WebSockets, so
+    the access token may be passed as a query parameter. Connections of
+    disabled users are closed, as are those without a valid token.
+
+    Parameters
+    ----------
+    websocket : WebSocket
+        The connection.
+    token : str, optional
+        The access token, else read from the `Authorization` header.
+    testing : bool, optional
+        Whether to use the packaged sample source, by default False.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        scheme, _, credentials = authorization.partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    try:
+        if token is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        await get_current_active_user(await get_current_user(token))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    state = get_state(testing)
+    await run_in_threadpool(state.load)
+    await serve_subscriber(websocket, channel_for(state))
+
+
+# Player name search route
+@app.get(
+    "/players/search",
+    response_model=list[PlayerMatch],
+    dependencies=[Depends(rate_limit("search"))],
+)
+async def search_players(
+    q: str = Query(min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    fuzzy: bool = True,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Player Name Search Route
+
+    Autocomplete a player name prefix and suggest close names for misspelled
+    queries, using the name index of the served data.
+
+    Parameters
+    ----------
+    q : str
+        The name, or name prefix, to look up.
+    limit : int, optional
+        The maximal number of matches, by default 10.
+    fuzzy : bool, optional
+        Whether to include typo-tolerant matches, by default True.
+    testing : bool, optional
+        Whether to search the packaged sample data, by default False.
+    current_user : UserInDB
+        The current authenticated user.
+
+    Returns
+    -------
+    list[PlayerMatch]
+        The matching player names, best first.
+    """
+    state = await run_in_threadpool(get_state(testing).load)
+    return state.name_index.search(q, limit=limit, fuzzy=fuzzy)
+
+
+# Player history route
+@app.get(
+    "/players/{name}/matches",
+    response_model=PlayerMatches,
+    dependencies=[Depends(rate_limit("history"))],
+)
+async def read_player_matches(
+    name: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    recent_first: bool = True,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Player History Route
+
+    Page through the matches of a player, read from the player row index so
+    that the cost grows with the page size, not with the dataset size.
+
+    Parameters
+    ----------
+    name : str
+        The player name, resolved through the player name index.
+    offset : int, optional
+        The number of matches to skip, by default 0.
+    limit : int, optional
+        The maximal number of matches to return, by default 50.
+    recent_first : bool, optional
+        Whether to list the most recent matches first, by default True.
+    testing : bool, optional
+        Whether to use the packaged sample data, by default False.
+    current_user : UserInDB
+        The current authenticated user.
+
+    Returns
+    -------
+    PlayerMatches
+        The page of matches of the player.
+    """
+    state = get_state(testing)
+    try:
+        return await run_in_threadpool(
+            state.player_matches, name, offset, limit, recent_first
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+
+
+# Head-to-head route
+@app.get(
+    "/h2h", response_model=HeadToHead, dependencies=[Depends(rate_limit("history"))]
+)
+async def read_head_to_head(
+    p1_name: str,
+    p2_name: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    recent_first: bool = True,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Head-to-Head Route
+
+    Page through the matches between two players, found by scanning the
+    history of the player with the fewest matches only.
+
+    Parameters
+    ----------
+    p1_name : str
+        The name of player 1, resolved through the player name index.
+    p2_name : str
+        The name of player 2, resolved through the player name index.
+    offset : int, optional
+        The number of matches to skip, by default 0.
+    limit : int, optional
+        The maximal number of matches to return, by default 50.
+    recent_first : bool, optional
+        Whether to list the most recent matches first, by default True.
+    testing : bool, optional
+        Whether to use the packaged sample data, by default False.
+    current_user : UserInDB
+        The current authenticated user.
+
+    Returns
+    -------
+    HeadToHead
+        The head-to-head record and the page of matches.
+    """
+    state = get_state(testing)
+    try:
+        return await run_in_threadpool(
+            state.head_to_head, p1_name, p2_name, offset, limit, recent_first
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+
+
+# Model administration routes
+@app.get("/admin/model")
+async def read_model_status(
+    testing: bool = False, current_user: UserInDB = Depends(get_current_admin_user)
+):
+    """
+    Model Status Route
+
+    Parameters
+    ----------
+    testing : bool, optional
+        Whether to report on the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The served model version, the candidate version and the shadow
+        disagreement statistics.
+    """
+    return get_state(testing).describe_models()
+
+
+@app.post("/admin/model/refresh")
+async def refresh_model(
+    testing: bool = False, current_user: UserInDB = Depends(get_current_admin_user)
+):
+    """
+    Model Refresh Route
+
+    Look for a newer model file now rather than at the next poll, and load it
+    off the event loop.
+
+    Parameters
+    ----------
+    testing : bool, optional
+        Whether to refresh the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        Whether a new model was loaded, and the model status.
+    """
+    state = get_state(testing)
+    await run_in_threadpool(state.load)
+    loaded = await run_in_threadpool(state.refresh)
+    return {"loaded": loaded, **state.describe_models()}
+
+
+@app.post("/admin/model/shadow")
+async def set_model_shadow(
+    enabled: bool,
+    sample_rate: float = Query(0.1, gt=0, le=1),
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Shadow Mode Route
+
+    In shadow mode, newer models become candidates scored asynchronously on a
+    sample of the live traffic instead of being served.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether to turn the shadow mode on.
+    sample_rate : float, optional
+        The fraction of the scored requests replayed on the candidate, by
+        default 0.1.
+    testing : bool, optional
+        Whether to configure the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The model status.
+    """
+    state = get_state(testing)
+    state.set_shadow(enabled, sample_rate)
+    return state.describe_models()
+
+
+@app.post("/admin/model/promote")
+async def promote_model(
+    testing: bool = False, current_user: UserInDB = Depends(get_current_admin_user)
+):
+    """
+    Model Promotion Route
+
+    Serve the candidate model in place of the current one.
+
+    Parameters
+    ----------
+    testing : bool, optional
+        Whether to promote in the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The model status.
+    """
+    state = get_state(testing)
+    if not state.promote():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="No candidate model"
+        )
+    return state.describe_models()
+
+
+# Request profiling routes
+@app.post("/admin/profile")
+async def start_profile(
+    mode: str = Query("sampling", pattern="^(sampling|deterministic)$"),
+    requests: int | None = Query(10, ge=1),
+    seconds: float | None = Query(None, gt=0),
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Profiling Session Route
+
+    Profile the next prediction requests of this worker, clearing the
+    previous profiles.
+
+    Parameters
+    ----------
+    mode : str, optional
+        "sampling" (stack samples, low overhead) or "deterministic"
+        (cProfile), by default "sampling".
+    requests : int, optional
+        The number of requests to profile, by default 10.
+    seconds : float, optional
+        The duration of the session, by default unlimited.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The profiling session status.
+    """
+    try:
+        profiler.start(mode, requests, seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return profiler.describe()
+
+
+@app.get("/admin/profile")
+async def read_profile_status(
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Profiling Status Route
+
+    Parameters
+    ----------
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The profiling session status.
+    """
+    return profiler.describe()
+
+
+@app.get("/admin/profile/download")
+async def download_profile(
+    format: str = Query("collapsed", pattern="^(collapsed|pstats)$"),
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Profile Download Route
+
+    Parameters
+    ----------
+    format : str, optional
+        "collapsed" for the sampled stacks, ready for flame graph tools, or
+        "pstats" for the deterministic profiles, readable with `pstats` or
+        snakeviz, by default "collapsed".
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    Response
+        The profile file.
+    """
+    if format == "pstats":
+        content, media_type = profiler.pstats_bytes(), "application/octet-stream"
+        filename = "acebet.prof"
     else:
-        data_file = (
-            Path(__file__).resolve().parents[3] / "data" / "atp_data_production.feather"
+        content, media_type = profiler.collapsed(), "text/plain"
+        filename = "acebet.collapsed"
+    if not content:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="No profile recorded"
         )
-        model_path = Path(__file__).resolve().parents[3]
-
-    prob, class_, player_1 = make_prediction(
-        data_file=data_file,
-        model_path=model_path,
-        p1_name=p1_name,
-        p2_name=p2_name,
-        date=date,
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
-    # Ensure prob is a scalar value
-    if isinstance(prob, (list, np.ndarray)):
-        prob = np.asarray(prob).ravel()[0]
-    # Ensure prob is a scalar value
-    prob = float(prob)
-    prob = round((100 * prob), 1)  # Convert to percentage and round
 
-    return PredictionResponse(player_name=player_1, prob=prob, class_=class_)
+
+# Request tracing routes
+@app.get("/admin/traces")
+async def read_traces(
+    limit: int = Query(50, ge=1, le=1000),
+    min_duration_ms: float = Query(0.0, ge=0),
+    path: str | None = None,
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Request Traces Route
+
+    List the most recent request traces of this worker, with the duration of
+    each span (authentication, query, features, scoring, logging).
+
+    Parameters
+    ----------
+    limit : int, optional
+        The maximal number of traces, by default 50.
+    min_duration_ms : float, optional
+        The minimal request duration, to find the slow requests, by default 0.
+    path : str, optional
+        The request path, e.g. "/predict/", by default all paths.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    list[dict]
+        The traces, newest first.
+    """
+    return traces.recent(limit, min_duration_ms, path)
+
+
+@app.get("/admin/traces/{request_id}")
+async def read_trace(
+    request_id: str, current_user: UserInDB = Depends(get_current_admin_user)
+):
+    """
+    Request Trace Route
+
+    Parameters
+    ----------
+    request_id : str
+        The `X-API-REQUEST-ID` of the request.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The trace of the request.
+    """
+    trace = traces.get(request_id)
+    if trace is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Unknown request ID"
+        )
+    return trace.to_dict()
+
+
+# Prediction audit route
+@app.get("/admin/audit")
+async def read_audit(current_user: UserInDB = Depends(get_current_admin_user)):
+    """
+    Prediction Audit Route
+
+    Report the audit sink of this worker: the file being written, the records
+    buffered, written, and dropped because the writer fell behind.
+
+    Parameters
+    ----------
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The counters of the audit sink.
+    """
+    return audit_sink.describe()
+
+
+# Drift monitoring route
+@app.get("/admin/drift")
+async def read_drift(
+    histograms: bool = False,
+    reset: bool = False,
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Drift Monitoring Route
+
+    Compare the distributions of the features and of the predictions of the
+    rows served by the current model with those of its training data, saved
+    with the model. The served rows are counted in fixed bins as they are
+    scored; the PSI and KS scores are computed on demand.
+
+    Parameters
+    ----------
+    histograms : bool, optional
+        Whether to include the reference and live counts of each bin, by
+        default False.
+    reset : bool, optional
+        Whether to start counting anew after the report, by default False.
+    testing : bool, optional
+        Whether to report on the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The model version and the drift scores.
+    """
+    state = get_state(testing)
+    return await run_in_threadpool(state.drift_report, histograms, reset)
+
+
+# Memory accounting routes
+@app.get("/admin/memory")
+async def read_memory(
+    top: int = Query(20, ge=1, le=100),
+    testing: bool = False,
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Memory Accounting Route
+
+    Report the resident and peak memory of this worker, the size of the
+    loaded data, indexes and models, of the caches and of the memory-mapped
+    files, and, when allocation tracking is on, the allocation sites that
+    grew since the previous report.
+
+    Parameters
+    ----------
+    top : int, optional
+        The number of allocation sites to report, by default 20.
+    testing : bool, optional
+        Whether to report on the packaged sample source, by default False.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        The memory report, sizes in bytes.
+    """
+    return await run_in_threadpool(memory_report, get_state(testing), top)
+
+
+@app.post("/admin/memory/tracking")
+async def set_memory_tracking(
+    enabled: bool,
+    frames: int = Query(1, ge=1, le=50),
+    current_user: UserInDB = Depends(get_current_admin_user),
+):
+    """
+    Allocation Tracking Route
+
+    Switch `tracemalloc` allocation tracking on or off. Tracking slows the
+    allocations down: turn it on only while looking for memory growth.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether to track the allocations.
+    frames : int, optional
+        The number of frames stored per allocation, by default 1.
+    current_user : UserInDB
+        The current administrator.
+
+    Returns
+    -------
+    dict
+        Whether allocations are tracked.
+    """
+    if enabled:
+        await run_in_threadpool(tracker.start, frames)
+    else:
+        tracker.stop()
+    return {"tracing": tracker.tracing}
@@ -0,0 +1,336 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Staking strategies
+STRATEGIES = ("flat", "value", "kelly")
+
+# Bookmakers of the odds columns, e.g. 'b365_p1' and 'b365_p2'
+BOOKMAKERS = ("b365", "ps")
+
+
+def bet_returns(
+    prob,
+    odds_p1,
+    odds_p2,
+    strategy="flat",
+    threshold=0.0,
+    kelly_fraction=0.5,
+    max_fraction=0.05,
+):
+    """
+    Choose the bets of a staking strategy, for whole arrays of matches.
+
+    Parameters
+    ----------
+    prob : numpy.ndarray
+        The model probability of player 1 winning.
+    odds_p1 : numpy.ndarray
+        The decimal odds of player 1, NaN when not quoted.
+    odds_p2 : numpy.ndarray
+        The decimal odds of player 2, NaN when not quoted.
+    strategy : str, default="flat"
+        "flat": one unit on the player the model favours. "value": one unit
+        on the player with the largest expected value, when it exceeds
+        ``threshold``. "kelly": a fraction of the bankroll on the player with
+        the largest expected value, when it exceeds ``threshold``.
+    threshold : float, default=0.0
+        The minimal expected value per unit staked, ``prob * odds - 1``, of
+        the "value" and "kelly" bets.
+    kelly_fraction : float, default=0.5
+        The multiplier of the Kelly stake, 1 for full Kelly.
+    max_fraction : float, default=0.05
+        The maximal fraction of the bankroll staked on a match.
+
+    Returns
+    -------
+    on_p1 : numpy.ndarray
+        Whether the bet is on player 1.
+    stake : numpy.ndarray
+        The stake, in units for "flat" and "value", as a fraction of the
+        bankroll for "kelly", 0 when not betting.
+    odds : numpy.ndarray
+        The odds of the chosen player.
+
+    Raises
+    ------
+    ValueError
+        If the strategy is unknown.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected {STRATEGIES}")
+    prob = np.asarray(prob, dtype=float)
+    edge_p1 = prob * odds_p1 - 1
+    edge_p2 = (1 - prob) * odds_p2 - 1
+
+    if strategy == "flat":
+        on_p1 = prob >= 0.5
+    else:
+        # NaN odds never have the largest edge
+        on_p1 = np.nan_to_num(edge_p1, nan=-np.inf) >= np.nan_to_num(
+            edge_p2, nan=-np.inf
+        )
+    odds = np.where(on_p1, odds_p1, odds_p2)
+    edge = np.where(on_p1, edge_p1, edge_p2)
+    quoted = ~np.isnan(odds)
+
+    if strategy == "flat":
+        stake = quoted.astype(float)
+    elif strategy == "value":
+        stake = (quoted & (edge > threshold)).astype(float)
+    else:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            kelly = kelly_fraction * edge / (odds - 1)
+        kelly = np.clip(np.nan_to_num(kelly, nan=0.0), 0.0, max_fraction)
+        stake = np.where(quoted & (edge > threshold), kelly, 0.0)
+    return on_p1, stake, odds
+
+
+class BettingBacktest:
+    """
+    Streaming betting backtest, fed with matches in date order, chunk by chunk.
+
+    Only running totals are kept between chunks: the bankroll, its peak for
+    the drawdown, and fixed-bin calibration counts, so that memory does not
+    grow with the length of the history.
+
+    Parameters
+    ----------
+    strategy : str, default="flat"
+        The staking strategy, see ``bet_returns``.
+    n_bins : int, default=10
+        The number of probability bins of the calibration table.
+    **params
+        The parameters of the strategy, see ``bet_returns``.
+    """
+
+    def __init__(self, strategy="flat", n_bins=10, **params):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected {STRATEGIES}")
+        self.strategy = strategy
+        self.params = params
+        self.n_bins = n_bins
+        # The equity is the profit in units, or the log of the bankroll
+        self.equity = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self.n_matches = 0
+        self.n_bets = 0
+        self.n_won = 0
+        self.staked = 0.0
+        self.n_correct = 0
+        self.brier = 0.0
+        self.log_loss = 0.0
+        self.bin_count = np.zeros(n_bins, dtype=np.int64)
+        self.bin_prob = np.zeros(n_bins)
+        self.bin_won = np.zeros(n_bins)
+        self.periods = []
+
+    def update(self, prob, odds_p1, odds_p2, p1_won, period=None):
+        """
+        Bet on a chunk of matches, in date order.
+
+        Bets of the "kelly" strategy are settled one after the other, each
+        staking a fraction of the bankroll left by the previous ones.
+
+        Parameters
+        ----------
+        prob : numpy.ndarray
+            The model probability of player 1 winning.
+        odds_p1 : numpy.ndarray
+            The decimal odds of player 1.
+        odds_p2 : numpy.ndarray
+            The decimal odds of player 2.
+        p1_won : numpy.ndarray
+            Whether player 1 won.
+        period : str, optional
+            The label of the chunk, to report the profit per period.
+        """
+        prob = np.asarray(prob, dtype=float)
+        p1_won = np.asarray(p1_won, dtype=bool)
+        on_p1, stake, odds = bet_returns(
+            prob, odds_p1, odds_p2, self.strategy, **self.params
+        )
+        won = on_p1 == p1_won
+        # The gain per unit staked
+        gain = np.where(won, odds - 1, -1.0)
+        gain[stake == 0] = 0.0
+        bets = stake > 0
+
+        if self.strategy == "kelly":
+            log_growth = np.log1p(stake * gain)
+            equity = self.equity + np.cumsum(log_growth)
+            bankroll_before = np.exp(np.concatenate([[self.equity], equity[:-1]]))
+            staked = float((stake * bankroll_before).sum())
+            peak = np.maximum.accumulate(np.concatenate([[self.peak], equity]))[1:]
+            drawdown = 1 - np.exp(equity - peak)
+        else:
+            equity = self.equity + np.cumsum(stake * gain)
+            staked = float(stake.sum())
+            peak = np.maximum.accumulate(np.concatenate([[self.peak], equity]))[1:]
+            drawdown = peak - equity
+
+        start_equity = self.equity
+        if len(equity):
+            self.equity, self.peak = float(equity[-1]), float(peak[-1])
+            self.max_drawdown = max(self.max_drawdown, float(drawdown.max()))
+        self.n_matches += len(prob)
+        self.n_bets += int(bets.sum())
+        self.n_won += int((bets & won).sum())
+        self.staked += staked
+
+        # Calibration of the model, over all the matches
+        outcome = p1_won.astype(float)
+        clipped = np.clip(prob, 1e-15, 1 - 1e-15)
+        self.n_correct += int(((prob > 0.5) == p1_won).sum())
+        self.brier += float(((prob - outcome) ** 2).sum())
+        self.log_loss -= float(
+            (outcome * np.log(clipped) + (1 - outcome) * np.log(1 - clipped)).sum()
+        )
+        bins = np.minimum((prob * self.n_bins).astype(int), self.n_bins - 1)
+        self.bin_count += np.bincount(bins, minlength=self.n_bins)
+        self.bin_prob += np.bincount(bins, weights=prob, minlength=self.n_bins)
+        self.bin_won += np.bincount(bins, weights=outcome, minlength=self.n_bins)
+
+        if period is not None:
+            self.periods.append(
+                {
+                    "period": str(period),
+                    "n_bets": int(bets.sum()),
+                    "profit": self._profit(self.equity) - self._profit(start_equity),
+                }
+            )
+
+    def _profit(self, equity):
+        # In units, or as a fraction of the initial bankroll for Kelly
+        return float(np.expm1(equity)) if self.strategy == "kelly" else equity
+
+    def result(self):
+        """
+        Summarize the backtest.
+
+        Returns
+        -------
+        dict
+            The number of matches and bets, the hit rate, the profit (in
+            units, or as a fraction of the initial bankroll for "kelly"), the
+            ROI (profit per unit staked), the maximal drawdown (in units, or
+            as a fraction of the bankroll peak for "kelly"), the accuracy,
+            Brier score and log loss of the model, the calibration table and
+            the profit per period.
+        """
+        profit = self._profit(self.equity)
+        n = self.n_matches or None
+        calibration = [
+            {
+                "bin": f"{i / self.n_bins:.2f}-{(i + 1) / self.n_bins:.2f}",
+                "n_matches": int(count),
+                "mean_prob": float(self.bin_prob[i] / count),
+                "win_rate": float(self.bin_won[i] / count),
+            }
+            for i, count in enumerate(self.bin_count)
+            if count
+        ]
+        return {
+            "strategy": self.strategy,
+            "n_matches": self.n_matches,
+            "n_bets": self.n_bets,
+            "hit_rate": self.n_won / self.n_bets if self.n_bets else None,
+            "staked": self.staked,
+            "profit": profit,
+            "roi": profit / self.staked if self.staked else None,
+            "max_drawdown": self.max_drawdown,
+            "accuracy": n and self.n_correct / n,
+            "brier_score": n and self.brier / n,
+            "log_loss": n and self.log_loss / n,
+            "calibration": calibration,
+            "periods": self.periods,
+        }
+
+
+def run_backtest(
+    model,
+    df,
+    start_date=None,
+    end_date=None,
+    strategy="flat",
+    bookmaker="b365",
+    freq="Y",
+    players=None,
+    **params,
+):
+    """
+    Score the matches of a date range and backtest a staking strategy.
+
+    The matches are scored and settled one period at a time, each with a
+    single model call, so that memory is bounded by the largest period.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The model.
+    df : pandas.DataFrame
+        The match data, with the odds columns of the bookmaker.
+    start_date : str, optional
+        The first date, in 'YYYY-MM-DD' format.
+    end_date : str, optional
+        The last date, in 'YYYY-MM-DD' format.
+    strategy : str, default="flat"
+        The staking strategy, see ``bet_returns``.
+    bookmaker : str, default="b365"
+        The bookmaker whose odds are used, "b365" or "ps".
+    freq : str, default="Y"
+        The pandas period of the chunks, e.g. "Y" or "M".
+    players : PlayerDictionary, optional
+        The dictionary the player IDs of the data refer to.
+    **params
+        The parameters of the strategy, see ``bet_returns``.
+
+    Returns
+    -------
+    dict
+        The backtest summary, see ``BettingBacktest.result``.
+    """
+    from acebet.app.dependencies.predict_winner import predict_frame
+
+    if bookmaker not in BOOKMAKERS:
+        raise ValueError(f"Unknown bookmaker '{bookmaker}', expected {BOOKMAKERS}")
+    dates = df["date"]
+    mask = np.ones(len(df), dtype=bool)
+    if start_date is not None:
+        mask &= (dates >= pd.Timestamp(start_date)).to_numpy()
+    if end_date is not None:
+        mask &= (dates <= pd.Timestamp(end_date)).to_numpy()
+    df = df[mask].sort_values("date", kind="stable")
+
+    backtest = BettingBacktest(strategy, **params)
+    for period, chunk in df.groupby(df["date"].dt.to_period(freq), sort=True):
+        prob, _ = predict_frame(model, chunk, players)
+        backtest.update(
+            prob,
+            chunk[f"{bookmaker}_p1"].to_numpy(dtype=float),
+            chunk[f"{bookmaker}_p2"].to_numpy(dtype=float),
+            chunk["target"].to_numpy(dtype=bool),
+            period,
+        )
+    return backtest.result()
+
+
+if __name__ == "__main__":
+    from acebet.app.dependencies.predict_winner import (
+        load_data,
+        load_model,
+        load_players,
+    )
+
+    # Usage: python -m acebet.backtest.backtest [start_date [end_date [strategy]]]
+    project_root = Path(__file__).resolve().parents[3]
+    data_file = project_root / "data" / "atp_data_production.feather"
+    df = load_data(data_file)
+    df, players = load_players(data_file, df)
+    model = load_model(project_root)
+    summary = run_backtest(model, df, *sys.argv[1:4], players=players)
+    for key in ("n_matches", "n_bets", "hit_rate", "profit", "roi", "max_drawdown"):
+        print(f"{key:>12}: {summary[key]}")
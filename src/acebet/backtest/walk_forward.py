@@ -0,0 +1,236 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from joblib import dump, hash as joblib_hash, load
+from pyarrow import feather
+
+# Where the fitted fold models are cached by default
+CACHE_DIR = Path(__file__).resolve().parents[3] / "trained_models" / "walk_forward"
+
+
+def walk_forward_folds(
+    dates, start_date, end_date, freq="MS", train_days=None, min_train_rows=100
+):
+    """
+    Split a date-sorted history into walk-forward retrain windows.
+
+    Each fold trains on the matches before a test period and scores the
+    matches of that period only.
+
+    Parameters
+    ----------
+    dates : numpy.ndarray
+        The sorted match dates.
+    start_date : str
+        The first date of the first test period, in 'YYYY-MM-DD' format.
+    end_date : str
+        The last date scored, in 'YYYY-MM-DD' format.
+    freq : str, default="MS"
+        The pandas frequency of the retrains, e.g. "MS" for monthly.
+    train_days : int, optional
+        The length of the training window, by default all the history.
+    min_train_rows : int, default=100
+        The minimal number of training rows of a fold, folds with fewer being
+        skipped.
+
+    Returns
+    -------
+    list of dict
+        For each fold, the 'test_start' date and the 'train' and 'test' row
+        ranges as (first, last + 1) positions.
+
+    Raises
+    ------
+    ValueError
+        If the dates are not sorted.
+    """
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    if len(dates) and (np.diff(dates) < np.timedelta64(0)).any():
+        raise ValueError("The match dates must be sorted")
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    bounds = list(pd.date_range(start_date, end, freq=freq))
+    if not bounds or bounds[0] > pd.Timestamp(start_date):
+        bounds.insert(0, pd.Timestamp(start_date))
+    if bounds[-1] < end:
+        bounds.append(end)
+
+    folds = []
+    for test_start, test_end in zip(bounds[:-1], bounds[1:]):
+        lo, hi = np.searchsorted(dates, np.array([test_start, test_end], "M8[ns]"))
+        train_lo = 0
+        if train_days is not None:
+            train_start = test_start - pd.Timedelta(days=train_days)
+            train_lo = np.searchsorted(dates, np.datetime64(train_start, "ns"))
+        if hi == lo or lo - train_lo < min_train_rows:
+            continue
+        folds.append(
+            {
+                "test_start": str(test_start.date()),
+                "train": (int(train_lo), int(lo)),
+                "test": (int(lo), int(hi)),
+            }
+        )
+    return folds
+
+
+def share_dataset(df, path):
+    """
+    Write a dataset as an uncompressed Arrow file, to be memory-mapped.
+
+    Processes mapping the file share its pages read-only, instead of each
+    holding a copy of the data.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The dataset.
+    path : str or Path
+        The file to write.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def fit_and_score_fold(fold):
+    """
+    Fit the model of a fold, or load it from the cache, and score its test rows.
+
+    Only the rows of the fold are read from the memory-mapped dataset.
+
+    Parameters
+    ----------
+    fold : dict
+        The fold, see ``walk_forward_folds``, with the path to the shared
+        dataset in 'dataset' and the cache file of its model in 'cache_file'
+        (None to disable caching).
+
+    Returns
+    -------
+    numpy.ndarray
+        The probability of player 1 winning, for each test row.
+    """
+    from acebet.app.dependencies.predict_winner import predict_frame
+    from acebet.train.train import build_model, split_features
+
+    table = feather.read_table(fold["dataset"], memory_map=True)
+    cache_file = fold["cache_file"]
+    if cache_file is not None and Path(cache_file).exists():
+        model = load(cache_file)
+    else:
+        train_lo, train_hi = fold["train"]
+        X, y = split_features(table.slice(train_lo, train_hi - train_lo).to_pandas())
+        model = build_model(fold["lgb_params"])
+        model.fit(X, y)
+        if cache_file is not None:
+            # Write then rename, so that a concurrent reader never sees half a file
+            partial = Path(f"{cache_file}.{os.getpid()}.partial")
+            dump(model, partial)
+            partial.replace(cache_file)
+    test_lo, test_hi = fold["test"]
+    prob, _ = predict_frame(model, table.slice(test_lo, test_hi - test_lo).to_pandas())
+    return prob
+
+
+def walk_forward(
+    df,
+    start_date,
+    end_date,
+    freq="MS",
+    train_days=None,
+    min_train_rows=100,
+    lgb_params=None,
+    n_jobs=None,
+    cache_dir=CACHE_DIR,
+):
+    """
+    Walk-forward backtest: retrain periodically and score the next period.
+
+    The retrain windows are independent, so they are fitted in parallel
+    across a process pool. The dataset is shared with the workers through a
+    memory-mapped Arrow file, and the fitted fold models are cached on disk,
+    keyed by the data, the training rows and the parameters, so that a rerun
+    only fits the new folds.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The ATP data, as prepared for training.
+    start_date : str
+        The first date scored, in 'YYYY-MM-DD' format.
+    end_date : str
+        The last date scored, in 'YYYY-MM-DD' format.
+    freq : str, default="MS"
+        The pandas frequency of the retrains, e.g. "MS" for monthly.
+    train_days : int, optional
+        The length of the training window, by default all the history.
+    min_train_rows : int, default=100
+        The minimal number of training rows of a fold.
+    lgb_params : dict, optional
+        The parameters of the LightGBM classifier, by default those of
+        ``acebet.train.train``.
+    n_jobs : int, optional
+        The number of processes, by default one per CPU.
+    cache_dir : str or Path, optional
+        The directory of the cached fold models, None to disable caching.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The out-of-sample predictions: the 'date', 'p1', 'p2' and 'target'
+        columns of the scored matches, the 'fold' (start of the test
+        period) and the 'prob' of player 1 winning.
+    """
+    from acebet.train.train import LGB_PARAMS
+
+    lgb_params = lgb_params or LGB_PARAMS
+    df = df.sort_values("date", kind="stable").reset_index(drop=True)
+    folds = walk_forward_folds(
+        df["date"].to_numpy(), start_date, end_date, freq, train_days, min_train_rows
+    )
+    data_key = joblib_hash(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = Path(tmp) / "dataset.arrow"
+        share_dataset(df, dataset)
+        for fold in folds:
+            fold["dataset"] = str(dataset)
+            fold["lgb_params"] = lgb_params
+            fold["cache_file"] = None
+            if cache_dir is not None:
+                key = joblib_hash((data_key, fold["train"], lgb_params))
+                fold["cache_file"] = str(Path(cache_dir) / f"fold_{key}.joblib")
+        n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(folds), 1))
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                probs = list(executor.map(fit_and_score_fold, folds))
+        else:
+            probs = [fit_and_score_fold(fold) for fold in folds]
+
+    rows = [np.arange(*fold["test"]) for fold in folds]
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    predictions = df.loc[rows, ["date", "p1", "p2", "target"]].reset_index(drop=True)
+    predictions["fold"] = np.repeat(
+        [fold["test_start"] for fold in folds],
+        [fold["test"][1] - fold["test"][0] for fold in folds],
+    )
+    predictions["prob"] = np.concatenate(probs) if probs else np.array([])
+    return predictions
+
+
+if __name__ == "__main__":
+    from acebet.app.dependencies.predict_winner import load_data
+
+    # Usage: python -m acebet.backtest.walk_forward start_date end_date [freq]
+    project_root = Path(__file__).resolve().parents[3]
+    df = load_data(project_root / "data" / "atp_data_production.feather")
+    predictions = walk_forward(df, *sys.argv[1:4])
+    accuracy = ((predictions["prob"] > 0.5) == predictions["target"]).mean()
+    print(f"{len(predictions)} matches scored, accuracy {accuracy:.3f}")
@@ -1,24 +1,94 @@
-import pandas as pd
+import json
 from pathlib import Path
 
+import numpy as np
 
-def prepare_data():
+from acebet.dataprep.elo import EloEngine
+from acebet.dataprep.ingest import load_sources
+from acebet.dataprep.player_index import PlayerRowIndex
+from acebet.dataprep.players import PlayerDictionary, intern_players
+from acebet.dataprep.validate import (
+    coerce_numeric,
+    structural_checks,
+    validate_matches,
+)
+
+
+def recompute_elo_features(df, n_players=None):
+    """
+    Recompute the Elo features of the matches with the streaming Elo engine.
+
+    The matches failing the structural checks (no date, the same or an
+    unknown player on both sides, a duplicate of an earlier match) do not
+    update the ratings: their Elo features are left missing, and they are
+    quarantined with the other bad rows.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The matches, with integer 'p1' and 'p2' IDs, 'target' and 'date'.
+    n_players : int, optional
+        The size of the player dictionary the IDs refer to.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The matches with the 'elo_p1', 'elo_p2' and 'proba_elo' columns.
+    engine : EloEngine
+        The engine, holding the ratings after the last match.
+    """
+    failed = np.logical_or.reduce(list(structural_checks(df, n_players).values()))
+    engine = EloEngine()
+    features = engine.process(df[~failed])
+    # Aligned on the index: the matches not rated are missing
+    df = df.assign(**{c: features[c] for c in ("elo_p1", "elo_p2", "proba_elo")})
+    return df, engine
+
+
+def prepare_data(recompute_elo=False, source=None, n_jobs=None):
     """
     Prepare the ATP data for modeling.
 
+    The source files, typically one per season, are parsed in parallel and
+    merged in date order. Each match is given a random-looking but
+    deterministic orientation: the winner is player 1 or player 2 depending
+    on a hash of the match, not on its position in the files.
+
+    The prepared data is validated before being written: rows failing a
+    data-quality check are written to a quarantine table next to the
+    production data, with a report of the checks, and are not served.
+
+    Player names are replaced by compact integer IDs. The name to ID mapping
+    is persisted next to the production data and extended, never rebuilt, so
+    that IDs stay stable across data preparations. The index from player ID
+    to the rows of their matches is built alongside the production data.
+
+    Parameters
+    ----------
+    recompute_elo : bool, default=False
+        Whether to recompute the Elo features with the streaming Elo engine
+        instead of taking them from the source data. The engine state is
+        checkpointed next to the production data, so that later matches can
+        be rated with ``acebet.dataprep.elo.extend_ratings`` without replaying
+        the history.
+    source : str or Path, optional
+        The ATP result files: a file, a directory of CSV or Excel files, or a
+        glob pattern. By default ``data/atp_data.csv``.
+    n_jobs : int, optional
+        The number of processes parsing the files, by default one per CPU.
+
     Returns
     -------
     df : pandas.DataFrame
         The prepared data.
 
     """
-    data_path = Path(__file__).resolve().parents[2] / "data" / "atp_data.csv"
-    data = pd.read_csv(data_path, low_memory=False)
-
-    # Data cleaning and feature renaming
-    data["Date"] = pd.to_datetime(data["Date"])
-    data.sort_values("Date", inplace=True)
+    if source is None:
+        source = Path(__file__).resolve().parents[2] / "data" / "atp_data.csv"
+    # Parse the files in parallel, merged in date order
+    data, hashes = load_sources(source, n_jobs=n_jobs)
 
+    # Feature renaming
     df = data.copy()
     df.columns = df.columns.str.lower()
     df.rename(
@@ -38,11 +108,14 @@ def prepare_data():
     df.rename(
         columns=lambda x: x.replace("winner", "p1").replace("loser", "p2"), inplace=True
     )
+    # Unparsable numbers, e.g. "NR" ranks, become NaN and are quarantined
+    df = coerce_numeric(df)
 
-    # Swap player columns and adjust the target column
+    # Swap player columns and adjust the target column, for the matches with
+    # an odd hash: the swap does not depend on the order of the files
     p1_columns = df.filter(like="p1").columns
     p2_columns = df.filter(like="p2").columns
-    mask = df.index % 2 == 1
+    mask = (hashes & 1).astype(bool)
     df.loc[mask, p1_columns], df.loc[mask, p2_columns] = (
         df.loc[mask, p2_columns].values,
         df.loc[mask, p1_columns].values,
@@ -62,11 +135,30 @@ def prepare_data():
     df.loc[df["rank_diff"] > 0, "best_ranked"] = "p2"
     df = df.reset_index(drop=True)
 
-    # Write the "production" data to a feather file
+    # Intern the player names as integer IDs, keeping the IDs already assigned
+    players_path = Path(__file__).resolve().parents[2] / "data" / "atp_players.feather"
+    df, players = intern_players(df, PlayerDictionary.load(players_path))
+    players.save(players_path)
+
+    if recompute_elo:
+        df, engine = recompute_elo_features(df, len(players))
+        engine.save(players_path.with_name("atp_elo_state.npz"))
+
+    # Write the "production" data to a feather file, and the rejected rows to
+    # a quarantine file
     production_data_path = (
         Path(__file__).resolve().parents[2] / "data" / "atp_data_production.feather"
     )
+    df, quarantine, report = validate_matches(df, players)
+    quarantine.to_feather(production_data_path.with_name("atp_data_quarantine.feather"))
+    production_data_path.with_name("atp_data_quality.json").write_text(
+        json.dumps(report, indent=2)
+    )
     df.to_feather(production_data_path)
+    PlayerRowIndex.build(df, n_players=len(players)).save(
+        production_data_path.with_name("atp_player_index.npz")
+    )
+    return df
 
 
 # if __name__ == "__main__":
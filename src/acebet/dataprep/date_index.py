@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+
+class DateIndex:
+    """
+    Date-sorted index of the match rows, locating a date range in O(log n).
+
+    The prepared data is in date order, in which case the matches of a date
+    range are a contiguous slice of the rows. Otherwise the index keeps the
+    permutation sorting the rows by date, and a range is a slice of it.
+
+    Parameters
+    ----------
+    dates : numpy.ndarray
+        The sorted match dates, as datetime64[ns].
+    order : numpy.ndarray, optional
+        The row of each sorted date, None if the rows are in date order.
+    """
+
+    def __init__(self, dates, order=None):
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")
+        self.order = None if order is None else np.asarray(order, dtype=np.int64)
+
+    @classmethod
+    def build(cls, df):
+        """
+        Build the index of a DataFrame.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The match data, with a 'date' column.
+
+        Returns
+        -------
+        DateIndex
+            The index.
+        """
+        dates = df["date"].to_numpy().astype("datetime64[ns]")
+        if len(dates) and (dates[1:] < dates[:-1]).any():
+            order = np.argsort(dates, kind="stable")
+            return cls(dates[order], order)
+        return cls(dates)
+
+    @property
+    def n_rows(self):
+        return len(self.dates)
+
+    @property
+    def contiguous(self):
+        """Whether date ranges are contiguous slices of the rows."""
+        return self.order is None
+
+    def locate(self, start_date, end_date=None):
+        """
+        Binary search the bounds of a date range, inclusive.
+
+        Parameters
+        ----------
+        start_date : str
+            The first date in 'YYYY-MM-DD' format.
+        end_date : str, optional
+            The last date in 'YYYY-MM-DD' format, by default the first one.
+
+        Returns
+        -------
+        tuple of int
+            The positions (first, last + 1) of the range in the sorted dates.
+        """
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date or start_date).normalize() + pd.Timedelta(days=1)
+        bounds = np.array([start.to_datetime64(), end.to_datetime64()], "M8[ns]")
+        lo, hi = np.searchsorted(self.dates, bounds, side="left")
+        return int(lo), int(max(lo, hi))
+
+    def rows(self, start_date, end_date=None):
+        """
+        The rows of the matches of a date range, in date order.
+
+        Parameters
+        ----------
+        start_date : str
+            The first date in 'YYYY-MM-DD' format.
+        end_date : str, optional
+            The last date in 'YYYY-MM-DD' format, by default the first one.
+
+        Returns
+        -------
+        slice or numpy.ndarray
+            A slice of the rows when they are in date order, so that the data
+            and the features are read without a copy, else the row positions.
+        """
+        lo, hi = self.locate(start_date, end_date)
+        if self.order is None:
+            return slice(lo, hi)
+        return self.order[lo:hi]
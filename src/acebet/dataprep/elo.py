@@ -0,0 +1,327 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Rating of a player without any match
+INITIAL_RATING = 1500.0
+
+
+def expected_score(rating_p1, rating_p2):
+    """
+    Elo probability of player 1 beating player 2.
+
+    Parameters
+    ----------
+    rating_p1 : float or numpy.ndarray
+        The rating of player 1.
+    rating_p2 : float or numpy.ndarray
+        The rating of player 2.
+
+    Returns
+    -------
+    float or numpy.ndarray
+        The probability of player 1 winning.
+    """
+    return 1.0 / (1.0 + 10.0 ** ((rating_p2 - rating_p1) / 400.0))
+
+
+def decayed_k(n_matches):
+    """
+    The K factor of a player, decaying with their number of matches.
+
+    Parameters
+    ----------
+    n_matches : int or numpy.ndarray
+        The number of matches of the player before the update.
+
+    Returns
+    -------
+    float or numpy.ndarray
+        The K factor, ``250 / (n_matches + 5) ** 0.4``.
+    """
+    return 250.0 / (n_matches + 5) ** 0.4
+
+
+class EloEngine:
+    """
+    Streaming Elo ratings over matches processed in date order.
+
+    Ratings live in arrays indexed by player ID, grown geometrically as new
+    players appear, so that each match is an O(1) update. The state can be
+    checkpointed and resumed: new matches extend the ratings without
+    replaying the history.
+
+    Parameters
+    ----------
+    k_factor : float or None, default=None
+        The constant K factor. By default K decays with the number of matches
+        of the player, as ``250 / (n_matches + 5) ** 0.4``.
+    surfaces : bool, default=False
+        Whether to also keep surface-specific ratings.
+
+    Attributes
+    ----------
+    ratings : numpy.ndarray
+        The overall rating of each player ID.
+    n_matches : numpy.ndarray
+        The number of processed matches of each player ID.
+    surface_ratings : numpy.ndarray or None
+        The rating of each player ID (rows) on each surface (columns).
+    surface_names : list of str
+        The surfaces of the columns of ``surface_ratings``.
+    last_date : numpy.datetime64 or None
+        The date of the last processed match.
+    """
+
+    def __init__(self, k_factor=None, surfaces=False):
+        self.k_factor = k_factor
+        self.surfaces = surfaces
+        self.ratings = np.full(0, INITIAL_RATING)
+        self.n_matches = np.zeros(0, dtype=np.int32)
+        self.surface_ratings = np.full((0, 0), INITIAL_RATING) if surfaces else None
+        self.surface_names = []
+        self.last_date = None
+
+    @property
+    def n_players(self):
+        return len(self.ratings)
+
+    def _reserve(self, player_id):
+        """Grow the arrays, doubling their size, to hold a player ID."""
+        if player_id < self.n_players:
+            return
+        size = max(player_id + 1, 2 * self.n_players, 64)
+        grow = size - self.n_players
+        self.ratings = np.concatenate([self.ratings, np.full(grow, INITIAL_RATING)])
+        self.n_matches = np.concatenate(
+            [self.n_matches, np.zeros(grow, dtype=np.int32)]
+        )
+        if self.surfaces:
+            self.surface_ratings = np.vstack(
+                [
+                    self.surface_ratings,
+                    np.full((grow, len(self.surface_names)), INITIAL_RATING),
+                ]
+            )
+
+    def _surface_index(self, surface):
+        """The column of a surface, added on first sight."""
+        if surface not in self.surface_names:
+            self.surface_names.append(surface)
+            self.surface_ratings = np.hstack(
+                [self.surface_ratings, np.full((self.n_players, 1), INITIAL_RATING)]
+            )
+        return self.surface_names.index(surface)
+
+    def _k(self, player_id):
+        if self.k_factor is not None:
+            return self.k_factor
+        return decayed_k(self.n_matches[player_id])
+
+    def update(self, p1_id, p2_id, p1_won, surface=None, date=None):
+        """
+        Process one match and return the ratings before it.
+
+        Parameters
+        ----------
+        p1_id : int
+            The ID of player 1.
+        p2_id : int
+            The ID of player 2.
+        p1_won : bool
+            Whether player 1 won the match.
+        surface : str, optional
+            The court surface, used when surface ratings are kept.
+        date : datetime-like, optional
+            The match date, checked not to precede the last processed match.
+
+        Returns
+        -------
+        elo_p1 : float
+            The overall rating of player 1 before the match.
+        elo_p2 : float
+            The overall rating of player 2 before the match.
+        proba_elo : float
+            The Elo probability of player 1 winning.
+        proba_elo_surface : float or None
+            The surface Elo probability of player 1 winning, if kept.
+
+        Raises
+        ------
+        ValueError
+            If the match precedes the last processed match.
+        """
+        if date is not None:
+            date = np.datetime64(pd.Timestamp(date), "ns")
+            if self.last_date is not None and date < self.last_date:
+                raise ValueError(
+                    f"Match on {date} precedes the last processed match on "
+                    f"{self.last_date}: ratings are only extended forward."
+                )
+            self.last_date = date
+        self._reserve(max(p1_id, p2_id))
+
+        elo_p1, elo_p2 = self.ratings[p1_id], self.ratings[p2_id]
+        proba = expected_score(elo_p1, elo_p2)
+        delta = float(p1_won) - proba
+        self.ratings[p1_id] += self._k(p1_id) * delta
+        self.ratings[p2_id] -= self._k(p2_id) * delta
+
+        proba_surface = None
+        if self.surfaces and isinstance(surface, str):
+            s = self._surface_index(surface)
+            surface_p1 = self.surface_ratings[p1_id, s]
+            surface_p2 = self.surface_ratings[p2_id, s]
+            proba_surface = expected_score(surface_p1, surface_p2)
+            delta = float(p1_won) - proba_surface
+            self.surface_ratings[p1_id, s] += self._k(p1_id) * delta
+            self.surface_ratings[p2_id, s] -= self._k(p2_id) * delta
+
+        self.n_matches[p1_id] += 1
+        self.n_matches[p2_id] += 1
+        return elo_p1, elo_p2, proba, proba_surface
+
+    def process(self, df):
+        """
+        Process matches in date order and return the pre-match Elo features.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The matches, with integer 'p1' and 'p2' IDs, 'target' (player 1
+            won), 'date' and, for surface ratings, 'surface' columns. Matches
+            are processed sorted by date, stably.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The 'elo_p1', 'elo_p2' and 'proba_elo' columns, plus
+            'proba_elo_surface' when surface ratings are kept, aligned with
+            the index of ``df``.
+
+        Raises
+        ------
+        ValueError
+            If a match precedes the last processed match.
+        """
+        df = df.sort_values("date", kind="stable")
+        n_rows = len(df)
+        features = np.full((n_rows, 4), np.nan)
+        if n_rows == 0:
+            return self._features_frame(features, df.index)
+
+        dates = df["date"].to_numpy().astype("datetime64[ns]")
+        if self.last_date is not None and dates[0] < self.last_date:
+            raise ValueError(
+                f"Match on {dates[0]} precedes the last processed match on "
+                f"{self.last_date}: ratings are only extended forward."
+            )
+        p1_ids = df["p1"].to_numpy(dtype=np.int64)
+        p2_ids = df["p2"].to_numpy(dtype=np.int64)
+        p1_won = df["target"].to_numpy(dtype=bool)
+        surfaces = df["surface"].to_numpy() if self.surfaces else [None] * n_rows
+        self._reserve(int(max(p1_ids.max(), p2_ids.max())))
+
+        for i in range(n_rows):
+            elo_p1, elo_p2, proba, proba_surface = self.update(
+                p1_ids[i], p2_ids[i], p1_won[i], surfaces[i]
+            )
+            if proba_surface is None:
+                proba_surface = np.nan
+            features[i] = (elo_p1, elo_p2, proba, proba_surface)
+        self.last_date = dates[-1]
+        return self._features_frame(features, df.index)
+
+    def _features_frame(self, features, index):
+        columns = ["elo_p1", "elo_p2", "proba_elo", "proba_elo_surface"]
+        frame = pd.DataFrame(features, index=index, columns=columns)
+        if not self.surfaces:
+            frame = frame.drop(columns="proba_elo_surface")
+        return frame
+
+    def save(self, path):
+        """
+        Checkpoint the state to a ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the file.
+        """
+        np.savez(
+            path,
+            ratings=self.ratings,
+            n_matches=self.n_matches,
+            surface_ratings=(
+                self.surface_ratings if self.surfaces else np.empty((0, 0))
+            ),
+            surface_names=np.asarray(self.surface_names, dtype=str),
+            k_factor=np.nan if self.k_factor is None else self.k_factor,
+            surfaces=self.surfaces,
+            last_date=(
+                np.datetime64("NaT", "ns") if self.last_date is None else self.last_date
+            ),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Resume the state from a ``.npz`` checkpoint.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the file.
+
+        Returns
+        -------
+        EloEngine
+            The resumed engine.
+        """
+        with np.load(path) as state:
+            k_factor = float(state["k_factor"])
+            engine = cls(
+                k_factor=None if np.isnan(k_factor) else k_factor,
+                surfaces=bool(state["surfaces"]),
+            )
+            engine.ratings = state["ratings"].copy()
+            engine.n_matches = state["n_matches"].copy()
+            if engine.surfaces:
+                engine.surface_ratings = state["surface_ratings"].copy()
+                engine.surface_names = state["surface_names"].tolist()
+            last_date = state["last_date"]
+            engine.last_date = None if np.isnat(last_date) else last_date[()]
+        return engine
+
+
+def extend_ratings(df, checkpoint_path, k_factor=None, surfaces=False):
+    """
+    Compute the Elo features of new matches, resuming from a checkpoint.
+
+    Only the given matches are processed: the checkpoint, created on first
+    use, holds the ratings after all previously processed matches and is
+    updated in place.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The new matches, not preceding the last checkpointed match.
+    checkpoint_path : str or Path
+        The path to the ``.npz`` checkpoint.
+    k_factor : float or None, default=None
+        The K factor of a new engine, see ``EloEngine``.
+    surfaces : bool, default=False
+        Whether a new engine keeps surface-specific ratings.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The Elo features of the new matches, see ``EloEngine.process``.
+    """
+    if Path(checkpoint_path).exists():
+        engine = EloEngine.load(checkpoint_path)
+    else:
+        engine = EloEngine(k_factor=k_factor, surfaces=surfaces)
+    features = engine.process(df)
+    engine.save(checkpoint_path)
+    return features
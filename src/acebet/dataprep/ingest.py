@@ -0,0 +1,120 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Suffixes of the ATP result files, one file per season upstream
+SOURCE_SUFFIXES = (".csv", ".xlsx", ".xls")
+
+# Columns identifying a match in the source files
+MATCH_KEY = ["Date", "Tournament", "Winner", "Loser"]
+
+
+def source_files(source):
+    """
+    List the ATP result files of a source.
+
+    Parameters
+    ----------
+    source : str or Path
+        A file, a directory of files or a glob pattern, e.g. "data/*.xlsx".
+
+    Returns
+    -------
+    list of Path
+        The files, sorted by path.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the source matches no file.
+    """
+    path = Path(source)
+    if path.is_dir():
+        files = [f for f in path.iterdir() if f.suffix.lower() in SOURCE_SUFFIXES]
+    elif path.is_file():
+        files = [path]
+    else:
+        files = [Path(f) for f in glob.glob(str(source))]
+    if not files:
+        raise FileNotFoundError(f"No ATP result file matches '{source}'")
+    return sorted(files)
+
+
+def read_source(path):
+    """
+    Read one ATP result file, parsing the match dates.
+
+    Parameters
+    ----------
+    path : str or Path
+        A CSV or Excel file.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The matches of the file.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        data = pd.read_csv(path, low_memory=False)
+    else:
+        data = pd.read_excel(path)
+    data["Date"] = pd.to_datetime(data["Date"])
+    return data
+
+
+def match_hash(data):
+    """
+    A hash of each match, independent of the row order and of the files.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The matches, with the ``MATCH_KEY`` columns.
+
+    Returns
+    -------
+    numpy.ndarray
+        The uint64 hash of each row.
+    """
+    return pd.util.hash_pandas_object(data[MATCH_KEY], index=False).to_numpy()
+
+
+def load_sources(source, n_jobs=None):
+    """
+    Read the ATP result files of a source in parallel and merge them.
+
+    Each file is parsed in its own process. The merged matches are sorted by
+    date, ties being broken by the match hash, so that the result does not
+    depend on the order or the split of the files.
+
+    Parameters
+    ----------
+    source : str or Path
+        A file, a directory of files or a glob pattern.
+    n_jobs : int, optional
+        The number of processes, by default one per CPU, at most one per file.
+
+    Returns
+    -------
+    data : pandas.DataFrame
+        The merged matches, in date order, with a fresh index.
+    hashes : numpy.ndarray
+        The match hash of each row, see ``match_hash``.
+    """
+    files = source_files(source)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(files))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            frames = list(executor.map(read_source, files))
+    else:
+        frames = [read_source(f) for f in files]
+    data = pd.concat(frames, ignore_index=True)
+
+    hashes = match_hash(data)
+    order = np.lexsort((hashes, data["Date"].to_numpy()))
+    return data.iloc[order].reset_index(drop=True), hashes[order]
@@ -0,0 +1,186 @@
+import zlib
+
+import numpy as np
+from pathlib import Path
+
+
+class PlayerRowIndex:
+    """
+    Compressed sparse row index from player ID to the rows of their matches.
+
+    The rows of player ``i`` are ``rows[indptr[i]:indptr[i + 1]]``, sorted by
+    match date, so that the history of a player is a slice and its cost grows
+    with the number of matches of that player, not with the dataset size.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        The offsets of each player in ``rows``, of length ``n_players + 1``.
+    rows : numpy.ndarray
+        The row positions, grouped by player and sorted by date.
+    n_rows : int
+        The number of rows of the indexed data.
+    fingerprint : int, optional
+        The ``data_fingerprint`` of the indexed data, to check it is up to
+        date.
+    """
+
+    def __init__(self, indptr, rows, n_rows, fingerprint=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.n_rows = int(n_rows)
+        self.fingerprint = None if fingerprint is None else int(fingerprint)
+
+    @staticmethod
+    def data_fingerprint(df):
+        """
+        A checksum of the columns the index is built from.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The match data, with integer 'p1' and 'p2' IDs and a 'date' column.
+
+        Returns
+        -------
+        int
+            The CRC32 of the player IDs and dates, which changes whenever the
+            data is rebuilt differently, even with the same number of rows.
+        """
+        checksum = 0
+        for column in (
+            df["p1"].to_numpy().astype(np.int64),
+            df["p2"].to_numpy().astype(np.int64),
+            df["date"].to_numpy().astype("datetime64[ns]").astype(np.int64),
+        ):
+            checksum = zlib.crc32(np.ascontiguousarray(column).data, checksum)
+        return checksum
+
+    @classmethod
+    def build(cls, df, n_players=None):
+        """
+        Build the index of a DataFrame with integer player IDs.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The match data, with integer 'p1' and 'p2' IDs and a 'date' column.
+        n_players : int, optional
+            The number of player IDs, by default the largest ID plus one.
+
+        Returns
+        -------
+        PlayerRowIndex
+            The index.
+        """
+        n_rows = len(df)
+        row_ids = np.arange(n_rows, dtype=np.int64)
+        players = np.concatenate([df["p1"].to_numpy(), df["p2"].to_numpy()])
+        players = players.astype(np.int64)
+        rows = np.concatenate([row_ids, row_ids])
+        if n_players is None:
+            n_players = int(players.max()) + 1 if n_rows else 0
+        dates = df["date"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+        # Sort by player, then date, then row position for ties
+        order = np.lexsort((rows, dates[rows], players))
+        indptr = np.zeros(n_players + 1, dtype=np.int64)
+        np.cumsum(np.bincount(players, minlength=n_players), out=indptr[1:])
+        return cls(indptr, rows[order], n_rows, cls.data_fingerprint(df))
+
+    @property
+    def n_players(self):
+        return len(self.indptr) - 1
+
+    def count(self, player_id):
+        """The number of matches of a player."""
+        if not 0 <= player_id < self.n_players:
+            return 0
+        return int(self.indptr[player_id + 1] - self.indptr[player_id])
+
+    def rows_of(self, player_id):
+        """
+        The rows of the matches of a player.
+
+        Parameters
+        ----------
+        player_id : int
+            The player ID.
+
+        Returns
+        -------
+        numpy.ndarray
+            A view on the row positions, sorted by date.
+        """
+        if not 0 <= player_id < self.n_players:
+            return self.rows[:0]
+        return self.rows[self.indptr[player_id] : self.indptr[player_id + 1]]
+
+    def head_to_head(self, df, p1_id, p2_id):
+        """
+        The rows of the matches between two players.
+
+        Only the history of the player with the fewest matches is scanned.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The indexed match data.
+        p1_id : int
+            The ID of the first player.
+        p2_id : int
+            The ID of the second player.
+
+        Returns
+        -------
+        numpy.ndarray
+            The row positions, sorted by date.
+        """
+        if self.count(p2_id) < self.count(p1_id):
+            p1_id, p2_id = p2_id, p1_id
+        rows = self.rows_of(p1_id)
+        p1, p2 = df["p1"].to_numpy()[rows], df["p2"].to_numpy()[rows]
+        return rows[(p1 == p2_id) | (p2 == p2_id)]
+
+    def save(self, path):
+        """
+        Write the index to a ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the file.
+        """
+        np.savez(
+            path,
+            indptr=self.indptr,
+            rows=self.rows,
+            n_rows=self.n_rows,
+            fingerprint=-1 if self.fingerprint is None else self.fingerprint,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index from a ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the file.
+
+        Returns
+        -------
+        PlayerRowIndex or None
+            The index, None if the file does not exist.
+        """
+        if not Path(path).exists():
+            return None
+        with np.load(path) as arrays:
+            # Indexes saved without a fingerprint are never up to date
+            fingerprint = arrays.get("fingerprint", -1)
+            return cls(
+                arrays["indptr"],
+                arrays["rows"],
+                arrays["n_rows"],
+                None if fingerprint == -1 else fingerprint,
+            )
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Sentinel ID of a name missing from the dictionary
+UNKNOWN_PLAYER = -1
+
+
+class PlayerDictionary:
+    """
+    Persistent mapping between player names and compact integer IDs.
+
+    IDs are assigned in order of first appearance and never change once
+    assigned, so that data, indexes and models built at different times agree
+    on them. Extending the dictionary only appends new names.
+
+    Parameters
+    ----------
+    names : list of str, optional
+        The player names, the ID of a name being its position.
+
+    Attributes
+    ----------
+    names : numpy.ndarray
+        The player names indexed by ID.
+    """
+
+    def __init__(self, names=None):
+        self.names = np.asarray(names if names is not None else [], dtype=object)
+        self._ids = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def extend(self, names):
+        """
+        Append the names missing from the dictionary.
+
+        Parameters
+        ----------
+        names : array-like of str
+            The names to add, duplicates and known names are ignored.
+
+        Returns
+        -------
+        PlayerDictionary
+            The dictionary itself.
+        """
+        new_names = [
+            name
+            for name in pd.unique(pd.Series(names, dtype=object).dropna())
+            if name not in self._ids
+        ]
+        if new_names:
+            start = len(self.names)
+            self._ids.update({name: start + i for i, name in enumerate(new_names)})
+            self.names = np.concatenate(
+                [self.names, np.asarray(new_names, dtype=object)]
+            )
+        return self
+
+    def id_of(self, name):
+        """
+        Get the ID of a player name.
+
+        Parameters
+        ----------
+        name : str
+            The player name.
+
+        Returns
+        -------
+        int or None
+            The ID, None if the name is unknown.
+        """
+        return self._ids.get(name)
+
+    def encode(self, names):
+        """
+        Encode player names as IDs.
+
+        Parameters
+        ----------
+        names : array-like of str
+            The names to encode.
+
+        Returns
+        -------
+        numpy.ndarray
+            The int32 IDs, ``UNKNOWN_PLAYER`` for unknown names.
+        """
+        codes = pd.Series(names, dtype=object).map(self._ids)
+        return codes.fillna(UNKNOWN_PLAYER).to_numpy(dtype=np.int32)
+
+    def decode(self, ids):
+        """
+        Decode player IDs as names.
+
+        Parameters
+        ----------
+        ids : array-like of int
+            The IDs to decode, all must be known.
+
+        Returns
+        -------
+        numpy.ndarray
+            The player names.
+        """
+        return self.names[np.asarray(ids, dtype=np.int64)]
+
+    def save(self, path):
+        """
+        Write the dictionary to a feather file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the feather file.
+        """
+        pd.DataFrame(
+            {
+                "player_id": np.arange(len(self.names), dtype=np.int32),
+                "name": self.names,
+            }
+        ).to_feather(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a dictionary from a feather file, empty if the file does not exist.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path to the feather file.
+
+        Returns
+        -------
+        PlayerDictionary
+            The loaded dictionary.
+        """
+        if not Path(path).exists():
+            return cls()
+        players = pd.read_feather(path).sort_values("player_id")
+        return cls(players["name"].tolist())
+
+    @classmethod
+    def from_frame(cls, df, columns=("p1", "p2")):
+        """
+        Build a dictionary from the player name columns of a DataFrame.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The match data.
+        columns : tuple of str, default=("p1", "p2")
+            The player name columns.
+
+        Returns
+        -------
+        PlayerDictionary
+            The dictionary of the players found in the columns.
+        """
+        return cls().extend(np.concatenate([df[c].to_numpy() for c in columns]))
+
+
+def intern_players(df, players=None, columns=("p1", "p2")):
+    """
+    Replace player names by their integer IDs in the given columns.
+
+    Columns already holding IDs are left as they are. Rows missing a player
+    name are dropped: they cannot be given an ID, and ``UNKNOWN_PLAYER``
+    would index the arrays of the player indexes and ratings from the end.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The match data.
+    players : PlayerDictionary, optional
+        The dictionary to encode with, extended with unknown names. By default
+        a dictionary is built from the columns.
+    columns : tuple of str, default=("p1", "p2")
+        The player name columns.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The match data with int32 player IDs, with a fresh index if rows
+        were dropped.
+    players : PlayerDictionary
+        The dictionary used.
+    """
+    if players is None:
+        players = PlayerDictionary()
+    named = [c for c in columns if not pd.api.types.is_integer_dtype(df[c])]
+    if named:
+        missing = df[named].isna().any(axis=1).to_numpy()
+        if missing.any():
+            df = df[~missing].reset_index(drop=True)
+        players.extend(np.concatenate([df[c].to_numpy() for c in named]))
+        df = df.assign(**{c: players.encode(df[c]) for c in named})
+    return df, players
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the prepared data and the dtype kind they must have
+SCHEMA = {
+    "date": "M",
+    "surface": "O",
+    "court": "O",
+    "best of": "if",
+    "rank_p1": "if",
+    "rank_p2": "if",
+    "elo_p1": "f",
+    "elo_p2": "f",
+    "proba_elo": "f",
+    "target": "b",
+}
+
+# Columns parsed as numbers, entries that are not becoming NaN
+NUMERIC_COLUMNS = [
+    "rank_p1",
+    "rank_p2",
+    "sets_p1",
+    "sets_p2",
+    "ps_p1",
+    "ps_p2",
+    "b365_p1",
+    "b365_p2",
+    "elo_p1",
+    "elo_p2",
+    "proba_elo",
+]
+
+KNOWN_SURFACES = ("Hard", "Clay", "Grass", "Carpet")
+KNOWN_COURTS = ("Indoor", "Outdoor")
+ODDS_COLUMNS = ["ps_p1", "ps_p2", "b365_p1", "b365_p2"]
+
+# Columns that are not predictors: the target, and what is known after the
+# match. The training and the serving must drop the same ones.
+NON_PREDICTORS = [
+    "target",
+    "date",
+    "sets_p1",
+    "sets_p2",
+    "b365_p1",
+    "b365_p2",
+    "ps_p1",
+    "ps_p2",
+]
+
+
+def coerce_numeric(df):
+    """
+    Parse the numeric columns of the ATP data, e.g. ranks given as "NR".
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The ATP data.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The data with numeric columns, unparsable entries being NaN so that
+        the validation rejects them.
+    """
+    columns = [c for c in NUMERIC_COLUMNS if c in df.columns]
+    return df.assign(**{c: pd.to_numeric(df[c], errors="coerce") for c in columns})
+
+
+def check_schema(df):
+    """
+    Check that the prepared data has the expected columns and dtypes.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The prepared data.
+
+    Raises
+    ------
+    ValueError
+        If a column is missing or has an unexpected dtype.
+    """
+    errors = []
+    for column, kinds in SCHEMA.items():
+        if column not in df.columns:
+            errors.append(f"missing column '{column}'")
+        elif df[column].dtype.kind not in kinds and not (
+            kinds == "O" and pd.api.types.is_string_dtype(df[column])
+        ):
+            errors.append(f"column '{column}' has dtype {df[column].dtype}")
+    for column in ("p1", "p2"):
+        if column not in df.columns:
+            errors.append(f"missing column '{column}'")
+    if errors:
+        raise ValueError("Invalid ATP data schema: " + ", ".join(errors))
+
+
+def structural_checks(df, n_players=None):
+    """
+    Evaluate the checks of the matches themselves, whatever their features.
+
+    The rows failing them (no date, the same or an unknown player on both
+    sides, a duplicate of an earlier match) must not update the Elo ratings
+    either, so they are checked before the ratings are computed.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The match data, with 'date' and integer 'p1' and 'p2' player IDs.
+    n_players : int, optional
+        The size of the player dictionary the IDs refer to, to check that
+        they are known.
+
+    Returns
+    -------
+    dict
+        The boolean mask of the failing rows of each check, by check name.
+    """
+    p1, p2 = df["p1"].to_numpy(), df["p2"].to_numpy()
+    checks = {
+        "missing_date": df["date"].isna().to_numpy(),
+        "same_players": p1 == p2,
+    }
+    if n_players is not None:
+        checks["unknown_player"] = (
+            (p1 < 0) | (p1 >= n_players) | (p2 < 0) | (p2 >= n_players)
+        )
+    # The same pair of players on the same day, in either orientation
+    pairs = pd.DataFrame(
+        {
+            "date": df["date"].to_numpy(),
+            "low": np.minimum(p1, p2),
+            "high": np.maximum(p1, p2),
+        }
+    )
+    checks["duplicate_match"] = pairs.duplicated(keep="first").to_numpy()
+    return checks
+
+
+def quality_checks(df, n_players=None):
+    """
+    Evaluate the data-quality checks over whole columns.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The prepared data, see ``check_schema``.
+    n_players : int, optional
+        The size of the player dictionary the integer 'p1' and 'p2' IDs
+        refer to, to check that they are known.
+
+    Returns
+    -------
+    dict
+        The boolean mask of the failing rows of each check, by check name.
+    """
+    ranks = df[["rank_p1", "rank_p2"]]
+    elo = df[["elo_p1", "elo_p2", "proba_elo"]]
+    structural = structural_checks(df, n_players)
+    checks = {
+        "missing_date": structural.pop("missing_date"),
+        "missing_rank": ranks.isna().any(axis=1).to_numpy(),
+        "invalid_rank": (ranks < 1).any(axis=1).to_numpy(),
+        "missing_elo": elo.isna().any(axis=1).to_numpy(),
+        # Comparisons with NaN are False: missing values are not out of range
+        "invalid_proba_elo": ((df["proba_elo"] < 0) | (df["proba_elo"] > 1)).to_numpy(),
+        "unknown_surface": ~df["surface"].isin(KNOWN_SURFACES).to_numpy(),
+        "unknown_court": ~df["court"].isin(KNOWN_COURTS).to_numpy(),
+        "invalid_best_of": ~df["best of"].isin((3, 5)).to_numpy(),
+        "same_players": structural.pop("same_players"),
+    }
+    # Odds are optional, but below 1 they are not odds
+    odds = [c for c in ODDS_COLUMNS if c in df.columns]
+    if odds:
+        checks["invalid_odds"] = (df[odds] <= 1).any(axis=1).to_numpy()
+    checks.update(structural)
+    return checks
+
+
+def validate_matches(df, players=None):
+    """
+    Validate the prepared ATP data, splitting it into clean and quarantined.
+
+    The checks are vectorised over whole columns: schema, missing values,
+    value ranges, known categories, duplicate matches and consistency of the
+    player IDs. Rows failing any check are quarantined once, at build time,
+    so they never reach the serving path.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The prepared data, with integer 'p1' and 'p2' player IDs.
+    players : PlayerDictionary, optional
+        The dictionary the player IDs refer to.
+
+    Returns
+    -------
+    clean : pandas.DataFrame
+        The rows passing all the checks, with a fresh index.
+    quarantine : pandas.DataFrame
+        The rejected rows, with their original position in 'row' and the
+        names of the failed checks in 'reasons', separated by ";".
+    report : dict
+        The number of rows, of clean and quarantined rows, and the number of
+        failing rows of each check.
+
+    Raises
+    ------
+    ValueError
+        If the schema of the data is invalid.
+    """
+    check_schema(df)
+    checks = quality_checks(df, None if players is None else len(players))
+
+    n_rows = len(df)
+    rejected = np.zeros(n_rows, dtype=bool)
+    reasons = np.full(n_rows, "", dtype=object)
+    for name, failed in checks.items():
+        rejected |= failed
+        reasons[failed] += name + ";"
+
+    quarantine = df[rejected].assign(
+        reasons=[reason.rstrip(";") for reason in reasons[rejected]]
+    )
+    quarantine.insert(0, "row", np.flatnonzero(rejected))
+    report = {
+        "n_rows": n_rows,
+        "n_clean": int(n_rows - rejected.sum()),
+        "n_quarantined": int(rejected.sum()),
+        "checks": {name: int(failed.sum()) for name, failed in checks.items()},
+    }
+    clean = df[~rejected].reset_index(drop=True)
+    return clean, quarantine.reset_index(drop=True), report
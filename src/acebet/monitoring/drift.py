@@ -0,0 +1,353 @@
+import json
+import threading
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+# Features whose live distribution is compared with the training one
+DRIFT_FEATURES = [
+    "rank_diff",
+    "proba_elo",
+    "rank_p1",
+    "rank_p2",
+    "elo_p1",
+    "elo_p2",
+    "surface",
+    "court",
+    "series",
+    "round",
+    "best of",
+]
+
+# Interior edges of the bins of the predicted probabilities
+PREDICTION_EDGES = np.linspace(0, 1, 11)[1:-1]
+
+# The PSI above which a distribution is reported as drifting
+PSI_ALERT = 0.2
+
+# The rows up to which an update increments the counts one by one
+SMALL_UPDATE = 4
+
+
+def psi(expected, actual, eps=1e-4):
+    """
+    Population stability index of two histograms over the same bins.
+
+    Parameters
+    ----------
+    expected : numpy.ndarray
+        The reference counts.
+    actual : numpy.ndarray
+        The live counts.
+    eps : float, default=1e-4
+        The proportion given to empty bins, so that the index stays finite.
+
+    Returns
+    -------
+    float
+        The index, 0 for identical distributions, above 0.2 for a shift
+        usually worth a look.
+    """
+    expected = np.maximum(np.asarray(expected, float) / np.sum(expected), eps)
+    actual = np.maximum(np.asarray(actual, float) / np.sum(actual), eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected, actual):
+    """
+    Kolmogorov-Smirnov statistic of two histograms over the same ordered bins.
+
+    The statistic is the largest gap between the two cumulative proportions
+    at the bin edges, a lower bound of the statistic of the raw values.
+
+    Parameters
+    ----------
+    expected : numpy.ndarray
+        The reference counts.
+    actual : numpy.ndarray
+        The live counts.
+
+    Returns
+    -------
+    float
+        The statistic, between 0 and 1.
+    """
+    expected = np.cumsum(expected) / np.sum(expected)
+    actual = np.cumsum(actual) / np.sum(actual)
+    return float(np.max(np.abs(actual - expected)))
+
+
+class DriftProfile:
+    """
+    The binned distributions of the training data of a model.
+
+    Numeric features are binned by the deciles of their training values,
+    categorical ones by their most frequent training categories, the others
+    falling in an "other" bin. Each feature also has a last bin for missing
+    values. The predicted probabilities are binned by tenths.
+
+    Parameters
+    ----------
+    features : dict
+        For each feature, its 'kind' ("numeric" or "categorical"), its
+        'edges' (the interior bin edges) or 'categories', and the training
+        'counts' of its bins.
+    prediction : dict
+        The 'edges' and the training 'counts' of the predicted probabilities.
+    n_rows : int
+        The number of training rows.
+    """
+
+    def __init__(self, features, prediction, n_rows):
+        self.features = features
+        self.prediction = prediction
+        self.n_rows = n_rows
+
+    @staticmethod
+    def _bin(spec, values):
+        values = pd.Series(values)
+        missing = values.isna().to_numpy()
+        if spec["kind"] == "numeric":
+            numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+            bins = np.searchsorted(spec["edges"], numbers, side="right")
+            n_bins = len(spec["edges"]) + 1
+        else:
+            categories = pd.Index(spec["categories"], dtype=object)
+            bins = categories.get_indexer(values.astype(str).astype(object))
+            n_bins = len(categories) + 1
+            bins = np.where(bins < 0, n_bins - 1, bins)
+        return np.where(missing, n_bins, bins)
+
+    @classmethod
+    def build(cls, X, prob, features=None, n_bins=10, max_categories=20):
+        """
+        Profile the training data and the predictions of a model.
+
+        Parameters
+        ----------
+        X : pandas.DataFrame
+            The training features.
+        prob : numpy.ndarray
+            The probabilities predicted by the model on ``X``.
+        features : list of str, optional
+            The features to profile, by default those of ``DRIFT_FEATURES``
+            found in ``X``.
+        n_bins : int, default=10
+            The number of quantile bins of the numeric features.
+        max_categories : int, default=20
+            The number of categories kept for the categorical features.
+
+        Returns
+        -------
+        DriftProfile
+            The profile.
+        """
+        if features is None:
+            features = [column for column in DRIFT_FEATURES if column in X.columns]
+        specs = {}
+        for feature in features:
+            values = X[feature]
+            dtype = values.dtype
+            if is_numeric_dtype(dtype) and not is_bool_dtype(dtype):
+                quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+                edges = np.unique(np.nanquantile(values.to_numpy(float), quantiles))
+                spec = {"kind": "numeric", "edges": edges.tolist()}
+            else:
+                top = values.value_counts().index[:max_categories]
+                spec = {"kind": "categorical", "categories": list(map(str, top))}
+            bins = cls._bin(spec, values)
+            spec["counts"] = np.bincount(bins, minlength=cls._n_bins(spec)).tolist()
+            specs[feature] = spec
+        prediction = {"edges": PREDICTION_EDGES.tolist()}
+        prediction["counts"] = np.bincount(
+            np.searchsorted(PREDICTION_EDGES, np.asarray(prob), side="right"),
+            minlength=len(PREDICTION_EDGES) + 1,
+        ).tolist()
+        return cls(specs, prediction, len(X))
+
+    @staticmethod
+    def _n_bins(spec):
+        # The value bins, then the bin of the missing values
+        if spec["kind"] == "numeric":
+            return len(spec["edges"]) + 2
+        return len(spec["categories"]) + 2
+
+    def bin_features(self, df) -> np.ndarray:
+        """
+        The bin of each profiled feature of each row.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The data, with the profiled features. Missing features fall in
+            the missing bin.
+
+        Returns
+        -------
+        numpy.ndarray
+            The bins, of shape (rows, features), in the order of
+            ``self.features``.
+        """
+        bins = np.empty((len(df), len(self.features)), dtype=np.uint8)
+        for j, (feature, spec) in enumerate(self.features.items()):
+            if feature not in df.columns:
+                bins[:, j] = self._n_bins(spec) - 1
+                continue
+            bins[:, j] = self._bin(spec, df[feature])
+        return bins
+
+    @staticmethod
+    def path_for(model_file) -> Path:
+        """The profile file saved with a model file."""
+        model_file = Path(model_file)
+        return model_file.with_name(f"{model_file.stem}.drift.json")
+
+    def save(self, path):
+        """Save the profile as JSON."""
+        content = {
+            "n_rows": self.n_rows,
+            "features": self.features,
+            "prediction": self.prediction,
+        }
+        Path(path).write_text(json.dumps(content))
+
+    @classmethod
+    def load(cls, path) -> "DriftProfile":
+        """Load a profile saved by ``save``."""
+        content = json.loads(Path(path).read_text())
+        return cls(content["features"], content["prediction"], content["n_rows"])
+
+
+class DriftMonitor:
+    """
+    Streaming histograms of the served rows and predictions of a model.
+
+    The served data is binned once, when the model is loaded: an update only
+    counts the bins of the scored rows. A single prediction increments a few
+    counters of Python lists, a batch makes one ``numpy.bincount`` whatever
+    the number of features.
+
+    Parameters
+    ----------
+    profile : DriftProfile
+        The training profile of the model.
+    bins : numpy.ndarray
+        The bins of the served rows, see ``DriftProfile.bin_features``.
+    """
+
+    def __init__(self, profile, bins):
+        self.profile = profile
+        self._sizes = [DriftProfile._n_bins(s) for s in profile.features.values()]
+        # The bins of the features are laid out one after the other
+        offsets = np.concatenate([[0], np.cumsum(self._sizes)[:-1]])
+        self._index = (bins + offsets).astype(np.int16)
+        self._edges = np.asarray(profile.prediction["edges"])
+        self._edge_list = self._edges.tolist()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the served rows counted so far."""
+        with self._lock:
+            self._counts = np.zeros(sum(self._sizes), dtype=np.int64)
+            self._prediction_counts = np.zeros(len(self._edges) + 1, np.int64)
+            self._small_counts = [0] * len(self._counts)
+            self._small_prediction_counts = [0] * len(self._prediction_counts)
+            self.n_rows = 0
+
+    def update(self, rows, prob):
+        """
+        Count served rows and their predictions.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The rows of the served data.
+        prob : numpy.ndarray
+            Their predicted probabilities, between 0 and 1.
+        """
+        rows = np.asarray(rows)
+        if len(rows) <= SMALL_UPDATE:
+            # Python integers beat numpy calls on a few values
+            with self._lock:
+                for row, p in zip(rows.tolist(), np.asarray(prob).tolist()):
+                    for index in self._index[row].tolist():
+                        self._small_counts[index] += 1
+                    self._small_prediction_counts[bisect_right(self._edge_list, p)] += 1
+                self.n_rows += len(rows)
+            return
+        counts = np.bincount(self._index[rows].ravel(), minlength=len(self._counts))
+        prediction_counts = np.bincount(
+            np.searchsorted(self._edges, prob, side="right"),
+            minlength=len(self._prediction_counts),
+        )
+        with self._lock:
+            self._counts += counts
+            self._prediction_counts += prediction_counts
+            self.n_rows += len(rows)
+
+    def report(self, histograms=False) -> dict:
+        """
+        Compare the served distributions with the training ones.
+
+        Parameters
+        ----------
+        histograms : bool, default=False
+            Whether to include the reference and live counts of each bin.
+
+        Returns
+        -------
+        dict
+            The number of 'reference_rows' and 'live_rows', the PSI and KS
+            scores of each feature and of the predictions (None before any
+            served row, KS only for ordered bins), and the 'alerts', the
+            features whose PSI exceeds ``PSI_ALERT``.
+        """
+        with self._lock:
+            counts = self._counts + self._small_counts
+            prediction_counts = self._prediction_counts + self._small_prediction_counts
+            n_rows = self.n_rows
+        features = {}
+        offset = 0
+        for (feature, spec), size in zip(self.profile.features.items(), self._sizes):
+            # The missing bin is not ordered with the others
+            ordered = slice(0, -1) if spec["kind"] == "numeric" else None
+            features[feature] = self._scores(
+                spec["counts"], counts[offset : offset + size], ordered, histograms
+            )
+            offset += size
+        prediction = self._scores(
+            self.profile.prediction["counts"],
+            prediction_counts,
+            slice(None),
+            histograms,
+        )
+        alerts = [
+            name
+            for name, scores in {**features, "prediction": prediction}.items()
+            if scores["psi"] is not None and scores["psi"] > PSI_ALERT
+        ]
+        return {
+            "reference_rows": self.profile.n_rows,
+            "live_rows": n_rows,
+            "features": features,
+            "prediction": prediction,
+            "alerts": alerts,
+        }
+
+    @staticmethod
+    def _scores(reference, live, ordered, histograms):
+        # KS compares the ordered bins only, None for categories
+        reference = np.asarray(reference)
+        scores = {"psi": None, "ks": None}
+        if live.sum() and reference.sum():
+            scores["psi"] = round(psi(reference, live), 4)
+        if ordered is not None and live[ordered].sum() and reference[ordered].sum():
+            scores["ks"] = round(ks(reference[ordered], live[ordered]), 4)
+        if histograms:
+            scores["reference"] = reference.tolist()
+            scores["live"] = live.tolist()
+        return scores
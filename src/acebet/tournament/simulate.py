@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Simulations per chunk, each chunk drawing from its own child seed
+CHUNK_SIZE = 25_000
+
+# Position of a bye in a draw
+BYE = -1
+
+
+def round_labels(n_slots):
+    """
+    The labels of the stages reached by winning each round of a draw.
+
+    Parameters
+    ----------
+    n_slots : int
+        The size of the draw, a power of two.
+
+    Returns
+    -------
+    list of str
+        E.g. ["R16", "QF", "SF", "F", "W"] for a draw of 32.
+    """
+    names = {1: "W", 2: "F", 4: "SF", 8: "QF"}
+    labels = []
+    remaining = n_slots // 2
+    while remaining >= 1:
+        labels.append(names.get(remaining, f"R{remaining}"))
+        remaining //= 2
+    return labels
+
+
+def simulate_chunk(task):
+    """
+    Simulate a chunk of brackets, all the matches of a round at once.
+
+    Parameters
+    ----------
+    task : tuple
+        The probability matrix, extended with the bye, the draw (positions
+        in the matrix), the number of simulations and the seed.
+
+    Returns
+    -------
+    numpy.ndarray
+        The number of simulations in which each player won each round, of
+        shape (rounds, players).
+    """
+    prob, draw, n_sims, seed = task
+    rng = np.random.default_rng(seed)
+    # The smallest integers holding the positions, for memory bandwidth
+    draw = draw.astype(np.int16 if len(prob) <= np.iinfo(np.int16).max else np.int32)
+    # The first-round pairings are the same in all the simulations
+    p1, p2 = draw[0::2], draw[1::2]
+    alive = np.where(rng.random((n_sims, len(p1))) < prob[p1, p2], p1, p2)
+    counts = [np.bincount(alive.ravel(), minlength=len(prob))]
+    while alive.shape[1] > 1:
+        p1, p2 = alive[:, 0::2], alive[:, 1::2]
+        alive = np.where(rng.random(p1.shape) < prob[p1, p2], p1, p2)
+        counts.append(np.bincount(alive.ravel(), minlength=len(prob)))
+    return np.array(counts)
+
+
+def simulate_bracket(
+    prob,
+    draw=None,
+    n_sims=100_000,
+    seed=0,
+    n_jobs=None,
+    chunk_size=CHUNK_SIZE,
+    executor=None,
+):
+    """
+    Monte Carlo simulation of a knockout draw.
+
+    The simulations are split into chunks, each simulated with vectorised
+    random draws: one array operation per round across all its simulations.
+    The chunks run across a process pool, ``executor`` or one created for
+    the call. Each chunk has its own child seed of ``seed``, and the chunks
+    do not depend on the number of processes, so that a seed always gives
+    the same result.
+
+    Parameters
+    ----------
+    prob : numpy.ndarray
+        The N x N matrix of the probability of the row player beating the
+        column player, see ``acebet.app.dependencies.pairwise``.
+    draw : sequence of int, optional
+        The position in ``prob`` of the player of each slot of the draw, in
+        bracket order, ``BYE`` for a bye. By default the players in order.
+    n_sims : int, default=100_000
+        The number of simulations.
+    seed : int, default=0
+        The seed of the random draws.
+    n_jobs : int, optional
+        The number of processes, by default one per CPU, at most one per
+        chunk.
+    chunk_size : int, default=CHUNK_SIZE
+        The number of simulations per chunk.
+    executor : concurrent.futures.Executor, optional
+        A long-lived pool running the chunks, instead of one created for the
+        call, ``n_jobs`` being then ignored.
+
+    Returns
+    -------
+    dict
+        The 'rounds' labels, see ``round_labels``, the N x rounds 'reach'
+        matrix of the probability of each player winning each round, the
+        last column being the title, and 'n_sims'.
+
+    Raises
+    ------
+    ValueError
+        If the size of the draw is not a power of two, or ``n_sims`` is not
+        positive.
+    """
+    prob = np.asarray(prob, dtype=float)
+    n_players = len(prob)
+    draw = np.arange(n_players) if draw is None else np.asarray(draw)
+    n_slots = len(draw)
+    if n_slots < 2 or n_slots & (n_slots - 1):
+        raise ValueError(f"The draw has {n_slots} slots, not a power of two")
+    if n_sims < 1:
+        raise ValueError("The number of simulations must be positive")
+
+    # The bye is an extra player losing all its matches
+    extended = np.full((n_players + 1, n_players + 1), 0.5)
+    extended[:n_players, :n_players] = np.nan_to_num(prob, nan=0.5)
+    extended[:n_players, n_players] = 1.0
+    extended[n_players, :n_players] = 0.0
+    draw = np.where(draw == BYE, n_players, draw)
+
+    sizes = [chunk_size] * (n_sims // chunk_size)
+    if n_sims % chunk_size:
+        sizes.append(n_sims % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(extended, draw, size, s) for size, s in zip(sizes, seeds)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks))
+    if executor is not None:
+        counts = sum(executor.map(simulate_chunk, tasks))
+    elif n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            counts = sum(executor.map(simulate_chunk, tasks))
+    else:
+        counts = sum(simulate_chunk(task) for task in tasks)
+
+    reach = counts[:, :n_players].T / n_sims
+    return {"rounds": round_labels(n_slots), "reach": reach, "n_sims": n_sims}
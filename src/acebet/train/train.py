@@ -8,11 +8,33 @@ from sklearn.preprocessing import OrdinalEncoder
 from joblib import dump
 from datetime import datetime
 
+from acebet.dataprep.validate import NON_PREDICTORS
+from acebet.monitoring.drift import DriftProfile
+
+LGB_PARAMS = {
+    "objective": "binary",
+    "metric": "binary_logloss",
+    "verbosity": -1,
+    "boosting_type": "gbdt",
+    "feature_pre_filter": False,
+    "reg_alpha": 0.0,
+    "reg_lambda": 0.0,
+    "num_leaves": 4,
+    "colsample_bytree": 0.4,
+    "subsample": 0.7957346694832138,
+    "subsample_freq": 4,
+    "min_child_samples": 20,
+    "n_estimators": 45,
+}
+
 
 def prepare_data_for_training_clf(start_date, end_date):
     """
     Prepare the ATP data for modeling.
 
+    The 'p1' and 'p2' columns of the production data hold integer player IDs,
+    so the encoder of the trained pipeline is fitted on IDs, not names.
+
     Parameters
     ----------
     start_date : str
@@ -33,11 +55,28 @@ def prepare_data_for_training_clf(start_date, end_date):
     df = pd.read_feather(data_path)
     df["date"] = pd.to_datetime(df["date"])
     df = df.query("date >= @start_date and date <= @end_date")
+    return split_features(df)
+
+
+def split_features(df):
+    """
+    Split the ATP data into predictors and target.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The ATP data.
 
+    Returns
+    -------
+    X : pandas.DataFrame
+        The predictors.
+    y : numpy.ndarray
+        The target, 1 when player 1 won.
+
+    """
     # Create predictors list
-    predictors = df.columns.drop(
-        ["target", "date", "sets_p1", "sets_p2", "b365_p1", "b365_p2", "ps_p1", "ps_p2"]
-    )
+    predictors = df.columns.drop(NON_PREDICTORS)
     X = df[predictors].copy()
     y = df["target"].values.copy() * 1
 
@@ -73,6 +112,34 @@ def time_series_split(X, y, n_splits=2):
     return train_idx, test_idx
 
 
+def build_model(lgb_params=None):
+    """
+    Build the unfitted model pipeline.
+
+    Parameters
+    ----------
+    lgb_params : dict, optional
+        The parameters of the LightGBM classifier, by default ``LGB_PARAMS``.
+
+    Returns
+    -------
+    model : sklearn.pipeline.Pipeline
+        The ordinal encoder and LightGBM classifier pipeline.
+
+    """
+    return Pipeline(
+        [
+            (
+                "encoder",
+                OrdinalEncoder(
+                    handle_unknown="use_encoded_value", unknown_value=np.nan
+                ).set_output(transform="pandas"),
+            ),
+            ("gbm", LGBMClassifier(**(lgb_params or LGB_PARAMS))),
+        ]
+    )
+
+
 def train_model(start_date, end_date):
     """
     Train a model on the training data.
@@ -94,38 +161,14 @@ def train_model(start_date, end_date):
     train_idx, _ = time_series_split(X, y, n_splits=2)
     X_train, y_train = X.iloc[train_idx, :].copy(), y[train_idx].copy()
 
-    lgb_params = {
-        "objective": "binary",
-        "metric": "binary_logloss",
-        "verbosity": -1,
-        "boosting_type": "gbdt",
-        "feature_pre_filter": False,
-        "reg_alpha": 0.0,
-        "reg_lambda": 0.0,
-        "num_leaves": 4,
-        "colsample_bytree": 0.4,
-        "subsample": 0.7957346694832138,
-        "subsample_freq": 4,
-        "min_child_samples": 20,
-        "n_estimators": 45,
-    }
-
-    model = Pipeline(
-        [
-            (
-                "encoder",
-                OrdinalEncoder(
-                    handle_unknown="use_encoded_value", unknown_value=np.nan
-                ).set_output(transform="pandas"),
-            ),
-            ("gbm", LGBMClassifier(**lgb_params)),
-        ]
-    )
-
+    model = build_model()
     model.fit(X_train, y_train)
     today = datetime.today()
     filename = f"./model_{today.strftime('%Y-%m-%d-%H-%M')}.joblib"
     dump(model, filename)
+    # The training distributions, for the drift monitoring of the served model
+    profile = DriftProfile.build(X_train, model.predict_proba(X_train)[:, 1])
+    profile.save(DriftProfile.path_for(filename))
 
 
 if __name__ == "__main__":
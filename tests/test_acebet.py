@@ -1,14 +1,50 @@
+import os
+import shutil
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import WebSocketDisconnect
 from fastapi.testclient import TestClient
 
 # Initializing unit tests with the TestClient to simulate HTTP requests.
 from acebet.app.main import app
+from acebet.app.dependencies import rate_limit as rate_limit_module
+from acebet.app.dependencies.predict_winner import predict_encoded, predict_frame
+from acebet.app.dependencies.model_watch import ModelVersion
+from acebet.app.dependencies.serving import ServingState, get_state, resolve_sources
+from acebet.app.dependencies.rate_limit import RateLimit, TokenBucketStore
+from acebet.app.dependencies.startup_profile import parse_importtime
+from acebet.app.dependencies.auth import fake_users_db, get_user, get_user_store
+from acebet.app.dependencies.user_store import (
+    DictUserStore,
+    SQLiteUserStore,
+    UserStore,
+    benchmark_lookups,
+)
+from acebet.app.dependencies.request_profile import RequestProfiler
+from acebet.app.dependencies.memory import deep_sizeof
+from acebet.app.dependencies.pairwise import player_states
+from acebet.app.dependencies.responses import ARROW_STREAM
+from acebet.app.dependencies.audit import AuditSink, audit_sink
+from acebet.monitoring.drift import DriftProfile
 
 
 class TestAceBetAPI(unittest.TestCase):
     def setUp(self):
         # Setting up the test environment with the FastAPI TestClient instance.
         self.client = TestClient(app)
+        # Fresh token buckets for each test, not those of the host or earlier runs
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = TokenBucketStore(Path(tmp.name) / "buckets.bin")
+        patcher = mock.patch.object(rate_limit_module, "_store", store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_login_for_access_token(self):
         # Testing user authentication by sending a POST request for an access token.
@@ -68,9 +104,677 @@ class TestAceBetAPI(unittest.TestCase):
         self.assertIn("prob", data)
         self.assertIn("class_", data)
 
-    def get_access_token(self):
+    def test_health_ready_after_prediction(self):
+        # Testing that the served source turns ready once the model is loaded.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        prediction_data = {
+            "p1_name": "Fognini F.",
+            "p2_name": "Jarry N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        self.client.post("/predict/", headers=headers, json=prediction_data)
+        # The sample source is loaded by the prediction above.
+        response = self.client.get("/health/ready", params={"testing": True})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["ready"])
+        self.assertIsNotNone(data["model_file"])
+
+    def test_search_players(self):
+        # Testing prefix and typo-tolerant player name search.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"q": "fogn", "testing": True}
+        response = self.client.get("/players/search", headers=headers, params=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["name"], "Fognini F.")
+        # Without production data, the production source is unavailable
+        with mock.patch(
+            "acebet.app.dependencies.serving.resolve_sources",
+            return_value=(Path("missing.feather"), Path("missing")),
+        ):
+            response = self.client.get(
+                "/players/search", headers=headers, params={"q": "fogn"}
+            )
+        self.assertEqual(response.status_code, 503)
+        params = {"q": "Fogini F.", "testing": True}
+        response = self.client.get("/players/search", headers=headers, params=params)
+        self.assertEqual(response.json()[0]["match"], "fuzzy")
+
+    def test_predict_resolves_inexact_names(self):
+        # Testing that the prediction resolves names not in the data format.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        prediction_data = {
+            "p1_name": "fognini",
+            "p2_name": "Jary N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        response = self.client.post("/predict/", headers=headers, json=prediction_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()["player_name"], ["Fognini F.", "Jarry N."])
+
+    def test_player_matches_and_head_to_head(self):
+        # Testing the paginated player history and head-to-head routes.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"limit": 1, "testing": True}
+        response = self.client.get(
+            "/players/Fognini F./matches", headers=headers, params=params
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreaterEqual(data["total"], 1)
+        self.assertEqual(len(data["matches"]), 1)
+        params = {"p1_name": "Fognini F.", "p2_name": "Jarry N.", "testing": True}
+        response = self.client.get("/h2h", headers=headers, params=params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total"], data["p1_wins"] + data["p2_wins"])
+        self.assertGreaterEqual(data["total"], 1)
+        params["p2_name"] = "Fognini F."
+        response = self.client.get("/h2h", headers=headers, params=params)
+        self.assertEqual(response.status_code, 422)
+        response = self.client.get(
+            "/players/Nobody Z./matches", headers=headers, params={"testing": True}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_bucket_store(self):
+        # Testing that a bucket empties, refuses and refills over time.
+        with tempfile.TemporaryDirectory() as tmp:
+            store = TokenBucketStore(Path(tmp) / "buckets.bin", slots=16)
+            limit = RateLimit("2/minute")
+            self.assertTrue(store.acquire("predict:johndoe", limit, now=0)[0])
+            self.assertTrue(store.acquire("predict:johndoe", limit, now=0)[0])
+            allowed, _, retry_after = store.acquire("predict:johndoe", limit, now=0)
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(retry_after, 30)
+            # Another user has its own bucket, and the first one refills
+            self.assertTrue(store.acquire("predict:janedoe", limit, now=0)[0])
+            self.assertTrue(store.acquire("predict:johndoe", limit, now=30)[0])
+
+    def test_user_stores(self):
+        # Testing the cached lookups and their invalidation on writes.
+        with self.assertRaises(TypeError):
+            UserStore()
+        store = DictUserStore(dict(fake_users_db))
+        user = store.get("johndoe")
+        self.assertEqual(user, get_user(fake_users_db, "johndoe"))
+        self.assertIs(store.get("johndoe"), user)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteUserStore(Path(tmp) / "users.db")
+            self.assertIsNone(store.get("johndoe"))
+            store.put(user)
+            self.assertEqual(store.get("johndoe"), user)
+            self.assertEqual(store.get("johndoe").role, "admin")
+            self.assertIs(store.get("johndoe"), store.get("johndoe"))
+            store.put(user.model_copy(update={"tier": "pro"}))
+            self.assertEqual(store.get("johndoe").tier, "pro")
+            # Another store of the same file sees the write once expired
+            other = SQLiteUserStore(Path(tmp) / "users.db", cache_ttl=0)
+            other.put(user.model_copy(update={"disabled": True}))
+            self.assertTrue(other.get("johndoe").disabled)
+            self.assertFalse(store.get("johndoe").disabled)
+            store.invalidate()
+            self.assertTrue(store.get("johndoe").disabled)
+            store.delete("johndoe")
+            self.assertIsNone(store.get("johndoe"))
+        # A blocking store authenticates the login off the event loop
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteUserStore(Path(tmp) / "users.db")
+            store.put(get_user(fake_users_db, "johndoe"))
+            with mock.patch("acebet.app.main.get_user_store", return_value=store):
+                self.assertTrue(self.get_access_token())
+        # The lookup benchmark runs on its own temporary stores
+        latencies = benchmark_lookups(number=10)
+        self.assertEqual(
+            list(latencies), ["dict", "dict_store", "sqlite_cached", "sqlite_read"]
+        )
+        self.assertTrue(all(latency > 0 for latency in latencies.values()))
+
+    def test_predict_sets_rate_limit_headers(self):
+        # Testing that the prediction route is rate limited per user.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        prediction_data = {
+            "p1_name": "Fognini F.",
+            "p2_name": "Jarry N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        response = self.client.post("/predict/", headers=headers, json=prediction_data)
+        self.assertEqual(response.headers["X-RateLimit-Limit"], "60/minute")
+        self.assertIn("X-RateLimit-Remaining", response.headers)
+
+    def test_predict_batch_json_and_arrow(self):
+        # Testing batch predictions in JSON and as an Arrow IPC stream.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        batch = {
+            "matches": [
+                {"p1_name": "Fognini F.", "p2_name": "Jarry N.", "date": "2018-03-04"},
+                {"p1_name": "Nobody Z.", "p2_name": "Jarry N.", "date": "2018-03-04"},
+            ],
+            "testing": True,
+        }
+        response = self.client.post("/predict/batch", headers=headers, json=batch)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data), 2)
+        self.assertIsNotNone(data[0]["prob"])
+        self.assertIsNone(data[1]["prob"])
+        headers["Accept"] = "application/vnd.apache.arrow.stream"
+        response = self.client.post("/predict/batch", headers=headers, json=batch)
+        self.assertEqual(response.status_code, 200)
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column_names, ["player_name", "prob", "class_"])
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.column("prob").null_count, 1)
+
+    def test_predict_explain(self):
+        # Testing that the explanations add up to the predictions, and are cached.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        match = {"p1_name": "Fognini F.", "p2_name": "Jarry N.", "date": "2018-03-04"}
+        unknown = {**match, "p1_name": "Nobody Z."}
+        batch = {"matches": [match, unknown, match], "testing": True}
+        response = self.client.post("/predict/explain", headers=headers, json=batch)
+        self.assertEqual(response.status_code, 200)
+        first, missing, again = response.json()
+        self.assertIsNone(missing)
+        self.assertEqual(first, again)
+        # The players are in the order of the data, not of the request
+        self.assertEqual(first["p1"], "Jarry N.")
+        self.assertEqual(first["p2"], "Fognini F.")
+        raw = first["base_value"] + sum(first["contributions"].values())
+        self.assertAlmostEqual(100 / (1 + np.exp(-raw)), first["prob"], delta=0.1)
+        cache = get_state(testing=True).current.contributions
+        self.assertGreaterEqual(cache.n_computed, 1)
+        self.assertGreater(cache.nbytes, 0)
+        n_computed = cache.n_computed
+        top = {"matches": [match], "top": 2, "testing": True}
+        response = self.client.post("/predict/explain", headers=headers, json=top)
+        [explanation] = response.json()
+        self.assertEqual(
+            explanation["contributions"], dict(list(first["contributions"].items())[:2])
+        )
+        self.assertEqual(cache.n_computed, n_computed)
+
+    def test_prediction_etags(self):
+        # Testing that an unchanged prediction is revalidated with a 304.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        prediction_data = {
+            "p1_name": "Fognini F.",
+            "p2_name": "Jarry N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        response = self.client.post("/predict/", headers=headers, json=prediction_data)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        self.assertIn("must-revalidate", response.headers["Cache-Control"])
+        conditional = {**headers, "If-None-Match": etag}
+        response = self.client.post(
+            "/predict/", headers=conditional, json=prediction_data
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        # Another match has another ETag
+        prediction_data["date"] = "2018-03-03"
+        response = self.client.post(
+            "/predict/", headers=conditional, json=prediction_data
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        # The export has one ETag per format
+        params = {"start_date": "2018-03-01", "end_date": "2018-03-04", "testing": True}
+        response = self.client.get("/predict/export", headers=headers, params=params)
+        etag = response.headers["ETag"]
+        response = self.client.get(
+            "/predict/export", headers={**headers, "If-None-Match": etag}, params=params
+        )
+        self.assertEqual(response.status_code, 304)
+        arrow = {**headers, "If-None-Match": etag, "Accept": ARROW_STREAM}
+        response = self.client.get("/predict/export", headers=arrow, params=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_predict_slate(self):
+        # Testing the predictions of every match of a day, then of a tournament.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {"date": "2018-03-03", "testing": True}
+        response = self.client.get("/predict/slate", headers=headers, params=params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(match["date"] == "2018-03-03" for match in data))
+        params.update(end_date="2018-03-04", tournament="brasil open")
+        response = self.client.get("/predict/slate", headers=headers, params=params)
+        data = response.json()
+        self.assertEqual(len(data), 3)
+        self.assertEqual({match["tournament"] for match in data}, {"Brasil Open"})
+        # Malformed dates are rejected, here and by the export
+        for params in ({"date": "garbage"}, {"date": "2018-03-03", "end_date": "x"}):
+            response = self.client.get(
+                "/predict/slate", headers=headers, params={**params, "testing": True}
+            )
+            self.assertEqual(response.status_code, 422)
+        params = {"start_date": "2018-03-03", "end_date": "2018-13-01", "testing": True}
+        response = self.client.get("/predict/export", headers=headers, params=params)
+        self.assertEqual(response.status_code, 422)
+
+    def test_predict_pairwise(self):
+        # Testing the win-probability matrix of a field of players.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        field = {
+            "players": ["Fognini F.", "Jarry N.", "Cuevas P.", "Zeballos H."],
+            "date": "2018-03-04",
+            "tournament": "Brasil Open",
+            "testing": True,
+        }
+        response = self.client.post("/predict/pairwise", headers=headers, json=field)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["players"], field["players"])
+        prob = np.array(data["prob"], dtype=float)
+        self.assertEqual(prob.shape, (4, 4))
+        self.assertTrue(np.isnan(np.diag(prob)).all())
+        off_diagonal = ~np.eye(4, dtype=bool)
+        np.testing.assert_allclose((prob + prob.T)[off_diagonal], 100, atol=0.11)
+        field["players"].append("Nobody Z.")
+        response = self.client.post("/predict/pairwise", headers=headers, json=field)
+        self.assertEqual(response.status_code, 404)
+        # A player is not scored against themselves, nor a malformed date
+        field["players"][-1] = "Jarry N."
+        response = self.client.post("/predict/pairwise", headers=headers, json=field)
+        self.assertEqual(response.status_code, 422)
+        field = {**field, "players": field["players"][:4], "date": "2018-02-30"}
+        response = self.client.post("/predict/pairwise", headers=headers, json=field)
+        self.assertEqual(response.status_code, 422)
+
+    def test_predict_bracket(self):
+        # Testing the round-reach probabilities of a simulated draw.
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        bracket = {
+            "draw": ["Fognini F.", None, "Jarry N.", "Cuevas P."],
+            "date": "2018-03-04",
+            "tournament": "Brasil Open",
+            "n_sims": 20000,
+            "testing": True,
+        }
+        response = self.client.post("/predict/bracket", headers=headers, json=bracket)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["players"], ["Fognini F.", "Jarry N.", "Cuevas P."])
+        self.assertEqual(data["rounds"], ["F", "W"])
+        reach = np.array(data["reach"])
+        self.assertEqual(reach[0, 0], 100)
+        np.testing.assert_allclose(reach.sum(axis=0), [200, 100], atol=0.05)
+        # The same seed gives the same result
+        again = self.client.post("/predict/bracket", headers=headers, json=bracket)
+        self.assertEqual(again.json(), data)
+        bracket["n_sims"] = 10**9
+        response = self.client.post("/predict/bracket", headers=headers, json=bracket)
+        self.assertEqual(response.status_code, 422)
+        bracket = {**bracket, "n_sims": 1000, "date": "March 4"}
+        response = self.client.post("/predict/bracket", headers=headers, json=bracket)
+        self.assertEqual(response.status_code, 422)
+
+    def test_prediction_push(self):
+        # Testing that subscribed predictions are pushed on a model change.
+        access_token = self.get_access_token()
+        match = {"p1_name": "Fognini F.", "p2_name": "Jarry N.", "date": "2018-03-04"}
+        url = f"/ws/predictions?token={access_token}&testing=true"
+        with self.client.websocket_connect(url) as websocket:
+            websocket.send_json({"action": "subscribe", "matches": [match]})
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "predictions")
+            [prediction] = message["predictions"]
+            # From the side of the first player given, not of the data
+            self.assertEqual(prediction["p1"], "Fognini F.")
+            self.assertEqual(prediction["p2"], "Jarry N.")
+            response = self.client.post(
+                "/predict/",
+                json={**match, "testing": True},
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            stored = response.json()
+            self.assertEqual(stored["player_name"], "Jarry N.")
+            self.assertAlmostEqual(prediction["prob"], 100 - stored["prob"])
+            # Promoting a new model pushes the predictions again
+            state = get_state(testing=True)
+            current = state.current
+            self.addCleanup(setattr, state, "current", current)
+            state.candidate = ModelVersion(
+                current.model,
+                current.model_file,
+                current.mtime + 1,
+                current.version + 1,
+                current.features,
+                current.encoder_key,
+            )
+            self.assertTrue(state.promote())
+            message = websocket.receive_json()
+            self.assertEqual(message["model_version"], current.version + 1)
+            self.assertEqual(message["predictions"], [prediction])
+            # Unknown matches are reported, not subscribed to
+            unknown = {**match, "date": "2000-01-01"}
+            websocket.send_json({"action": "subscribe", "matches": [unknown]})
+            message = websocket.receive_json()
+            self.assertEqual(message["type"], "error")
+            self.assertEqual(len(message["matches"]), 1)
+        # A connection without a valid token is closed
+        with self.assertRaises(WebSocketDisconnect):
+            with self.client.websocket_connect("/ws/predictions") as websocket:
+                websocket.receive_json()
+        # So is a connection of a disabled user
+        access_token = self.get_access_token("janedoe")
+        url = f"/ws/predictions?token={access_token}&testing=true"
+        store = get_user_store()
+        janedoe = store.get("janedoe")
+        store.put(janedoe.model_copy(update={"disabled": True}))
+        self.addCleanup(store.put, janedoe)
+        with self.assertRaises(WebSocketDisconnect):
+            with self.client.websocket_connect(url) as websocket:
+                websocket.receive_json()
+
+    def test_player_states(self):
+        # Testing that the state of a player is read before the date.
+        state = ServingState(*resolve_sources(testing=True))
+        state.load()
+        player_id = state.players.id_of("Fognini F.")
+        states = player_states(state.df, state.player_index, [player_id], "2018-03-04")
+        last = state.df.iloc[states["row"][0]]
+        self.assertEqual(str(last["date"].date()), "2018-03-03")
+        self.assertIn(player_id, (last["p1"], last["p2"]))
+        rank = last["rank_p1"] if last["p1"] == player_id else last["rank_p2"]
+        self.assertEqual(states["rank"][0], rank)
+        # The Elo rating is the one after that last match, not before it
+        as_p1 = last["p1"] == player_id
+        elo = last["elo_p1"] if as_p1 else last["elo_p2"]
+        won = last["target"] == as_p1
+        self.assertEqual(states["elo"][0] > elo, won)
+        with self.assertRaises(ValueError):
+            player_states(state.df, state.player_index, [player_id], "garbage")
+        # Nothing is known before the first match of the data
+        states = player_states(state.df, state.player_index, [player_id], "2000-01-01")
+        self.assertEqual(states["row"][0], -1)
+        self.assertTrue(np.isnan(states["rank"][0]))
+
+    def test_model_hot_swap_and_shadow(self):
+        # Testing that a newer model is swapped in, or shadowed then promoted.
+        data_file, model_path = resolve_sources(testing=True)
+        model_file = next(model_path.glob("model_*.joblib"))
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(data_file, tmp)
+            shutil.copy(model_file, Path(tmp) / "model_1.joblib")
+            state = ServingState(Path(tmp) / data_file.name, tmp).load()
+            self.assertEqual(state.current.version, 1)
+            self.assertFalse(state.refresh())
+            # A newer artifact is published by the refresh
+            shutil.copy(model_file, Path(tmp) / "model_2.joblib")
+            os.utime(Path(tmp) / "model_2.joblib", (2e9, 2e9))
+            features = state.current.features
+            self.assertTrue(state.refresh())
+            self.assertEqual(state.current.version, 2)
+            # The same encoder reuses the encoded features
+            self.assertIs(state.current.features, features)
+            # In shadow mode, it becomes a candidate until promoted
+            state.set_shadow(True, sample_rate=1.0)
+            shutil.copy(model_file, Path(tmp) / "model_3.joblib")
+            os.utime(Path(tmp) / "model_3.joblib", (3e9, 3e9))
+            self.assertTrue(state.refresh())
+            self.assertEqual(state.current.version, 2)
+            self.assertEqual(state.candidate.version, 3)
+            self.assertTrue(state.promote())
+            self.assertEqual(state.current.version, 3)
+            # Toggling the shadow mode reuses the scorer and its thread
+            scorer = state.shadow
+            state.set_shadow(False)
+            self.assertIsNone(state.shadow)
+            state.set_shadow(True)
+            self.assertIs(state.shadow, scorer)
+
+    def test_admin_routes_require_admin(self):
+        # Testing that the administration routes are reserved to administrators.
+        for username, status_code in [("johndoe", 200), ("janedoe", 403)]:
+            access_token = self.get_access_token(username)
+            headers = {"Authorization": f"Bearer {access_token}"}
+            response = self.client.get(
+                "/admin/model", headers=headers, params={"testing": True}
+            )
+            self.assertEqual(response.status_code, status_code)
+            # So is the startup profile, without measuring it here
+            with mock.patch("acebet.app.main.import_time_profile", return_value={}):
+                response = self.client.get("/health/startup", headers=headers)
+            self.assertEqual(response.status_code, status_code)
+
+    def test_audit_sink(self):
+        # Testing the batched audit files and the bounded buffer.
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = AuditSink(tmp, max_rows=10, rotate_rows=3)
+            prob = np.array([60.0, np.nan, 40.0])
+            class_ = np.array([1, -1, 0], dtype=np.int8)
+            self.assertTrue(
+                sink.record(
+                    3, user="johndoe", p1=["a", "b", "c"], prob=prob, class_=class_
+                )
+            )
+            # A full buffer drops the records instead of blocking
+            self.assertFalse(sink.record(8, user="johndoe"))
+            self.assertEqual(sink.dropped, 8)
+            sink.flush()
+            sink.record(1, user="johndoe", route="predict", p1="d", prob=55.0)
+            sink.stop()
+            self.assertEqual(sink.written, 4)
+            files = sorted(Path(tmp).glob("audit_*.parquet"))
+            self.assertEqual(len(files), 2)
+            table = pa.concat_tables([pq.read_table(file) for file in files])
+            self.assertEqual(table["p1"].to_pylist(), ["a", "b", "c", "d"])
+            self.assertEqual(table["prob"].null_count, 1)
+            self.assertEqual(table["route"].to_pylist()[-1], "predict")
+        # A prediction is audited
+        before = audit_sink.buffered + audit_sink.written + audit_sink.dropped
+        self.test_predict_match_outcome()
+        after = audit_sink.buffered + audit_sink.written + audit_sink.dropped
+        self.assertEqual(after - before, 1)
+        # The audit status is reserved to administrators
+        for username, status_code in [("johndoe", 200), ("janedoe", 403)]:
+            access_token = self.get_access_token(username)
+            headers = {"Authorization": f"Bearer {access_token}"}
+            response = self.client.get("/admin/audit", headers=headers)
+            self.assertEqual(response.status_code, status_code)
+
+    def test_drift_report(self):
+        # Testing the drift monitoring of a model saved with a profile.
+        data_file, model_path = resolve_sources(testing=True)
+        model_file = next(model_path.glob("model_*.joblib"))
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(data_file, tmp)
+            shutil.copy(model_file, Path(tmp) / "model_1.joblib")
+            state = ServingState(Path(tmp) / data_file.name, tmp).load()
+            self.assertIsNone(state.drift_report()["drift"])
+            # Profiled on the served data, which then does not drift
+            prob = state.predict_rows(np.arange(len(state.df)))["prob"] / 100
+            profile = DriftProfile.build(state.df, prob)
+            profile.save(DriftProfile.path_for(Path(tmp) / "model_1.joblib"))
+            state = ServingState(Path(tmp) / data_file.name, tmp).load()
+            state.predict_rows(np.arange(len(state.df)), monitor=True)
+            report = state.drift_report(reset=True)["drift"]
+            self.assertEqual(report["live_rows"], len(state.df))
+            self.assertEqual(report["alerts"], [])
+            self.assertEqual(report["features"]["rank_diff"]["ks"], 0)
+            self.assertEqual(state.drift_report()["drift"]["live_rows"], 0)
+            # Only the request paths count as live traffic, not the exports
+            state.predict_range("2018-03-03", "2018-03-04")
+            self.assertEqual(state.drift_report()["drift"]["live_rows"], 0)
+            state.predict("Fognini F.", "Jarry N.", "2018-03-04")
+            slate = state.predict_slate("2018-03-04")
+            live_rows = 1 + len(slate["prob"])
+            self.assertEqual(state.drift_report()["drift"]["live_rows"], live_rows)
+        # The packaged model has no profile
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.get("/admin/drift?testing=true", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["drift"])
+        # The drift report is reserved to administrators
+        access_token = self.get_access_token("janedoe")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.get("/admin/drift?testing=true", headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_encoded_features_match_pipeline(self):
+        # Testing that scoring encoded rows matches the full pipeline.
+        data_file, model_path = resolve_sources(testing=True)
+        state = ServingState(data_file, model_path).load()
+        features = state.current.features
+        self.assertEqual(features.dtype, np.float32)
+        self.assertEqual(len(features), len(state.df))
+        rows = np.arange(len(state.df))
+        prob, class_ = predict_encoded(state.model, features, rows)
+        expected_prob, expected_class = predict_frame(
+            state.model, state.df, state.players
+        )
+        np.testing.assert_allclose(prob, expected_prob, rtol=1e-6)
+        np.testing.assert_array_equal(class_, expected_class)
+
+    def test_request_profiler(self):
+        # Testing that a session profiles the next requests only.
+        profiler = RequestProfiler(interval=0.001)
+        self.assertEqual(profiler.run(sum, [1, 2]), 3)
+        self.assertEqual(profiler.describe()["profiled_requests"], 0)
+        profiler.start("deterministic", requests=2)
+        for _ in range(3):
+            profiler.run(sorted, [3, 1, 2])
+        self.assertFalse(profiler.describe()["active"])
+        self.assertEqual(profiler.describe()["profiled_requests"], 2)
+        self.assertTrue(profiler.pstats_bytes())
+
+    def test_profile_routes(self):
+        # Testing a sampled profile of a prediction request.
+        access_token = self.get_access_token("janedoe")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.post("/admin/profile", headers=headers)
+        self.assertEqual(response.status_code, 403)
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.post(
+            "/admin/profile", params={"requests": 1}, headers=headers
+        )
+        self.assertTrue(response.json()["active"])
+        input_data = {
+            "p1_name": "Fognini F.",
+            "p2_name": "Jarry N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        self.client.post("/predict/", json=input_data, headers=headers)
+        response = self.client.get("/admin/profile", headers=headers)
+        self.assertFalse(response.json()["active"])
+        self.assertEqual(response.json()["profiled_requests"], 1)
+        # The profile header is only honoured for administrators
+        profile = {"X-AceBet-Profile": "1"}
+        self.client.post("/predict/", json=input_data, headers={**headers, **profile})
+        response = self.client.get("/admin/profile", headers=headers)
+        self.assertEqual(response.json()["profiled_requests"], 2)
+        user_headers = {
+            "Authorization": f"Bearer {self.get_access_token('janedoe')}",
+            **profile,
+        }
+        response = self.client.post("/predict/", json=input_data, headers=user_headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/admin/profile", headers=headers)
+        self.assertEqual(response.json()["profiled_requests"], 2)
+
+    def test_request_trace(self):
+        # Testing that the spans of a prediction are traced by request ID.
+        access_token = self.get_access_token()
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "X-API-REQUEST-ID": "test-trace",
+        }
+        input_data = {
+            "p1_name": "Fognini F.",
+            "p2_name": "Jarry N.",
+            "date": "2018-03-04",
+            "testing": True,
+        }
+        response = self.client.post("/predict/", json=input_data, headers=headers)
+        self.assertEqual(response.headers["X-API-REQUEST-ID"], "test-trace")
+        response = self.client.get("/admin/traces/test-trace", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        trace = response.json()
+        self.assertEqual(trace["path"], "/predict/")
+        names = {span["name"] for span in trace["spans"]}
+        for name in ("auth", "query", "features", "scoring", "logging"):
+            self.assertIn(name, names)
+        # The traces of other users are not readable by everyone
+        access_token = self.get_access_token("janedoe")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.get("/admin/traces/test-trace", headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+    def test_deep_sizeof(self):
+        # Testing that shared buffers are counted once.
+        array = np.zeros(1000)
+        size = deep_sizeof({"array": array, "view": array[:10]})
+        self.assertGreaterEqual(size, array.nbytes)
+        self.assertLess(size, 2 * array.nbytes)
+
+    def test_memory_report(self):
+        # Testing the memory report, with allocation tracking switched on.
+        access_token = self.get_access_token("janedoe")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.post(
+            "/admin/memory/tracking", params={"enabled": True}, headers=headers
+        )
+        self.assertEqual(response.status_code, 403)
+        access_token = self.get_access_token()
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = self.client.post(
+            "/admin/memory/tracking", params={"enabled": True}, headers=headers
+        )
+        self.assertTrue(response.json()["tracing"])
+        try:
+            response = self.client.get(
+                "/admin/memory", params={"testing": True}, headers=headers
+            )
+            report = response.json()
+            self.assertGreater(report["process"]["peak_rss_bytes"], 0)
+            self.assertIn("match_index", report["artifacts"])
+            model = report["artifacts"]["current_model"]
+            self.assertGreaterEqual(model["contributions"], 0)
+            self.assertTrue(report["allocations"]["tracing"])
+        finally:
+            self.client.post(
+                "/admin/memory/tracking", params={"enabled": False}, headers=headers
+            )
+
+    def test_parse_importtime(self):
+        # Testing the parsing of a `python -X importtime` report.
+        report = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   numpy.core\n"
+            "import time:      3000 |       3120 | numpy\n"
+        )
+        records = parse_importtime(report)
+        self.assertEqual([r["module"] for r in records], ["numpy.core", "numpy"])
+        self.assertEqual(records[0]["depth"], 1)
+        self.assertEqual(records[1]["cumulative_ms"], 3.12)
+
+    def get_access_token(self, username="johndoe"):
         # Simulating a user login to acquire an access token.
-        form_data = {"username": "johndoe", "password": "secret"}
+        form_data = {"username": username, "password": "secret"}
         # Sending the login POST request and extracting the access token.
         response = self.client.post("/token", data=form_data)
         data = response.json()
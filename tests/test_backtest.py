@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from acebet.app.dependencies.serving import ServingState, resolve_sources
+from acebet.backtest.backtest import BettingBacktest, bet_returns, run_backtest
+from acebet.backtest.walk_forward import walk_forward, walk_forward_folds
+
+SAMPLE_DATA = (
+    Path(__file__).resolve().parents[1]
+    / "src"
+    / "acebet"
+    / "data"
+    / "atp_data_sample.feather"
+)
+
+
+class TestBettingBacktest(unittest.TestCase):
+    def setUp(self):
+        # Simulating matches won with the model probability.
+        rng = np.random.default_rng(0)
+        self.prob = rng.uniform(0.05, 0.95, 4000)
+        self.p1_won = rng.uniform(size=4000) < self.prob
+
+    def test_strategies_choose_bets(self):
+        # Testing the side and stake of each strategy.
+        prob = np.array([0.6, 0.6, 0.6])
+        odds_p1 = np.array([1.5, 2.0, np.nan])
+        odds_p2 = np.array([3.0, 2.0, 3.0])
+        on_p1, stake, _ = bet_returns(prob, odds_p1, odds_p2, "flat")
+        self.assertEqual(list(on_p1), [True, True, True])
+        self.assertEqual(list(stake), [1.0, 1.0, 0.0])
+        on_p1, stake, _ = bet_returns(prob, odds_p1, odds_p2, "value")
+        self.assertEqual(list(on_p1), [False, True, False])
+        self.assertEqual(list(stake), [1.0, 1.0, 1.0])
+        # Half Kelly: half the edge over the net odds
+        _, stake, _ = bet_returns(prob, odds_p1, odds_p2, "kelly", max_fraction=1)
+        np.testing.assert_allclose(stake, [0.05, 0.1, 0.05])
+
+    def test_chunks_do_not_change_the_result(self):
+        # Testing that chunking over time only bounds the memory.
+        odds_p1, odds_p2 = 1.1 / self.prob, 1.1 / (1 - self.prob)
+        results = []
+        for n_chunks in (1, 8):
+            backtest = BettingBacktest("kelly")
+            for rows in np.array_split(np.arange(4000), n_chunks):
+                backtest.update(
+                    self.prob[rows], odds_p1[rows], odds_p2[rows], self.p1_won[rows]
+                )
+            results.append(backtest.result())
+        for key in ("profit", "staked", "max_drawdown"):
+            np.testing.assert_allclose(results[0][key], results[1][key], rtol=1e-9)
+        self.assertGreater(results[0]["roi"], 0)
+
+    def test_margin_loses_with_flat_stakes(self):
+        # Testing that flat bets at odds with a bookmaker margin lose money.
+        backtest = BettingBacktest("flat")
+        backtest.update(self.prob, 0.9 / self.prob, 0.9 / (1 - self.prob), self.p1_won)
+        result = backtest.result()
+        self.assertEqual(result["n_bets"], 4000)
+        self.assertLess(result["roi"], 0)
+        self.assertGreater(result["max_drawdown"], 0)
+        self.assertEqual(sum(b["n_matches"] for b in result["calibration"]), 4000)
+
+    def test_run_backtest_on_sample(self):
+        # Testing each strategy on the sample data and model, chunk by chunk.
+        state = ServingState(*resolve_sources(testing=True)).load()
+        model, df, players = state.current.model, state.df, state.players
+        kwargs = {"start_date": "2018-02-26", "end_date": "2018-03-03"}
+        n_matches = df["date"].between("2018-02-26", "2018-03-03").sum()
+        for strategy in ("flat", "value", "kelly"):
+            daily = run_backtest(
+                model, df, strategy=strategy, freq="D", players=players, **kwargs
+            )
+            monthly = run_backtest(
+                model, df, strategy=strategy, freq="M", players=players, **kwargs
+            )
+            self.assertEqual(daily["strategy"], strategy)
+            self.assertEqual(daily["n_matches"], n_matches)
+            self.assertEqual(len(daily["periods"]), 6)
+            for key in ("n_bets", "staked", "profit", "accuracy"):
+                self.assertAlmostEqual(daily[key], monthly[key])
+        with self.assertRaises(ValueError):
+            run_backtest(model, df, bookmaker="unknown", players=players)
+
+
+class TestWalkForward(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.read_feather(SAMPLE_DATA)
+
+    def test_folds_train_before_testing(self):
+        # Testing that each fold trains on the matches before its test period.
+        dates = np.sort(self.df["date"].to_numpy())
+        folds = walk_forward_folds(
+            dates, "2018-02-27", "2018-03-04", freq="D", min_train_rows=5
+        )
+        self.assertEqual(folds[0]["test_start"], "2018-02-27")
+        for fold in folds:
+            self.assertEqual(fold["train"][1], fold["test"][0])
+            self.assertLess(dates[fold["train"][1] - 1], dates[fold["test"][0]])
+        self.assertEqual(folds[-1]["test"][1], len(dates))
+        # A sliding training window starts later
+        sliding = walk_forward_folds(
+            dates, "2018-03-01", "2018-03-04", freq="D", train_days=2, min_train_rows=5
+        )
+        self.assertGreater(sliding[0]["train"][0], 0)
+
+    def test_walk_forward_caches_fold_models(self):
+        # Testing the out-of-sample predictions, then a rerun from the cache.
+        with tempfile.TemporaryDirectory() as cache_dir:
+            predictions = walk_forward(
+                self.df,
+                "2018-03-01",
+                "2018-03-04",
+                freq="D",
+                min_train_rows=50,
+                n_jobs=2,
+                cache_dir=cache_dir,
+            )
+            self.assertEqual(len(predictions), 30)
+            self.assertTrue(predictions["prob"].between(0, 1).all())
+            self.assertEqual(len(list(Path(cache_dir).glob("fold_*.joblib"))), 4)
+            rerun = walk_forward(
+                self.df,
+                "2018-03-01",
+                "2018-03-04",
+                freq="D",
+                min_train_rows=50,
+                n_jobs=1,
+                cache_dir=cache_dir,
+            )
+        np.testing.assert_allclose(rerun["prob"], predictions["prob"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from acebet.app.dependencies.predict_winner import load_player_index
+from acebet.dataprep.dataprep import recompute_elo_features
+from acebet.dataprep.date_index import DateIndex
+from acebet.dataprep.elo import EloEngine, expected_score
+from acebet.dataprep.ingest import load_sources
+from acebet.dataprep.player_index import PlayerRowIndex
+from acebet.dataprep.players import PlayerDictionary, intern_players
+from acebet.dataprep.validate import coerce_numeric, validate_matches
+
+SAMPLE_DATA = (
+    Path(__file__).resolve().parents[1]
+    / "src"
+    / "acebet"
+    / "data"
+    / "atp_data_sample.feather"
+)
+
+
+class TestPlayerDictionary(unittest.TestCase):
+    def test_ids_are_stable_when_extended(self):
+        # Testing that known players keep their IDs when new ones are added.
+        players = PlayerDictionary(["Fognini F.", "Jarry N."])
+        players.extend(["Jarry N.", "Tiafoe F."])
+        self.assertEqual(players.id_of("Fognini F."), 0)
+        self.assertEqual(players.id_of("Tiafoe F."), 2)
+        self.assertEqual(list(players.encode(["Tiafoe F.", "Nadal R."])), [2, -1])
+        self.assertEqual(list(players.decode([1, 0])), ["Jarry N.", "Fognini F."])
+
+    def test_intern_players(self):
+        # Testing that the name columns are replaced by integer IDs.
+        df = pd.DataFrame({"p1": ["A", "B"], "p2": ["B", "C"], "rank_p1": [1, 2]})
+        df, players = intern_players(df)
+        self.assertTrue(pd.api.types.is_integer_dtype(df["p1"]))
+        self.assertEqual(list(players.decode(df["p2"])), ["B", "C"])
+        # Interning twice is a no-op
+        df_again, _ = intern_players(df, players)
+        self.assertTrue(df_again.equals(df))
+        # Matches missing a name are dropped, not given an unknown ID
+        df = pd.DataFrame({"p1": ["A", None, "C"], "p2": ["B", "C", np.nan]})
+        df, players = intern_players(df, players)
+        self.assertEqual(len(df), 1)
+        self.assertTrue((df[["p1", "p2"]].to_numpy() >= 0).all())
+
+
+class TestPlayerRowIndex(unittest.TestCase):
+    def test_rebuilt_when_data_changes(self):
+        # Testing that a saved index is not served for data of the same size.
+        players = PlayerDictionary(["A", "B", "C"])
+        dates = pd.to_datetime(["2020-01-01", "2020-01-02"])
+        df = pd.DataFrame({"p1": [0, 1], "p2": [1, 2], "date": dates})
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = Path(tmp) / "atp_data.feather"
+            PlayerRowIndex.build(df, n_players=3).save(
+                data_file.with_name("atp_player_index.npz")
+            )
+            index = load_player_index(data_file, df, players)
+            self.assertEqual(list(index.rows_of(1)), [0, 1])
+            rebuilt = df.assign(p2=[2, 0])
+            index = load_player_index(data_file, rebuilt, players)
+            self.assertEqual(list(index.rows_of(1)), [1])
+            self.assertEqual(list(index.rows_of(0)), [0, 1])
+
+
+class TestEloEngine(unittest.TestCase):
+    def setUp(self):
+        # A small history of matches between three players.
+        self.matches = pd.DataFrame(
+            {
+                "date": pd.to_datetime(
+                    ["2018-01-01", "2018-01-02", "2018-01-03", "2018-01-04"]
+                ),
+                "p1": [0, 1, 2, 0],
+                "p2": [1, 2, 0, 2],
+                "target": [True, False, True, True],
+                "surface": ["Hard", "Clay", "Hard", "Clay"],
+            }
+        )
+
+    def test_first_match_is_even(self):
+        # Testing that unrated players have even chances.
+        features = EloEngine().process(self.matches)
+        self.assertEqual(features["proba_elo"].iloc[0], 0.5)
+        proba = expected_score(1600, 1400)
+        self.assertAlmostEqual(proba + expected_score(1400, 1600), 1)
+
+    def test_incremental_matches_full_replay(self):
+        # Testing that resuming from a checkpoint equals processing everything.
+        full = EloEngine(surfaces=True).process(self.matches)
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = Path(tmp) / "elo.npz"
+            engine = EloEngine(surfaces=True)
+            first = engine.process(self.matches.iloc[:2])
+            engine.save(checkpoint)
+            second = EloEngine.load(checkpoint).process(self.matches.iloc[2:])
+        np.testing.assert_allclose(pd.concat([first, second]).values, full.values)
+
+    def test_bad_matches_are_not_rated(self):
+        # Testing that duplicate or same-player matches do not update ratings.
+        bad = self.matches.iloc[[0, 0, 1, 2, 3]].reset_index(drop=True)
+        bad.loc[3, "p2"] = bad.loc[3, "p1"]
+        df, engine = recompute_elo_features(bad, n_players=3)
+        self.assertTrue(df.loc[[1, 3], "elo_p1"].isna().all())
+        expected = EloEngine().process(self.matches.drop(index=2))
+        np.testing.assert_allclose(
+            df.dropna()["elo_p1"].to_numpy(), expected["elo_p1"].to_numpy()
+        )
+
+    def test_past_matches_are_rejected(self):
+        # Testing that ratings are never replayed backwards.
+        engine = EloEngine()
+        engine.process(self.matches.iloc[2:])
+        with self.assertRaises(ValueError):
+            engine.process(self.matches.iloc[:2])
+
+
+class TestIngest(unittest.TestCase):
+    def write_seasons(self, directory, matches, splits):
+        # Writing the matches as one CSV file per split.
+        for i, rows in enumerate(splits):
+            matches.iloc[rows].to_csv(Path(directory) / f"{2000 + i}.csv", index=False)
+
+    def test_merge_does_not_depend_on_files(self):
+        # Testing that the merged order and hashes ignore the file split.
+        matches = pd.DataFrame(
+            {
+                "Date": ["2018-01-02", "2018-01-01", "2018-01-02", "2019-01-01"],
+                "Tournament": ["A", "A", "B", "C"],
+                "Winner": ["W1", "W2", "W3", "W4"],
+                "Loser": ["L1", "L2", "L3", "L4"],
+            }
+        )
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            self.write_seasons(a, matches, [[0, 1], [2, 3]])
+            self.write_seasons(b, matches, [[3, 2, 1], [0]])
+            data_a, hashes_a = load_sources(a, n_jobs=2)
+            data_b, hashes_b = load_sources(Path(b) / "*.csv", n_jobs=1)
+        self.assertTrue(data_a.equals(data_b))
+        np.testing.assert_array_equal(hashes_a, hashes_b)
+        self.assertTrue(data_a["Date"].is_monotonic_increasing)
+
+
+class TestValidation(unittest.TestCase):
+    def test_bad_rows_are_quarantined(self):
+        # Testing that each bad row is quarantined with its failed checks.
+        df, players = intern_players(pd.read_feather(SAMPLE_DATA))
+        bad = pd.concat([df, df.iloc[[2]]], ignore_index=True)
+        bad.loc[0, "surface"] = "Sand"
+        # Ranks read as text, as in the source files of some seasons
+        bad["rank_p1"] = bad["rank_p1"].astype(object)
+        bad.loc[1, "rank_p1"] = "NR"
+        bad = coerce_numeric(bad)
+        clean, quarantine, report = validate_matches(bad, players)
+        self.assertEqual(report["n_quarantined"], 3)
+        self.assertEqual(len(clean), len(df) - 2)
+        self.assertEqual(
+            list(quarantine["reasons"]),
+            ["unknown_surface", "missing_rank", "duplicate_match"],
+        )
+        self.assertEqual(list(quarantine["row"]), [0, 1, len(df)])
+
+    def test_invalid_schema(self):
+        # Testing that a missing column is a schema error.
+        df = pd.read_feather(SAMPLE_DATA).drop(columns="proba_elo")
+        with self.assertRaises(ValueError):
+            validate_matches(df)
+
+
+class TestDateIndex(unittest.TestCase):
+    def test_ranges_are_slices_of_sorted_data(self):
+        # Testing that a day of date-sorted data is a contiguous slice.
+        df = pd.read_feather(SAMPLE_DATA)
+        index = DateIndex.build(df)
+        self.assertTrue(index.contiguous)
+        rows = index.rows("2018-03-03")
+        self.assertIsInstance(rows, slice)
+        expected = np.flatnonzero(df["date"] == "2018-03-03")
+        np.testing.assert_array_equal(np.arange(rows.start, rows.stop), expected)
+        lo, hi = index.locate("2018-03-01", "2018-03-04")
+        in_range = df["date"].between("2018-03-01", "2018-03-04")
+        self.assertEqual(hi - lo, in_range.sum())
+        self.assertEqual(index.locate("2030-01-01"), (len(df), len(df)))
+
+    def test_unsorted_data(self):
+        # Testing the permutation of data not in date order.
+        df = pd.read_feather(SAMPLE_DATA).sample(frac=1, random_state=0)
+        index = DateIndex.build(df)
+        self.assertFalse(index.contiguous)
+        rows = index.rows("2018-02-26", "2018-02-27")
+        dates = df["date"].to_numpy()[rows]
+        self.assertTrue((np.diff(dates) >= np.timedelta64(0)).all())
+        in_range = df["date"].between("2018-02-26", "2018-02-27")
+        self.assertEqual(len(rows), in_range.sum())
+
+
+if __name__ == "__main__":
+    unittest.main()
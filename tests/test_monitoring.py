@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from acebet.monitoring.drift import DriftMonitor, DriftProfile, ks, psi
+
+
+def matches(n, seed=0, clay=0.3):
+    # Random match features, a share of them on clay
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "rank_diff": rng.normal(0, 50, n).round(),
+            "proba_elo": rng.random(n),
+            "surface": np.where(rng.random(n) < clay, "Clay", "Hard"),
+        }
+    )
+
+
+class TestDriftMonitor(unittest.TestCase):
+    def test_scores(self):
+        # Testing PSI and KS on identical and on shifted histograms.
+        self.assertEqual(psi([10, 20, 30], [1, 2, 3]), 0)
+        self.assertEqual(ks([10, 20, 30], [1, 2, 3]), 0)
+        self.assertGreater(psi([10, 20, 30], [30, 20, 10]), 0.2)
+        self.assertAlmostEqual(ks([1, 0], [0, 1]), 1)
+
+    def test_profile_round_trip(self):
+        # Testing that a saved profile bins the data as the original one.
+        df = matches(1000)
+        df.loc[:9, "proba_elo"] = np.nan
+        profile = DriftProfile.build(df, df["proba_elo"].fillna(0.5))
+        self.assertEqual(profile.features["surface"]["kind"], "categorical")
+        # Deciles: ten bins of values, one of missing values
+        self.assertEqual(len(profile.features["proba_elo"]["counts"]), 11)
+        self.assertEqual(profile.features["proba_elo"]["counts"][-1], 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = DriftProfile.path_for(Path(tmp) / "model_1.joblib")
+            self.assertEqual(path.name, "model_1.drift.json")
+            profile.save(path)
+            loaded = DriftProfile.load(path)
+        np.testing.assert_array_equal(loaded.bin_features(df), profile.bin_features(df))
+
+    def test_streaming_updates(self):
+        # Testing that single and batch updates count the same bins.
+        df = matches(1000)
+        profile = DriftProfile.build(df, df["proba_elo"])
+        bins = profile.bin_features(df)
+        batch, single = DriftMonitor(profile, bins), DriftMonitor(profile, bins)
+        rows = np.arange(0, 1000, 7)
+        batch.update(rows, df["proba_elo"].to_numpy()[rows])
+        for row in rows:
+            single.update(np.array([row]), df["proba_elo"].to_numpy()[[row]])
+        self.assertEqual(batch.report(True), single.report(True))
+        self.assertEqual(batch.n_rows, len(rows))
+        batch.reset()
+        self.assertEqual(batch.report()["live_rows"], 0)
+        self.assertIsNone(batch.report()["prediction"]["psi"])
+
+    def test_drift_alerts(self):
+        # Testing that a shift of the served rows is reported.
+        reference = matches(5000)
+        profile = DriftProfile.build(reference, reference["proba_elo"])
+        served = pd.concat([reference, matches(5000, seed=1, clay=0.9)])
+        monitor = DriftMonitor(profile, profile.bin_features(served))
+        # The rows of the training period do not drift
+        monitor.update(np.arange(5000), reference["proba_elo"].to_numpy())
+        self.assertEqual(monitor.report()["alerts"], [])
+        monitor.reset()
+        monitor.update(np.arange(5000, 10000), served["proba_elo"].to_numpy()[5000:])
+        report = monitor.report()
+        self.assertEqual(report["alerts"], ["surface"])
+        self.assertIsNone(report["features"]["surface"]["ks"])
+        self.assertLess(report["features"]["rank_diff"]["ks"], 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
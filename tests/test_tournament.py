@@ -0,0 +1,88 @@
+import multiprocessing
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+from acebet.app.dependencies import serving
+from acebet.tournament.simulate import BYE, round_labels, simulate_bracket
+
+
+def strength_matrix(n, seed=0):
+    # Bradley-Terry probabilities of random player strengths
+    strength = np.random.default_rng(seed).random(n)
+    prob = strength[:, None] / (strength[:, None] + strength[None, :])
+    np.fill_diagonal(prob, np.nan)
+    return prob
+
+
+class TestBracketSimulation(unittest.TestCase):
+    def test_round_labels(self):
+        # Testing the stages reached by winning each round.
+        self.assertEqual(round_labels(32), ["R16", "QF", "SF", "F", "W"])
+        self.assertEqual(round_labels(2), ["W"])
+
+    def test_reach_probabilities(self):
+        # Testing that each round is won by as many players as it has matches.
+        result = simulate_bracket(strength_matrix(16), n_sims=20_000, n_jobs=1)
+        reach = result["reach"]
+        self.assertEqual(reach.shape, (16, 4))
+        np.testing.assert_allclose(reach.sum(axis=0), [8, 4, 2, 1])
+        # Reaching a round requires reaching the previous one
+        self.assertTrue((np.diff(reach, axis=1) <= 0).all())
+
+    def test_two_players(self):
+        # Testing a single match against its probability.
+        prob = np.array([[np.nan, 0.7], [0.3, np.nan]])
+        reach = simulate_bracket(prob, n_sims=100_000, n_jobs=1)["reach"]
+        self.assertAlmostEqual(reach[0, 0], 0.7, delta=0.01)
+
+    def test_byes(self):
+        # Testing that a player facing a bye always goes through.
+        prob = np.array([[np.nan, 0.9], [0.1, np.nan]])
+        reach = simulate_bracket(prob, [0, BYE, 1, BYE], n_sims=1000)["reach"]
+        np.testing.assert_array_equal(reach[:, 0], [1, 1])
+
+    def test_seeding_does_not_depend_on_processes(self):
+        # Testing that a seed gives the same result with any number of processes.
+        prob = strength_matrix(8)
+        kwargs = {"n_sims": 10_000, "seed": 7, "chunk_size": 3000}
+        serial = simulate_bracket(prob, n_jobs=1, **kwargs)["reach"]
+        parallel = simulate_bracket(prob, n_jobs=2, **kwargs)["reach"]
+        np.testing.assert_array_equal(serial, parallel)
+        other = simulate_bracket(prob, n_jobs=1, **{**kwargs, "seed": 8})["reach"]
+        self.assertFalse(np.array_equal(serial, other))
+
+    def test_shared_executor(self):
+        # Testing the chunks run on a long-lived pool of spawned processes.
+        prob = strength_matrix(8)
+        kwargs = {"n_sims": 10_000, "seed": 7, "chunk_size": 3000}
+        serial = simulate_bracket(prob, n_jobs=1, **kwargs)["reach"]
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=2, mp_context=context) as executor:
+            for _ in range(2):
+                shared = simulate_bracket(prob, executor=executor, **kwargs)["reach"]
+                np.testing.assert_array_equal(serial, shared)
+
+    def test_simulation_pool_shutdown(self):
+        # Testing the shared pool is shut down, and created again on next use.
+        with mock.patch.object(serving, "SIMULATION_JOBS", 2):
+            pool = serving.get_simulation_pool()
+            self.assertIs(serving.get_simulation_pool(), pool)
+            serving.shutdown_simulation_pool()
+            with self.assertRaises(RuntimeError):
+                pool.submit(int)
+            other = serving.get_simulation_pool()
+            self.assertIsNot(other, pool)
+            serving.shutdown_simulation_pool()
+        self.assertIsNone(serving._simulation_pool)
+
+    def test_invalid_draw(self):
+        # Testing that a draw must have a power of two slots.
+        with self.assertRaises(ValueError):
+            simulate_bracket(strength_matrix(3))
+
+
+if __name__ == "__main__":
+    unittest.main()